@@ -0,0 +1,131 @@
+""" Compare the chunked SQLite bulk loader with the original whole-file SQLAlchemy import.
+
+Writes a synthetic nvd_data.csv with the initial-load columns, then loads it into a
+fresh database once with each loader, each in its own process so peak RSS is measured
+independently. A second run of the chunked loader against the loaded database
+shows the upsert path (no duplicates, same row count).
+
+The "legacy" loader is the original import: read the whole CSV, `to_dict('records')`,
+and a single SQLAlchemy `insert` without PRAGMA tuning.
+
+Usage: python benchmarks/bench_bulk_load.py [--cves 250000] [--chunk-size 50000]
+"""
+import argparse
+import csv
+import json
+import random
+import resource
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent / 'src'))
+from nvd.utils.schema import INITIAL_LOAD_SCHEMA
+
+COLUMNS = INITIAL_LOAD_SCHEMA.columns
+
+
+def synthetic_row(index, rng):
+    cve_id = f"CVE-{2000 + index % 25}-{index:06d}"
+    score = round(rng.uniform(0, 10), 1)
+    row = dict.fromkeys(COLUMNS)
+    row.update({
+        'CVE ID': cve_id,
+        'Source Identifier': 'cve@mitre.org',
+        'Vulnerability Status': 'Analyzed',
+        'Published Date': '2021-01-01T00:00:00.000',
+        'Last Modified Date': f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}T00:00:00.000",
+        'CVE Tags': '[]',
+        'Description': 'Synthetic vulnerability description. ' * rng.randint(2, 20),
+        'References': ', '.join(f"https://example.com/advisory/{cve_id}/{r}" for r in range(rng.randint(1, 8))),
+        'CVSSv3 Version': '3.1',
+        'CVSSv3 Vector String': 'CVSS:3.1/AV:N/AC:L/PR:N/UI:N/S:U/C:H/I:H/A:H',
+        'CVSSv3 Attack Vector': 'NETWORK',
+        'CVSSv3 Base Score': str(score),
+        'CVSSv3 Base Severity': 'CRITICAL' if score >= 9 else 'HIGH' if score >= 7 else 'MEDIUM',
+    })
+    return row
+
+
+def write_csv(path, cves):
+    rng = random.Random(0)
+    with open(path, 'w', newline='', encoding='utf-8') as file:
+        writer = csv.DictWriter(file, fieldnames=COLUMNS)
+        writer.writeheader()
+        for index in range(cves):
+            writer.writerow(synthetic_row(index, rng))
+
+
+def legacy_load(csv_path, database_path):
+    import pandas as pd
+    from sqlalchemy import create_engine, Table, Column, MetaData, String
+    from sqlalchemy.dialects.sqlite import insert
+    from nvd.utils.store import sanitize_column
+
+    engine = create_engine(f'sqlite:///{database_path}')
+    df = pd.read_csv(csv_path, dtype=str, quotechar='"', escapechar='\\', on_bad_lines='skip')
+    df.rename(columns={col: sanitize_column(col) for col in df.columns}, inplace=True)
+    table = Table('nvd_data', MetaData(), *[Column(col, String) for col in df.columns])
+    table.metadata.create_all(engine)
+    for col in ['Published_Date', 'Last_Modified_Date', 'CISA_Exploit_Add', 'CISA_Action_Due']:
+        df[col] = pd.to_datetime(df[col], errors='coerce').dt.strftime('%Y-%m-%d %H:%M:%S')
+    data = df.to_dict(orient='records')
+    with engine.begin() as conn:
+        conn.execute(insert(table), data)
+
+
+def run_stage(stage, csv_path, database_path, chunk_size):
+    """ Run one loader in this process and print its time and peak RSS as JSON. """
+    start = time.perf_counter()
+    if stage == 'legacy':
+        legacy_load(csv_path, database_path)
+    else:
+        from nvd.load.create_database_and_import import load
+        load(csv_path, database_path, chunk_size=chunk_size, tenable_database=None)
+    # The chunked loader writes from a separate database writer process; count the larger of the two
+    peak = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+               resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    print(json.dumps({'seconds': time.perf_counter() - start,
+                      'peak_rss_mib': peak / 1024 / 1024 if sys.platform == 'darwin' else peak / 1024}))
+
+
+def measure(stage, csv_path, database_path, chunk_size):
+    output = subprocess.run([sys.executable, __file__, '--stage', stage, '--csv', str(csv_path),
+                             '--database', str(database_path), '--chunk-size', str(chunk_size)],
+                            check=True, capture_output=True, text=True).stdout
+    result = json.loads(output.strip().splitlines()[-1])
+    with sqlite3.connect(database_path) as conn:
+        result['rows'] = conn.execute('SELECT COUNT(*) FROM nvd_data').fetchone()[0]
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--cves', type=int, default=250000)
+    parser.add_argument('--chunk-size', type=int, default=50000)
+    parser.add_argument('--stage', choices=('legacy', 'chunked'), help=argparse.SUPPRESS)
+    parser.add_argument('--csv', type=Path, help=argparse.SUPPRESS)
+    parser.add_argument('--database', type=Path, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.stage:
+        run_stage(args.stage, args.csv, args.database, args.chunk_size)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path = Path(tmp) / 'nvd_data.csv'
+        write_csv(csv_path, args.cves)
+        print(f"input:   {args.cves} CVEs, {csv_path.stat().st_size / 2 ** 20:.0f} MiB CSV")
+        for label, stage, database in (('legacy', 'legacy', 'legacy.db'),
+                                       ('chunked', 'chunked', 'chunked.db'),
+                                       ('upsert', 'chunked', 'chunked.db')):
+            result = measure(stage, csv_path, Path(tmp) / database, args.chunk_size)
+            print(f"{label + ':':<8} {result['seconds']:.1f}s, peak RSS {result['peak_rss_mib']:.0f} MiB, "
+                  f"{result['rows']} rows in nvd_data")
+
+
+if __name__ == '__main__':
+    main()
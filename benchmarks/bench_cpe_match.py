@@ -0,0 +1,78 @@
+""" Benchmark the CPE applicability matcher on synthetic NVD configurations and inventories.
+
+Generates CVE configurations spread over a vendor:product catalogue (single OR
+nodes with version ranges, plus AND "application on platform" configurations)
+and an inventory of hosts that each carry a few CPEs drawn from the same
+catalogue, then times index compilation and the bulk match.
+
+Usage: python benchmarks/bench_cpe_match.py [--cves 250000] [--hosts 20000] [--products 20000]
+"""
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent / 'src'))
+from nvd.match.cpe_matcher import build_index
+
+
+def cpe(vendor, product, version='*', part='a'):
+    return f"cpe:2.3:{part}:{vendor}:{product}:{version}:*:*:*:*:*:*:*"
+
+
+def synthetic_configurations(cves, products, rng):
+    for index in range(cves):
+        product = rng.randrange(products)
+        vendor, name = f"vendor{product % 2000}", f"product{product}"
+        matches = []
+        for _ in range(rng.randint(1, 8)):
+            major = rng.randint(0, 9)
+            matches.append({'vulnerable': True, 'criteria': cpe(vendor, name),
+                            'versionStartIncluding': f"{major}.0", 'versionEndExcluding': f"{major}.{rng.randint(1, 9)}"})
+        nodes = [{'operator': 'OR', 'negate': False, 'cpeMatch': matches}]
+        configuration = {'nodes': nodes}
+        if rng.random() < 0.2:
+            nodes.append({'operator': 'OR', 'negate': False, 'cpeMatch': [
+                {'vulnerable': False, 'criteria': cpe('microsoft', 'windows', '-', part='o')}]})
+            configuration['operator'] = 'AND'
+        yield f"CVE-{2000 + index % 25}-{index:06d}", [configuration]
+
+
+def synthetic_inventory(hosts, products, rng):
+    inventory = {}
+    for host in range(hosts):
+        cpes = [cpe('microsoft', 'windows', '-', part='o')] if rng.random() < 0.5 else []
+        for _ in range(rng.randint(1, 5)):
+            product = rng.randrange(products)
+            cpes.append(cpe(f"vendor{product % 2000}", f"product{product}",
+                            f"{rng.randint(0, 9)}.{rng.randint(0, 9)}.{rng.randint(0, 20)}"))
+        inventory[f"host{host:06d}"] = cpes
+    return inventory
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--cves', type=int, default=250000)
+    parser.add_argument('--hosts', type=int, default=20000)
+    parser.add_argument('--products', type=int, default=20000)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    configurations = list(synthetic_configurations(args.cves, args.products, rng))
+    inventory = synthetic_inventory(args.hosts, args.products, rng)
+    host_cpes = sum(len(cpes) for cpes in inventory.values())
+
+    start = time.perf_counter()
+    index = build_index(configurations)
+    compiled = time.perf_counter()
+    pairs = sum(1 for _ in index.match_hosts(inventory))
+    matched = time.perf_counter()
+
+    print(f"compile: {len(index.cve_ids)} CVEs, {len(index.matches)} distinct cpeMatch criteria in {compiled - start:.2f}s")
+    print(f"match:   {args.hosts} hosts, {host_cpes} host CPEs -> {pairs} host/CVE pairs in {matched - compiled:.2f}s "
+          f"({host_cpes / (matched - compiled):,.0f} host CPEs/s)")
+
+
+if __name__ == '__main__':
+    main()
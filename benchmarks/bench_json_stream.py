@@ -0,0 +1,83 @@
+""" Compare buffered `response.json()` decoding with the streaming JsonArrayStream path.
+
+Both paths consume the same synthetic NVD 2.0 page delivered in 64 KiB chunks,
+the way aiohttp hands the body over. The buffered path joins the chunks and
+decodes the whole document (what `await response.json()` does); the streaming
+path feeds each chunk to JsonArrayStream and drops every record once handled.
+
+Usage: python benchmarks/bench_json_stream.py [--records 2000] [--repeat 3]
+"""
+import argparse
+import codecs
+import json
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent / 'src'))
+from nvd.utils.json_stream import JsonArrayStream, CHUNK_SIZE
+from synthetic import synthetic_page
+
+
+def chunks(body):
+    for i in range(0, len(body), CHUNK_SIZE):
+        yield body[i:i + CHUNK_SIZE]
+
+
+def buffered(body):
+    document = json.loads(b''.join(chunks(body)))
+    first = None
+    count = 0
+    for item in document['vulnerabilities']:
+        if first is None:
+            first = time.perf_counter()
+        count += 1
+    return count, first
+
+
+def streaming(body):
+    stream = JsonArrayStream('vulnerabilities')
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    first = None
+    count = 0
+    for chunk in chunks(body):
+        for item in stream.feed(decoder.decode(chunk)):
+            if first is None:
+                first = time.perf_counter()
+            count += 1
+    stream.close()
+    return count, first
+
+
+def measure(fn, body, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        count, first = fn(body)
+        timings.append((time.perf_counter() - start, first - start))
+    tracemalloc.start()
+    fn(body)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    total, first = min(timings)
+    return {'records': count, 'seconds': total, 'first_record_seconds': first, 'peak_bytes': peak}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--records', type=int, default=2000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    body = synthetic_page(args.records)
+    print(f"Synthetic page: {args.records} records, {len(body) / 2**20:.1f} MiB")
+    for name, fn in (('buffered', buffered), ('streaming', streaming)):
+        result = measure(fn, body, args.repeat)
+        print(f"{name:>9}: {result['seconds'] * 1000:8.1f} ms total, "
+              f"{result['first_record_seconds'] * 1000:8.1f} ms to first record, "
+              f"peak {result['peak_bytes'] / 2**20:7.1f} MiB above the raw body")
+
+
+if __name__ == '__main__':
+    main()
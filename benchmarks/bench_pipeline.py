@@ -0,0 +1,409 @@
+""" Time every stage of the NVD and Tenable pipelines end to end against the local stub API.
+
+Starts benchmarks/stub_server.py with a synthetic corpus, then runs and times each
+stage separately:
+
+    nvd_fetch, cpe_fetch   raw page downloads, with the client's rate limiter and retries
+    nvd_decode             JsonArrayStream over the downloaded pages
+    nvd_archive/replay     compressing the raw pages into a page archive, and decoding them back from it
+    nvd_transform          extract_cve_records on every batch of CVEs
+    nvd_queue              BatchChannel round trip to a consumer process
+    nvd_write_csv/parquet  the extract writers
+    nvd_load               create_database_and_import.load of the Parquet extract
+    kev_load               KEV catalog download and hash-diffed load into the kev table
+    tenable_fetch/parse/merge/load   the Tenable pipeline steps
+    correlation_full       first build of the plugin x CVE correlation
+    nvd_delta              the daily delta (fetch, queue, upsert) after the stub modified --touch-cves CVEs
+    tenable_delta_*        conditional feed refresh, parse, merge and load after --touch-plugins changed
+    correlation_incremental   refresh from the changed plugins and CVEs
+    query                  FTS searches and the sql_queries/ dashboards queries
+
+Results are printed and saved as JSON (stage timings, record rates, stub request
+counts by status) so runs can be compared with --compare.
+
+Usage: python benchmarks/bench_pipeline.py [--cves 20000] [--plugins 5000] [--error-rate 0.02] [--compare old.json]
+"""
+import argparse
+import asyncio
+import codecs
+import json
+import os
+import platform
+import resource
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from multiprocessing import Process, Value
+from pathlib import Path
+
+BENCHMARKS_DIR = Path(__file__).resolve().parent
+SRC_DIR = BENCHMARKS_DIR.parent / 'src'
+RESULTS_DIR = BENCHMARKS_DIR / 'results'
+SQL_DIR = BENCHMARKS_DIR.parent / 'sql_queries'
+sys.path.append(str(SRC_DIR))
+
+RETRYABLE_STATUSES = {403, 429, 500, 502, 503, 504}
+
+
+class Stages:
+    """ Times named stages and keeps one result dict per stage. """
+
+    def __init__(self):
+        self.results = {}
+
+    @contextmanager
+    def stage(self, name):
+        info = {}
+        start = time.perf_counter()
+        yield info
+        info['seconds'] = time.perf_counter() - start
+        if info.get('records'):
+            info['records_per_s'] = info['records'] / info['seconds']
+        self.results[name] = info
+        rate = f", {info['records_per_s']:,.0f} records/s" if 'records_per_s' in info else ''
+        extra = ', '.join(f"{key} {value}" for key, value in info.items()
+                          if key not in ('seconds', 'records', 'records_per_s') and not isinstance(value, dict))
+        print(f"{name:<24} {info['seconds']:8.2f}s  {info.get('records', '')!s:>8}{rate}"
+              + (f"  ({extra})" if extra else ''))
+
+
+def start_stub(args):
+    command = [sys.executable, str(BENCHMARKS_DIR / 'stub_server.py'), '--port', '0',
+               '--cves', str(args.cves), '--cpes', str(args.cpes), '--plugins', str(args.plugins),
+               '--feeds', str(args.feeds), '--seed', str(args.seed), '--rate-limit', str(args.rate_limit),
+               '--rate-window', str(args.rate_window), '--error-rate', str(args.error_rate),
+               '--forbidden-rate', str(args.forbidden_rate), '--latency', str(args.latency)]
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, text=True)
+    base_url = process.stdout.readline().strip()
+    if not base_url.startswith('http'):
+        process.kill()
+        raise RuntimeError("The stub server did not start")
+    return process, base_url
+
+
+async def fetch_pages(base_url, array_key, args):
+    """ Download every page of one API with the extractors' concurrency, rate limit and retry policy. """
+    import aiohttp
+    from nvd.utils.json_stream import JsonArrayStream
+    from nvd.utils.rate_limiter import RateLimiter
+
+    limiter = RateLimiter(args.rate_limit, args.rate_window)
+    semaphore = asyncio.Semaphore(args.concurrency)
+    retries = 0
+
+    async def page(session, start_index):
+        nonlocal retries
+        params = {'startIndex': start_index, 'resultsPerPage': args.results_per_page}
+        for attempt in range(args.max_retries + 1):
+            async with semaphore:
+                await limiter.acquire()
+                async with session.get(base_url, params=params, headers={'apiKey': 'benchmark'}) as response:
+                    if response.status == 200:
+                        return await response.read()
+                    if response.status not in RETRYABLE_STATUSES or attempt == args.max_retries:
+                        response.raise_for_status()
+            retries += 1
+            await asyncio.sleep(args.retry_backoff * 2 ** attempt)
+
+    connector = aiohttp.TCPConnector(limit=args.concurrency)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        first = await page(session, 0)
+        stream = JsonArrayStream(array_key)
+        stream.feed(first[:4096].decode('utf-8', errors='ignore'))
+        total = stream.envelope.get('totalResults', 0)
+        rest = await asyncio.gather(*(page(session, start_index)
+                                      for start_index in range(args.results_per_page, total, args.results_per_page)))
+    return [first, *rest], total, retries
+
+
+def decode_pages(bodies, array_key):
+    from nvd.utils.json_stream import CHUNK_SIZE, JsonArrayStream
+    items = []
+    for body in bodies:
+        stream = JsonArrayStream(array_key)
+        decoder = codecs.getincrementaldecoder('utf-8')()
+        for offset in range(0, len(body), CHUNK_SIZE):
+            items.extend(stream.feed(decoder.decode(body[offset:offset + CHUNK_SIZE])))
+        stream.close()
+    return items
+
+
+def drain(channel, received):
+    """ Queue consumer: receive every batch and count its records. """
+    for kind, _, batch in channel:
+        if kind == "BATCH":
+            received.value += len(batch)
+
+
+def run_queries(nvd_database, tenable_database):
+    """ Time the FTS searches and dashboard queries; returns {label: milliseconds}. """
+    from nvd.utils.db_writer import connect_reader
+    from nvd.utils.search import search
+
+    timings = {}
+    nvd = connect_reader(nvd_database)
+    tenable = connect_reader(tenable_database)
+    try:
+        some_cve = tenable.execute('SELECT cve_id FROM plugin_cve LIMIT 1').fetchone()
+        some_plugin = tenable.execute('SELECT plugin_id FROM plugin_cve LIMIT 1').fetchone()
+        parameters = {'cve_id': some_cve[0] if some_cve else '', 'plugin_id': some_plugin[0] if some_plugin else ''}
+        queries = [
+            ('search cve "remote code"', lambda: search(nvd, 'cve', 'remote code')),
+            ('search cve deserialization', lambda: search(nvd, 'cve', 'deserialization')),
+            ('search plugin "security updates"', lambda: search(tenable, 'plugin', 'security updates')),
+        ]
+        for path in sorted(SQL_DIR.glob('*.sql')):
+            sql = path.read_text()
+            conn = nvd if 'cve_weakness' in sql or 'JOIN nvd_data' in sql else tenable
+            queries.append((path.name, lambda conn=conn, sql=sql: conn.execute(sql, parameters).fetchall()))
+        queries.append(('correlation critical', lambda: tenable.execute(
+            'SELECT * FROM plugin_cve_correlation WHERE base_score >= 9 ORDER BY base_score DESC LIMIT 100').fetchall()))
+        for label, query in queries:
+            start = time.perf_counter()
+            query()
+            timings[label] = round((time.perf_counter() - start) * 1000, 2)
+    finally:
+        nvd.close()
+        tenable.close()
+    return timings
+
+
+def run_tenable(stages, prefix, stub_feeds, work_dir, tenable_database, workers):
+    from nvd.utils.db_writer import DatabaseWriter
+    from tenable.extract.extract_tenable_data import fetch_feeds
+    from tenable.load.load_master_data import create_tables, load_records
+    from tenable.pipeline import iter_feed_records
+    from tenable.transform.transform.create_master_tenable_plugins_dataframe import merge_records, sorted_records
+
+    xml_dir = work_dir / 'xml_files'
+    with stages.stage(f'{prefix}_fetch') as info:
+        report = asyncio.run(fetch_feeds(stub_feeds, output_dir=xml_dir, cache_path=work_dir / 'feed_cache.json',
+                                         changes_path=work_dir / 'changed_feeds.json'))
+        info.update(records=len(report['changed']), unchanged=len(report['unchanged']), failed=len(report['failed']))
+    xml_files = sorted(str(path) for path in xml_dir.glob('*.xml'))
+    with stages.stage(f'{prefix}_parse') as info:
+        parsed = list(iter_feed_records(xml_files, max_workers=workers))
+        info['records'] = len(parsed)
+    with stages.stage(f'{prefix}_merge') as info:
+        records = sorted_records(merge_records(parsed))
+        info['records'] = len(records)
+    with stages.stage(f'{prefix}_load') as info:
+        with DatabaseWriter(tenable_database, setup=create_tables) as writer:
+            writer.call(load_records, records)
+        info.update(records=len(records), **writer.results[0])
+
+
+def run(args, base_url, work_dir, stages):
+    os.environ.update({
+        'NVD_API_KEY': 'benchmark',
+        'NVD_BASE_URL_CVE': f"{base_url}/rest/json/cves/2.0",
+        'NVD_RATE_LIMIT_REQUESTS': str(args.rate_limit),
+        'NVD_RATE_LIMIT_WINDOW': str(args.rate_window),
+        'NVD_MAX_CONCURRENCY': str(args.concurrency),
+        'NVD_RESULTS_PER_PAGE': str(args.results_per_page),
+        'NVD_RETRY_BACKOFF': str(args.retry_backoff),
+        'NVD_MAX_RETRIES': str(args.max_retries),
+        'TENABLE_RETRY_BACKOFF': str(args.retry_backoff),
+    })
+    import pandas as pd
+    from nvd.extract import multiprocess_daily_delta as delta
+    from nvd.extract.cve_api import BATCH_SIZE, cve_records
+    from nvd.extract.extract_kev import fetch_catalog
+    from nvd.load.create_database_and_import import load
+    from nvd.load.load_kev import load as load_kev
+    from nvd.utils.batch_queue import BatchChannel
+    from nvd.utils.correlation import refresh
+    from nvd.utils.json_stream import CHUNK_SIZE, JsonArrayStream
+    from nvd.utils.page_archive import PageArchive
+    from nvd.utils.schema import DELTA_SCHEMA
+    from nvd.utils.writers import open_writer
+
+    nvd_database = work_dir / 'NVDb.db'
+    tenable_database = work_dir / 'Tenable.db'
+
+    with stages.stage('nvd_fetch') as info:
+        bodies, total, retries = asyncio.run(fetch_pages(f"{base_url}/rest/json/cves/2.0", 'vulnerabilities', args))
+        info.update(records=total, pages=len(bodies), mib=round(sum(map(len, bodies)) / 2 ** 20, 1), retries=retries)
+    with stages.stage('cpe_fetch') as info:
+        cpe_bodies, total, retries = asyncio.run(fetch_pages(f"{base_url}/rest/json/cpes/2.0", 'products', args))
+        info.update(records=total, pages=len(cpe_bodies), retries=retries)
+    with stages.stage('nvd_decode') as info:
+        items = decode_pages(bodies, 'vulnerabilities')
+        info['records'] = len(items) + len(decode_pages(cpe_bodies, 'products'))
+    archive = PageArchive(work_dir / 'page_archive')
+    page_params = [{'startIndex': start_index, 'resultsPerPage': args.results_per_page}
+                   for start_index in range(0, len(bodies) * args.results_per_page, args.results_per_page)]
+    with stages.stage('nvd_archive') as info:
+        for params, body in zip(page_params, bodies):
+            page = archive.writer(delta.ENDPOINT, params)
+            for offset in range(0, len(body), CHUNK_SIZE):
+                page.write(body[offset:offset + CHUNK_SIZE])
+            page.commit({})
+        archived = sum(entry['bytes'] for entry in archive.pages(delta.ENDPOINT))
+        info.update(records=len(items), compression=archive.compression, mib=round(archived / 2 ** 20, 1),
+                    ratio=round(sum(map(len, bodies)) / archived, 1))
+    with stages.stage('nvd_replay') as info:
+        info['records'] = sum(1 for params in page_params
+                              for _ in JsonArrayStream('vulnerabilities').iter_chunks(
+                                  archive.read(delta.ENDPOINT, params)))
+    del bodies, cpe_bodies
+    with stages.stage('nvd_transform') as info:
+        records = [record for offset in range(0, len(items), BATCH_SIZE)
+                   for record in cve_records(DELTA_SCHEMA, items[offset:offset + BATCH_SIZE])]
+        info['records'] = len(records)
+    del items
+
+    with stages.stage('nvd_queue') as info:
+        channel = BatchChannel(delta.MAX_QUEUED_BATCHES)
+        received = Value('q', 0)
+        consumer = Process(target=drain, args=(channel, received))
+        consumer.start()
+        for offset in range(0, len(records), BATCH_SIZE):
+            channel.put_batch(offset, records[offset:offset + BATCH_SIZE], DELTA_SCHEMA.columns)
+        channel.close()
+        consumer.join()
+        info['records'] = received.value
+
+    frame = pd.DataFrame.from_records(records, columns=DELTA_SCHEMA.columns)
+    parquet_path = work_dir / 'nvd_data.parquet'
+    for output_format, path in (('csv', work_dir / 'nvd_data.csv'), ('parquet', parquet_path)):
+        with stages.stage(f'nvd_write_{output_format}') as info:
+            writer = open_writer(output_format, path, append=False)
+            for offset in range(0, len(frame), BATCH_SIZE):
+                writer.write(frame.iloc[offset:offset + BATCH_SIZE])
+            writer.close()
+            info.update(records=len(frame), mib=round(path.stat().st_size / 2 ** 20, 1))
+    del frame, records
+
+    with stages.stage('nvd_load') as info:
+        result = load(parquet_path, nvd_database, chunk_size=args.chunk_size, tenable_database=None)
+        info.update(records=result['rows'], peak_rss_mib=round(result['peak_rss_mib']))
+
+    with stages.stage('kev_load') as info:
+        catalog_file = work_dir / 'known_exploited_vulnerabilities.json'
+        asyncio.run(fetch_catalog(f"{base_url}/feeds/known_exploited_vulnerabilities.json", catalog_file,
+                                  work_dir / 'kev_cache.json'))
+        counts = load_kev(catalog_file, nvd_database, tenable_database=None)
+        info.update(records=counts['inserted'])
+
+    stub_feeds = {name: f"{base_url}/feeds/{name}.xml" for name in (f"feed_{n}" for n in range(args.feeds))}
+    run_tenable(stages, 'tenable', stub_feeds, work_dir, tenable_database, args.workers)
+
+    with stages.stage('correlation_full') as info:
+        result = refresh(tenable_database, nvd_database, full=True)
+        info.update(records=result['rows'])
+
+    # Let the stub modify CVEs and plugins "now", then run the deltas
+    window_start = datetime.now(timezone.utc) - timedelta(seconds=5)
+    request = urllib.request.Request(f"{base_url}/admin/touch?cves={args.touch_cves}&plugins={args.touch_plugins}",
+                                     method='POST')
+    urllib.request.urlopen(request).read()
+
+    with stages.stage('nvd_delta') as info:
+        channel = BatchChannel(delta.MAX_QUEUED_BATCHES)
+        # The correlation is refreshed as its own stage below
+        writer_process = Process(target=delta.upsert_data, args=(channel, nvd_database, None))
+        writer_process.start()
+        windows = delta.split_windows(window_start, datetime.now(timezone.utc) + timedelta(seconds=5))
+        try:
+            asyncio.run(delta.extract_data(channel, delta.BASE_URL_CVE, windows))
+            channel.put_control("RUN_COMPLETE")
+        finally:
+            channel.close()
+            writer_process.join()
+        conn = sqlite3.connect(nvd_database)
+        info['records'] = conn.execute('SELECT COUNT(*) FROM cve_change').fetchone()[0]
+        conn.close()
+
+    run_tenable(stages, 'tenable_delta', stub_feeds, work_dir, tenable_database, args.workers)
+
+    with stages.stage('correlation_incremental') as info:
+        result = refresh(tenable_database, nvd_database)
+        info.update(records=result['rows'], plugins=result['plugins'], cves=result['cves'])
+
+    with stages.stage('query') as info:
+        timings = run_queries(nvd_database, tenable_database)
+        info.update(records=len(timings), milliseconds=timings)
+
+
+def peak_rss_mib():
+    peak = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+               resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    return peak / 1024 / 1024 if sys.platform == 'darwin' else peak / 1024
+
+
+def compare(results, previous_path):
+    previous = json.loads(Path(previous_path).read_text())['stages']
+    print(f"\nCompared with {previous_path}:")
+    for name, info in results.items():
+        if name in previous:
+            before, after = previous[name]['seconds'], info['seconds']
+            print(f"{name:<24} {before:8.2f}s -> {after:8.2f}s  ({after / before if before else float('inf'):.2f}x)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--cves', type=int, default=20000)
+    parser.add_argument('--cpes', type=int, default=5000)
+    parser.add_argument('--plugins', type=int, default=5000)
+    parser.add_argument('--feeds', type=int, default=4)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--touch-cves', type=int, default=500, help="CVEs the stub modifies before the delta run")
+    parser.add_argument('--touch-plugins', type=int, default=100, help="Plugins the stub modifies before the delta")
+    parser.add_argument('--rate-limit', type=int, default=100, help="Requests per rate window (stub and client)")
+    parser.add_argument('--rate-window', type=float, default=1.0, help="Rate window in seconds (NVD uses 30)")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Fraction of stub responses that are 503s")
+    parser.add_argument('--forbidden-rate', type=float, default=0.0, help="Fraction of stub responses that are 403s")
+    parser.add_argument('--latency', type=float, default=0.0, help="Seconds the stub adds to every API response")
+    parser.add_argument('--results-per-page', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=5)
+    parser.add_argument('--max-retries', type=int, default=5)
+    parser.add_argument('--retry-backoff', type=float, default=0.1)
+    parser.add_argument('--chunk-size', type=int, default=50000, help="Rows per chunk of the NVD load")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="Tenable parser processes")
+    parser.add_argument('--output', type=Path, default=None,
+                        help=f"JSON results file (default: {RESULTS_DIR.name}/pipeline-<timestamp>.json)")
+    parser.add_argument('--compare', type=Path, default=None, help="Earlier JSON results to compare against")
+    args = parser.parse_args()
+
+    started_at = datetime.now(timezone.utc)
+    stages = Stages()
+    stub, base_url = start_stub(args)
+    try:
+        print(f"Stub API at {base_url}")
+        with tempfile.TemporaryDirectory() as tmp:
+            run(args, base_url, Path(tmp), stages)
+        with urllib.request.urlopen(f"{base_url}/stats") as response:
+            stub_requests = json.loads(response.read())
+    finally:
+        stub.terminate()
+        stub.wait()
+
+    summary = {
+        'benchmark': 'pipeline',
+        'started_at': started_at.isoformat(),
+        'config': {key: str(value) if isinstance(value, Path) else value for key, value in vars(args).items()},
+        'environment': {'python': platform.python_version(), 'platform': platform.platform(),
+                        'cpus': os.cpu_count(), 'sqlite': sqlite3.sqlite_version},
+        'stages': stages.results,
+        'total_seconds': sum(info['seconds'] for info in stages.results.values()),
+        'peak_rss_mib': round(peak_rss_mib()),
+        'stub_requests': stub_requests,
+    }
+    output = args.output or RESULTS_DIR / f"pipeline-{started_at:%Y%m%dT%H%M%S}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(summary, indent=2))
+    print(f"\nTotal {summary['total_seconds']:.1f}s, peak RSS {summary['peak_rss_mib']} MiB; "
+          f"stub requests {json.dumps(stub_requests)}")
+    print(f"Results saved to {output}")
+    if args.compare:
+        compare(stages.results, args.compare)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+""" Compare the streaming Tenable feed parser with the original ET.parse + BeautifulSoup parser.
+
+Writes synthetic RSS feeds shaped like the Tenable plugin feeds, then parses them
+with the original per-item BeautifulSoup approach, with the streaming parser in one
+process, and with the streaming parser spread across a process pool.
+
+Usage: python benchmarks/bench_tenable_parse.py [--feeds 10] [--items 20000] [--workers 4]
+"""
+import argparse
+import os
+import re
+import sys
+import tempfile
+import time
+import xml.etree.ElementTree as ET
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent / 'src/tenable/transform/transform'))
+from parse_xml_and_save_individual_csvs import clean_text, iter_items, parse_feeds
+from synthetic import write_feed
+
+
+def legacy_parse(xml_file):
+    """ The original per-item parse: whole-document ET.parse and a BeautifulSoup tree per description. """
+    from bs4 import BeautifulSoup
+    rows = []
+    for item in ET.parse(xml_file).getroot().findall('.//item'):
+        description_html = clean_text(item.find('description').text.strip().lower())
+        soup = BeautifulSoup(description_html, 'html.parser')
+        plugin_id_text = clean_text(soup.find('p').get_text(strip=True).lower() if soup.find('p') else '')
+        sections = [soup.find('h3', string=name).find_next_sibling('span').get_text(strip=True).lower()
+                    if soup.find('h3', string=name) else '' for name in ('synopsis', 'description', 'solution')]
+        cve_match = re.search(r'cve-\d{4}-\d{4,7}', description_html)
+        rows.append((plugin_id_text, sections, cve_match.group(0) if cve_match else ''))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--feeds', type=int, default=10)
+    parser.add_argument('--items', type=int, default=20000, help="Items per feed")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        feeds = [os.path.join(tmp, f'feed_{n}.xml') for n in range(args.feeds)]
+        for n, feed in enumerate(feeds):
+            write_feed(feed, args.items, seed=n)
+        total = args.feeds * args.items
+        size = sum(os.path.getsize(feed) for feed in feeds)
+        print(f"input:     {args.feeds} feeds x {args.items} items, {size / 2 ** 20:.0f} MiB")
+
+        def report(label, seconds):
+            print(f"{label + ':':<10} {seconds:.2f}s ({total / seconds:,.0f} items/s)")
+
+        try:
+            start = time.perf_counter()
+            for feed in feeds:
+                legacy_parse(feed)
+            report('legacy', time.perf_counter() - start)
+        except ImportError:
+            print("legacy:    skipped (beautifulsoup4 not installed)")
+
+        start = time.perf_counter()
+        for feed in feeds:
+            for _ in iter_items(feed):
+                pass
+        report('stream', time.perf_counter() - start)
+
+        start = time.perf_counter()
+        parse_feeds(feeds, output_dir=os.path.join(tmp, 'parsed'), max_workers=args.workers)
+        report(f'pool({args.workers})', time.perf_counter() - start)
+
+
+if __name__ == '__main__':
+    main()
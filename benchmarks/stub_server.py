@@ -0,0 +1,290 @@
+""" Local stand-in for the NVD 2.0 CVE/CPE APIs and the Tenable plugin feeds, serving synthetic data.
+
+Emulates what the extractors depend on: startIndex/resultsPerPage pagination with
+totalResults, lastModStartDate/lastModEndDate windows (both required, at most 120
+days apart), a rolling-window rate limit answered with 403 like NVD, randomly
+injected 403/503 failures, and ETag/Last-Modified validators on the feeds.
+
+    GET  /rest/json/cves/2.0        CVE pages
+    GET  /rest/json/cpes/2.0        CPE pages
+    GET  /feeds/{name}.xml          Tenable plugin RSS feed
+    GET  /feeds/known_exploited_vulnerabilities.json   CISA KEV catalog
+    GET  /stats                     request counts by route and status
+    POST /admin/touch?cves=N&plugins=M&kev=K   modify N CVEs and M plugins and add K KEV entries "now"
+
+Usage: python benchmarks/stub_server.py [--port 8080] [--cves 20000] [--rate-limit 50 --rate-window 30]
+The first line printed is the base URL, so a parent process can start it with --port 0.
+"""
+import argparse
+import asyncio
+import bisect
+import hashlib
+import json
+import random
+import sys
+import time
+from collections import Counter, deque
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+from pathlib import Path
+
+from aiohttp import web
+
+sys.path.append(str(Path(__file__).resolve().parent))
+from synthetic import (api_page_bytes, cve_id, feed_xml, kev_catalog, nvd_timestamp, synthetic_cpe, synthetic_cve,
+                       synthetic_kev_entry, synthetic_plugin_item)
+
+MAX_RESULTS_PER_PAGE = 2000
+MAX_WINDOW_DAYS = 120
+
+
+def parse_nvd_date(value):
+    moment = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    return moment.replace(tzinfo=None) if moment.tzinfo is None else moment.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+class Corpus:
+    """ Records JSON-encoded once and kept ordered by lastModified, so a page is a slice and a join. """
+
+    def __init__(self, array_key, format_name, generate, count, rng, now):
+        self.array_key = array_key
+        self.format_name = format_name
+        self.generate = generate
+        self.rng = rng
+        # Spread the records' lastModified over the two years before `now`
+        self.modified = [now - timedelta(seconds=rng.randrange(2 * 365 * 86400)) for _ in range(count)]
+        self.encoded = [json.dumps(generate(index, rng, moment)).encode('utf-8')
+                        for index, moment in enumerate(self.modified)]
+        self._sort()
+
+    def _sort(self):
+        self.order = sorted(range(len(self.modified)), key=self.modified.__getitem__)
+        self.sorted_modified = [self.modified[index] for index in self.order]
+
+    def touch(self, count, now):
+        """ Give `count` random records a new version modified at `now`. """
+        for index in self.rng.sample(range(len(self.modified)), min(count, len(self.modified))):
+            self.modified[index] = now
+            self.encoded[index] = json.dumps(self.generate(index, self.rng, now)).encode('utf-8')
+        self._sort()
+
+    def page(self, start_index, results_per_page, window=None):
+        if window:
+            low = bisect.bisect_left(self.sorted_modified, window[0])
+            high = bisect.bisect_right(self.sorted_modified, window[1])
+        else:
+            low, high = 0, len(self.order)
+        selected = self.order[low + start_index:min(high, low + start_index + results_per_page)]
+        return api_page_bytes(self.array_key, [self.encoded[index] for index in selected],
+                              start_index, high - low, self.format_name)
+
+
+class StubApi:
+
+    def __init__(self, cves=20000, cpes=5000, plugins=5000, feeds=4, seed=0, rate_limit=50, rate_window=30.0,
+                 error_rate=0.0, forbidden_rate=0.0, latency=0.0, cpe_matches=(1, 20)):
+        self.rng = random.Random(seed)
+        self.rate_limit = rate_limit
+        self.rate_window = rate_window
+        self.error_rate = error_rate
+        self.forbidden_rate = forbidden_rate
+        self.latency = latency
+        self.requests = Counter()
+        self._recent = {}
+
+        now = datetime.now(timezone.utc).replace(tzinfo=None, microsecond=0)
+        self.cves = Corpus('vulnerabilities', 'NVD_CVE',
+                           lambda index, rng, moment: synthetic_cve(index, rng, moment, cpe_matches),
+                           cves, self.rng, now)
+        self.cpes = Corpus('products', 'NVD_CPE', synthetic_cpe, cpes, self.rng, now)
+
+        # Feeds overlap like "newest" and "updated": each holds a window of the plugins
+        self.cve_ids = [cve_id(index) for index in range(cves)] or None
+        self.plugin_count = plugins
+        self.plugin_titles = {}
+        self.feed_names = [f"feed_{index}" for index in range(feeds)]
+        self.feed_size = min(plugins, max(1, 2 * plugins // max(feeds, 1)))
+        self.feeds = {}
+        self._render_feeds()
+
+        # About 2% of the CVEs are known exploited, like the real catalog; a separate generator
+        # keeps the CVE, plugin and error sequences the same as without the catalog
+        self.kev_rng = random.Random(seed + 1)
+        self.kev_entries = [synthetic_kev_entry(identifier, self.kev_rng)
+                            for identifier in self.kev_rng.sample(self.cve_ids or [], cves // 50)]
+        self._render_kev()
+
+    def _render_feeds(self):
+        step = max(1, (self.plugin_count - self.feed_size) // max(len(self.feed_names) - 1, 1))
+        for number, name in enumerate(self.feed_names):
+            first = min(number * step, self.plugin_count - self.feed_size)
+            items = []
+            for index in range(first, first + self.feed_size):
+                # Seeded per plugin, so a plugin renders the same in every feed and every run
+                items.append(synthetic_plugin_item(index, random.Random(index), self.cve_ids,
+                                                   self.plugin_titles.get(index)))
+            body = feed_xml(items)
+            previous = self.feeds.get(name)
+            if previous is None or previous['body'] != body:
+                self.feeds[name] = {'body': body, 'etag': f'"{hashlib.sha256(body).hexdigest()[:32]}"',
+                                    'last_modified': format_datetime(datetime.now(timezone.utc), usegmt=True)}
+
+    def _render_kev(self):
+        body = json.dumps(kev_catalog(self.kev_entries)).encode('utf-8')
+        self.kev = {
+            'body': body, 'etag': f'"{hashlib.sha256(body).hexdigest()[:32]}"',
+            'last_modified': format_datetime(datetime.now(timezone.utc), usegmt=True),
+            'content_type': 'application/json'}
+
+    def kev_url(self, base_url):
+        return f"{base_url}/feeds/known_exploited_vulnerabilities.json"
+
+    def feed_urls(self, base_url):
+        return {name: f"{base_url}/feeds/{name}.xml" for name in self.feed_names}
+
+    def _limited(self, client):
+        """ True when `client` has used up its requests for the rolling window. """
+        now = time.monotonic()
+        recent = self._recent.setdefault(client, deque())
+        while recent and recent[0] <= now - self.rate_window:
+            recent.popleft()
+        if len(recent) >= self.rate_limit:
+            return True
+        recent.append(now)
+        return False
+
+    def _count(self, route, status):
+        self.requests[(route, status)] += 1
+
+    async def _nvd_page(self, request, route, corpus):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        client = request.headers.get('apiKey') or request.remote
+        if self._limited(client) or self.rng.random() < self.forbidden_rate:
+            self._count(route, 403)
+            return web.Response(status=403, text="Request forbidden by administrative rules.")
+        if self.rng.random() < self.error_rate:
+            self._count(route, 503)
+            return web.Response(status=503, text="Service Unavailable")
+
+        query = request.query
+        try:
+            start_index = int(query.get('startIndex', 0))
+            results_per_page = min(int(query.get('resultsPerPage', MAX_RESULTS_PER_PAGE)), MAX_RESULTS_PER_PAGE)
+            window = None
+            if 'lastModStartDate' in query or 'lastModEndDate' in query:
+                window = (parse_nvd_date(query['lastModStartDate']), parse_nvd_date(query['lastModEndDate']))
+                if not timedelta(0) <= window[1] - window[0] <= timedelta(days=MAX_WINDOW_DAYS):
+                    raise ValueError("lastMod range must be between 0 and 120 days")
+        except (KeyError, ValueError) as e:
+            # NVD answers invalid parameters with 404 and the reason in a `message` header
+            self._count(route, 404)
+            return web.Response(status=404, headers={'message': f"Invalid parameters: {e}"})
+
+        self._count(route, 200)
+        return web.Response(body=corpus.page(start_index, results_per_page, window), content_type='application/json')
+
+    async def cves_handler(self, request):
+        return await self._nvd_page(request, 'cves', self.cves)
+
+    async def cpes_handler(self, request):
+        return await self._nvd_page(request, 'cpes', self.cpes)
+
+    async def feed_handler(self, request):
+        return self._conditional_response(request, 'feeds', self.feeds.get(request.match_info['name']))
+
+    async def kev_handler(self, request):
+        return self._conditional_response(request, 'kev', self.kev)
+
+    def _conditional_response(self, request, route, feed):
+        if feed is None:
+            self._count(route, 404)
+            raise web.HTTPNotFound()
+        if self.rng.random() < self.error_rate:
+            self._count(route, 503)
+            return web.Response(status=503, text="Service Unavailable")
+        headers = {'ETag': feed['etag'], 'Last-Modified': feed['last_modified']}
+        if request.headers.get('If-None-Match') == feed['etag']:
+            self._count(route, 304)
+            return web.Response(status=304, headers=headers)
+        self._count(route, 200)
+        return web.Response(body=feed['body'], headers=headers,
+                            content_type=feed.get('content_type', 'application/rss+xml'))
+
+    async def stats_handler(self, request):
+        by_route = {}
+        for (route, status), count in sorted(self.requests.items()):
+            by_route.setdefault(route, {})[str(status)] = count
+        return web.json_response(by_route)
+
+    async def touch_handler(self, request):
+        now = datetime.now(timezone.utc).replace(tzinfo=None, microsecond=0)
+        cves = int(request.query.get('cves', 0))
+        plugins = int(request.query.get('plugins', 0))
+        kev = int(request.query.get('kev', 0))
+        self.cves.touch(cves, now)
+        for index in self.rng.sample(range(self.plugin_count), min(plugins, self.plugin_count)):
+            self.plugin_titles[index] = f"Synthetic plugin {index} (revised {nvd_timestamp(now)})"
+        self._render_feeds()
+        listed = {entry['cveID'] for entry in self.kev_entries}
+        unlisted = [identifier for identifier in self.cve_ids or [] if identifier not in listed]
+        for identifier in self.kev_rng.sample(unlisted, min(kev, len(unlisted))):
+            self.kev_entries.append(synthetic_kev_entry(identifier, self.kev_rng, now))
+        if kev:
+            self._render_kev()
+        return web.json_response({'cves': cves, 'plugins': plugins, 'kev': kev, 'modified_at': nvd_timestamp(now)})
+
+    def app(self):
+        app = web.Application()
+        app.add_routes([
+            web.get('/rest/json/cves/2.0', self.cves_handler),
+            web.get('/rest/json/cpes/2.0', self.cpes_handler),
+            web.get('/feeds/{name}.xml', self.feed_handler),
+            web.get('/feeds/known_exploited_vulnerabilities.json', self.kev_handler),
+            web.get('/stats', self.stats_handler),
+            web.post('/admin/touch', self.touch_handler),
+        ])
+        return app
+
+
+async def serve(stub, host, port):
+    runner = web.AppRunner(stub.app(), access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+    address_host, address_port = runner.addresses[0][:2]
+    print(f"http://{address_host}:{address_port}", flush=True)
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080, help="0 picks a free port")
+    parser.add_argument('--cves', type=int, default=20000)
+    parser.add_argument('--cpes', type=int, default=5000)
+    parser.add_argument('--plugins', type=int, default=5000)
+    parser.add_argument('--feeds', type=int, default=4)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--rate-limit', type=int, default=50, help="Requests per client per rate window")
+    parser.add_argument('--rate-window', type=float, default=30.0, help="Rate window in seconds")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Fraction of requests answered with 503")
+    parser.add_argument('--forbidden-rate', type=float, default=0.0,
+                        help="Fraction of API requests answered with 403 regardless of the rate limit")
+    parser.add_argument('--latency', type=float, default=0.0, help="Seconds added to every API response")
+    args = parser.parse_args()
+
+    stub = StubApi(cves=args.cves, cpes=args.cpes, plugins=args.plugins, feeds=args.feeds, seed=args.seed,
+                   rate_limit=args.rate_limit, rate_window=args.rate_window, error_rate=args.error_rate,
+                   forbidden_rate=args.forbidden_rate, latency=args.latency)
+    try:
+        asyncio.run(serve(stub, args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,225 @@
+""" Generators for synthetic NVD 2.0 CVE/CPE records and pages and Tenable plugin RSS feeds.
+
+Shared by the benchmarks and the stub API server. Everything is driven by a
+`random.Random`, so the same seed always produces the same data.
+"""
+import json
+import random
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+from xml.sax.saxutils import escape
+
+PRODUCTS = ('Nessus', 'Web App Scanning', 'Nessus Network Monitor', 'Log Correlation Engine')
+SEVERITIES = ('Info', 'Low', 'Medium', 'High', 'Critical')
+CWES = ('CWE-79', 'CWE-89', 'CWE-787', 'CWE-20', 'CWE-125', 'CWE-78', 'CWE-416', 'CWE-22', 'CWE-352', 'CWE-502')
+WORDS = ('buffer', 'overflow', 'remote', 'attacker', 'execute', 'arbitrary', 'code', 'crafted', 'request',
+         'deserialization', 'injection', 'authentication', 'bypass', 'privilege', 'escalation', 'denial',
+         'service', 'memory', 'corruption', 'cross-site', 'scripting', 'sql', 'path', 'traversal', 'kernel',
+         'driver', 'plugin', 'parser', 'header', 'cookie', 'session', 'token', 'certificate', 'openssl',
+         'log4j-core', 'jackson-databind', 'struts', 'tomcat', 'nginx', 'apache', 'windows', 'linux')
+
+NVD_TIMESTAMP = '%Y-%m-%dT%H:%M:%S.000'
+
+
+def cve_id(index):
+    return f"CVE-{2000 + index % 25}-{index:06d}"
+
+
+def nvd_timestamp(moment):
+    return moment.strftime(NVD_TIMESTAMP)
+
+
+def sentence(rng, words):
+    return ' '.join(rng.choice(WORDS) for _ in range(words)).capitalize() + '.'
+
+
+def cvss_metrics(rng):
+    """ CVSS v2 and v3.1 metrics, plus v4.0 or v3.0 for some CVEs, with NVD Primary and CNA Secondary sources. """
+    score = round(rng.uniform(1, 10), 1)
+    severity = 'CRITICAL' if score >= 9 else 'HIGH' if score >= 7 else 'MEDIUM' if score >= 4 else 'LOW'
+    metrics = {
+        'cvssMetricV31': [{
+            'source': 'nvd@nist.gov', 'type': 'Primary',
+            'cvssData': {'version': '3.1', 'vectorString': 'CVSS:3.1/AV:N/AC:L/PR:N/UI:N/S:U/C:H/I:H/A:H',
+                         'attackVector': 'NETWORK', 'attackComplexity': 'LOW', 'privilegesRequired': 'NONE',
+                         'userInteraction': 'NONE', 'scope': 'UNCHANGED', 'confidentialityImpact': 'HIGH',
+                         'integrityImpact': 'HIGH', 'availabilityImpact': 'HIGH',
+                         'baseScore': score, 'baseSeverity': severity},
+            'exploitabilityScore': 3.9, 'impactScore': 5.9}],
+        'cvssMetricV2': [{
+            'source': 'nvd@nist.gov', 'type': 'Primary',
+            'cvssData': {'version': '2.0', 'vectorString': 'AV:N/AC:L/Au:N/C:P/I:P/A:P',
+                         'baseScore': min(10.0, round(score * 0.9, 1))},
+            'baseSeverity': 'HIGH' if score >= 7 else 'MEDIUM', 'exploitabilityScore': 10.0, 'impactScore': 6.4}],
+    }
+    draw = rng.random()
+    if draw < 0.3:
+        metrics['cvssMetricV40'] = [{
+            'source': 'cna@example.com', 'type': 'Secondary',
+            'cvssData': {'version': '4.0', 'vectorString': 'CVSS:4.0/AV:N/AC:L/AT:N/PR:N/UI:N/VC:H/VI:H/VA:H/SC:N/SI:N/SA:N',
+                         'attackVector': 'NETWORK', 'attackComplexity': 'LOW', 'attackRequirements': 'NONE',
+                         'privilegesRequired': 'NONE', 'userInteraction': 'NONE',
+                         'vulnConfidentialityImpact': 'HIGH', 'vulnIntegrityImpact': 'HIGH',
+                         'vulnAvailabilityImpact': 'HIGH', 'subConfidentialityImpact': 'NONE',
+                         'subIntegrityImpact': 'NONE', 'subAvailabilityImpact': 'NONE',
+                         'baseScore': score, 'baseSeverity': severity}}]
+        # The CNA's own v3.1 score, listed ahead of NVD's as the API often does
+        metrics['cvssMetricV31'].insert(0, {
+            'source': 'cna@example.com', 'type': 'Secondary',
+            'cvssData': {'version': '3.1', 'vectorString': 'CVSS:3.1/AV:N/AC:H/PR:N/UI:N/S:U/C:H/I:H/A:H',
+                         'attackVector': 'NETWORK', 'attackComplexity': 'HIGH', 'privilegesRequired': 'NONE',
+                         'userInteraction': 'NONE', 'scope': 'UNCHANGED', 'confidentialityImpact': 'HIGH',
+                         'integrityImpact': 'HIGH', 'availabilityImpact': 'HIGH',
+                         'baseScore': 8.1, 'baseSeverity': 'HIGH'},
+            'exploitabilityScore': 2.2, 'impactScore': 5.9})
+    elif draw > 0.8:
+        # Older CVEs were scored under v3.0
+        metrics['cvssMetricV30'] = [{
+            'source': 'nvd@nist.gov', 'type': 'Primary',
+            'cvssData': {'version': '3.0', 'vectorString': 'CVSS:3.0/AV:N/AC:L/PR:N/UI:N/S:U/C:H/I:H/A:H',
+                         'attackVector': 'NETWORK', 'attackComplexity': 'LOW', 'privilegesRequired': 'NONE',
+                         'userInteraction': 'NONE', 'scope': 'UNCHANGED', 'confidentialityImpact': 'HIGH',
+                         'integrityImpact': 'HIGH', 'availabilityImpact': 'HIGH',
+                         'baseScore': score, 'baseSeverity': severity},
+            'exploitabilityScore': 3.9, 'impactScore': 5.9}]
+    return metrics
+
+
+def synthetic_cve(index, rng, last_modified=None, cpe_matches=(5, 60)):
+    """ One element of the NVD 2.0 `vulnerabilities` array. """
+    identifier = cve_id(index)
+    last_modified = last_modified or datetime(2024, 5, 1)
+    published = last_modified - timedelta(days=rng.randint(0, 900))
+    matches = [{
+        'vulnerable': True,
+        'criteria': f"cpe:2.3:a:vendor{rng.randint(0, 500)}:product{rng.randint(0, 5000)}:{v}.{rng.randint(0, 9)}:*:*:*:*:*:*:*",
+        'versionEndExcluding': f"{v + 1}.0",
+        'matchCriteriaId': f"{rng.getrandbits(128):032X}"
+    } for v in range(rng.randint(*cpe_matches))]
+    cve = {
+        'id': identifier,
+        'sourceIdentifier': 'cve@mitre.org',
+        'published': nvd_timestamp(published),
+        'lastModified': nvd_timestamp(last_modified),
+        'vulnStatus': 'Analyzed',
+        'cveTags': [],
+        'descriptions': [{'lang': 'en', 'value': ' '.join(sentence(rng, rng.randint(8, 20))
+                                                         for _ in range(rng.randint(1, 4)))}],
+        'metrics': cvss_metrics(rng),
+        'weaknesses': [{'source': 'nvd@nist.gov', 'type': 'Primary',
+                        'description': [{'lang': 'en', 'value': rng.choice(CWES)}]}],
+        'configurations': [{'nodes': [{'operator': 'OR', 'negate': False, 'cpeMatch': matches}]}],
+        'references': [{'url': f"https://example{r % 7}.com/advisory/{identifier}/{r}", 'source': 'cve@mitre.org',
+                        'tags': ['Vendor Advisory'] if r == 0 else []}
+                       for r in range(rng.randint(1, 15))],
+    }
+    if rng.random() < 0.02:
+        cve.update({'cisaExploitAdd': (published + timedelta(days=30)).strftime('%Y-%m-%d'),
+                    'cisaActionDue': (published + timedelta(days=51)).strftime('%Y-%m-%d'),
+                    'cisaRequiredAction': 'Apply mitigations per vendor instructions or discontinue use of the product.',
+                    'cisaVulnerabilityName': f"Vendor Product {sentence(rng, 3)[:-1]} Vulnerability"})
+    return {'cve': cve}
+
+
+def synthetic_cpe(index, rng, last_modified=None):
+    """ One element of the NVD 2.0 CPE API `products` array. """
+    vendor, product = f"vendor{index % 500}", f"product{index}"
+    version = f"{rng.randint(0, 20)}.{rng.randint(0, 9)}"
+    last_modified = last_modified or datetime(2024, 5, 1)
+    return {'cpe': {
+        'deprecated': False,
+        'cpeName': f"cpe:2.3:a:{vendor}:{product}:{version}:*:*:*:*:*:*:*",
+        'cpeNameId': f"{rng.getrandbits(128):032x}",
+        'lastModified': nvd_timestamp(last_modified),
+        'created': nvd_timestamp(last_modified - timedelta(days=rng.randint(0, 2000))),
+        'titles': [{'title': f"{vendor.title()} {product.title()} {version}", 'lang': 'en'}],
+        'refs': [{'ref': f"https://{vendor}.example.com/{product}", 'type': 'Vendor'}],
+    }}
+
+
+def api_page(array_key, elements, start_index, total_results, format_name):
+    """ An NVD 2.0 API page envelope around already decoded `elements`. """
+    return {
+        'resultsPerPage': len(elements), 'startIndex': start_index, 'totalResults': total_results,
+        'format': format_name, 'version': '2.0', 'timestamp': nvd_timestamp(datetime.now(timezone.utc)),
+        array_key: elements,
+    }
+
+
+def api_page_bytes(array_key, encoded_elements, start_index, total_results, format_name):
+    """ The same page assembled from elements that were JSON-encoded once up front. """
+    envelope = dict(api_page(array_key, [], start_index, total_results, format_name),
+                    resultsPerPage=len(encoded_elements))
+    envelope[array_key] = envelope.pop(array_key)  # Keep the array last
+    header = json.dumps(envelope)[:-3]
+    return b''.join((header.encode('utf-8'), b'[', b','.join(encoded_elements), b']}'))
+
+
+def synthetic_page(records, seed=0):
+    """ One full CVE API page of `records` vulnerabilities, encoded. """
+    rng = random.Random(seed)
+    return json.dumps(api_page('vulnerabilities', [synthetic_cve(i, rng) for i in range(records)],
+                               0, records, 'NVD_CVE')).encode('utf-8')
+
+
+def synthetic_kev_entry(identifier, rng, date_added=None):
+    """ One element of the CISA KEV catalog `vulnerabilities` array. """
+    date_added = date_added or datetime(2022, 1, 1) + timedelta(days=rng.randint(0, 900))
+    entry = {
+        'cveID': identifier,
+        'vendorProject': f"Vendor{rng.randint(0, 500)}",
+        'product': f"Product{rng.randint(0, 5000)}",
+        'vulnerabilityName': f"Vendor Product {sentence(rng, 3)[:-1]} Vulnerability",
+        'dateAdded': date_added.strftime('%Y-%m-%d'),
+        'shortDescription': sentence(rng, rng.randint(10, 30)),
+        'requiredAction': 'Apply mitigations per vendor instructions or discontinue use of the product.',
+        'dueDate': (date_added + timedelta(days=21)).strftime('%Y-%m-%d'),
+        'knownRansomwareCampaignUse': rng.choice(('Known', 'Unknown')),
+        'notes': f"https://nvd.nist.gov/vuln/detail/{identifier}",
+    }
+    if rng.random() < 0.8:
+        entry['cwes'] = [rng.choice(CWES)]
+    return entry
+
+
+def kev_catalog(entries, version='2024.05.01'):
+    """ The KEV catalog document around already generated entries. """
+    return {'title': 'CISA Catalog of Known Exploited Vulnerabilities', 'catalogVersion': version,
+            'dateReleased': datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.000Z'),
+            'count': len(entries), 'vulnerabilities': entries}
+
+
+def synthetic_plugin_item(index, rng, cve_ids=None, title=None):
+    """ One RSS <item> shaped like the Tenable plugin feeds; CVEs are drawn from `cve_ids` when given. """
+    count = rng.randint(0, 6)
+    cves = ', '.join(rng.choice(cve_ids) if cve_ids else f"CVE-{rng.randint(2015, 2024)}-{rng.randint(1000, 99999)}"
+                     for _ in range(count))
+    plugin_id = 200000 - index
+    description = (
+        f"<p>{rng.choice(PRODUCTS)} Plugin ID {plugin_id} with {rng.choice(SEVERITIES)} Severity</p>"
+        f"<h3>Synopsis</h3><span>The remote host is missing one or more security updates.</span>"
+        f"<h3>Description</h3><span>{'The remote host is affected by multiple vulnerabilities. ' * rng.randint(1, 12)}"
+        f"{cves}</span>"
+        f"<h3>Solution</h3><span>Update the affected packages.</span>"
+        f"<h3>See Also</h3><span>https://www.tenable.com/plugins/nessus/{plugin_id}</span>"
+    )
+    published = datetime(2024, 1, 1, tzinfo=timezone.utc) + timedelta(minutes=index)
+    return (f"<item><title>{escape(title or f'Synthetic plugin {index}')}</title>"
+            f"<link>https://www.tenable.com/plugins/nessus/{plugin_id}</link>"
+            f"<pubDate>{format_datetime(published)}</pubDate>"
+            f"<description>{escape(description)}</description></item>")
+
+
+def feed_xml(items):
+    """ A Tenable plugin RSS document around already rendered <item> strings. """
+    return ('<?xml version="1.0" encoding="UTF-8"?><rss version="2.0"><channel><title>Tenable Plugins</title>'
+            + ''.join(items) + '</channel></rss>').encode('utf-8')
+
+
+def write_feed(path, items, seed, cve_ids=None):
+    rng = random.Random(seed)
+    with open(path, 'w', encoding='utf-8') as file:
+        file.write('<?xml version="1.0" encoding="UTF-8"?><rss version="2.0"><channel><title>Tenable Plugins</title>')
+        for index in range(items):
+            file.write(synthetic_plugin_item(index, rng, cve_ids))
+        file.write('</channel></rss>')
@@ -1,3 +1,2 @@
-SELECT COUNT(PluginId) AS PluginIdCount
-FROM TenablePluginData
-WHERE CVEID IS NOT NULL;
\ No newline at end of file
+SELECT COUNT(DISTINCT plugin_id) AS PluginIdCount
+FROM plugin_cve;
\ No newline at end of file
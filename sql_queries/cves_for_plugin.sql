@@ -0,0 +1,3 @@
+SELECT cve_id
+FROM plugin_cve
+WHERE plugin_id = :plugin_id;
\ No newline at end of file
@@ -0,0 +1,5 @@
+SELECT DISTINCT w.cve_id
+FROM cve_weakness w
+JOIN cve_metric m ON m.cve_id = w.cve_id
+WHERE w.cwe_id = 'CWE-79'
+  AND m.base_score >= 9;
\ No newline at end of file
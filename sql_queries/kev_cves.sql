@@ -0,0 +1,5 @@
+SELECT k.cve_id, k.date_added, k.due_date, k.known_ransomware_campaign_use, k.vulnerability_name,
+       n.Published_Date, n.Last_Modified_Date
+FROM kev k
+LEFT JOIN nvd_data n ON n.CVE_ID = k.cve_id
+ORDER BY k.date_added DESC, k.cve_id;
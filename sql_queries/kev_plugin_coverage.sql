@@ -0,0 +1,4 @@
+SELECT cve_id, base_score, base_severity, kev_date_added, plugin_id, plugin_title
+FROM plugin_cve_correlation
+WHERE kev = 1
+ORDER BY base_score DESC, cve_id, plugin_id;
@@ -0,0 +1,4 @@
+SELECT p.*
+FROM plugin_cve pc
+JOIN TenablePluginData p ON p.PluginId = pc.plugin_id
+WHERE pc.cve_id = :cve_id;
\ No newline at end of file
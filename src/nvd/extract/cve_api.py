@@ -0,0 +1,163 @@
+import asyncio
+import os
+import ssl
+import time
+
+import aiohttp
+from dotenv import load_dotenv
+
+from nvd.utils import metrics
+from nvd.utils.json_stream import JsonArrayStream
+from nvd.utils.rate_limiter import RateLimiter
+
+# Load API key from .env file
+load_dotenv()
+NVD_API_KEY = os.getenv('NVD_API_KEY')
+
+# Define the base URL for the NVD API (override to point at a local stub server)
+BASE_URL_CVE = os.getenv('NVD_BASE_URL_CVE', "https://services.nvd.nist.gov/rest/json/cves/2.0")
+
+# Concurrency and quota settings; NVD allows keyed clients 50 requests per rolling 30 seconds
+MAX_CONCURRENCY = int(os.getenv('NVD_MAX_CONCURRENCY', 5))
+RATE_LIMIT_REQUESTS = int(os.getenv('NVD_RATE_LIMIT_REQUESTS', 50))
+RATE_LIMIT_WINDOW = float(os.getenv('NVD_RATE_LIMIT_WINDOW', 30))
+RESULTS_PER_PAGE = int(os.getenv('NVD_RESULTS_PER_PAGE', 2000))
+
+# Records travel to the writer in batches; a full channel pauses the fetchers
+BATCH_SIZE = int(os.getenv('NVD_BATCH_SIZE', 500))
+MAX_QUEUED_BATCHES = int(os.getenv('NVD_MAX_QUEUED_BATCHES', 16))
+
+# Retry settings for transient failures (403 when over quota, 5xx during NVD outages)
+MAX_RETRIES = int(os.getenv('NVD_MAX_RETRIES', 5))
+RETRY_BACKOFF = float(os.getenv('NVD_RETRY_BACKOFF', 6))
+RETRYABLE_STATUSES = {403, 429, 500, 502, 503, 504}
+
+# Endpoint label of the CVE API in the run metrics
+ENDPOINT = 'nvd_cves'
+
+# Create an SSL context that does not verify SSL certificates
+ssl_context = ssl.create_default_context()
+ssl_context.check_hostname = False
+ssl_context.verify_mode = ssl.CERT_NONE
+
+
+async def fetch_data(session, url, params, stream, archive=None):
+    """ Yield array elements of one API page as they are decoded from the response body.
+
+    With an `archive` the raw body is also stored there, once the whole page has arrived.
+    """
+    headers = {
+        'apiKey': NVD_API_KEY
+    }
+
+    start = time.perf_counter()
+    async with session.get(url, headers=headers, params=params, ssl=ssl_context) as response:
+        metrics.observe('http_request_duration_seconds', time.perf_counter() - start,
+                        endpoint=ENDPOINT, status=response.status)
+        response.raise_for_status()  # Raise an HTTPError for bad responses (4xx and 5xx)
+        page = archive.writer(ENDPOINT, params) if archive else None
+        try:
+            async for item in stream.iter_response(response, sink=page):
+                yield item
+            if page:
+                page.commit(stream.envelope)
+        finally:
+            if page:
+                page.close()
+
+
+async def replay_data(archive, params, stream):
+    """ Yield array elements of one archived API page, as fetch_data does for a live one. """
+    for item in stream.iter_chunks(archive.read(ENDPOINT, params)):
+        yield item
+
+
+def cve_records(schema, items):
+    """ The `schema` records (tuples) of a batch of the API's `vulnerabilities` array elements. """
+    return schema.rows([item.get('cve', {}) for item in items])
+
+
+class PageFetcher:
+    """ Fetches pages of the CVE API into a BatchChannel over one pooled session and rate limiter.
+
+    Each page's `vulnerabilities` elements are turned into `schema` records and put on
+    the channel, keyed by the page's start index, in batches of BATCH_SIZE while the rest
+    of the page is still downloading. Transient failures are retried with exponential
+    backoff. With `track_pages` the channel also gets a PAGE_ABORT when an attempt fails
+    after sending records and a PAGE_DONE (records, totalResults) once the page is in, for
+    a writer that groups batches by page. Pages are also stored in `archive` when one is
+    given, or with `replay` read back from it instead of the API.
+    """
+
+    def __init__(self, channel, schema, base_url=BASE_URL_CVE, archive=None, replay=False, track_pages=False,
+                 results_per_page=RESULTS_PER_PAGE):
+        self.channel = channel
+        self.schema = schema
+        self.results_per_page = results_per_page
+        self.base_url = base_url
+        self.archive = archive
+        self.replay = replay
+        self.track_pages = track_pages
+        self.session = None
+        self._limiter = RateLimiter(RATE_LIMIT_REQUESTS, RATE_LIMIT_WINDOW)
+        self._semaphore = asyncio.Semaphore(MAX_CONCURRENCY)
+
+    async def __aenter__(self):
+        connector = aiohttp.TCPConnector(limit=MAX_CONCURRENCY)
+        self.session = aiohttp.ClientSession(trust_env=True, connector=connector)
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.session.close()
+
+    async def _put_batch(self, start_index, items):
+        # The put runs in a thread so a full channel never blocks the other downloads
+        await asyncio.to_thread(self.channel.put_batch, start_index,
+                                cve_records(self.schema, items), self.schema.columns)
+        metrics.add_records('nvd_fetch', len(items))
+
+    async def fetch_page(self, params, start_index):
+        """ Fetch one page into the channel; returns the totalResults its envelope reports. """
+        params = dict(params, startIndex=start_index, resultsPerPage=self.results_per_page)
+        window = (f" ({params['lastModStartDate']} to {params['lastModEndDate']})"
+                  if 'lastModStartDate' in params else '')
+
+        for attempt in range(MAX_RETRIES + 1):
+            stream = JsonArrayStream('vulnerabilities')
+            record_count = 0
+            batch = []
+            try:
+                async with self._semaphore:
+                    if self.replay:
+                        items = replay_data(self.archive, params, stream)
+                    else:
+                        await self._limiter.acquire()
+                        items = fetch_data(self.session, self.base_url, params, stream, self.archive)
+                    print(f"{'Replaying' if self.replay else 'Fetching'} CVE data starting at index "
+                          f"{start_index}{window}")
+                    async for item in items:
+                        batch.append(item)
+                        record_count += 1
+                        if len(batch) >= BATCH_SIZE:
+                            await self._put_batch(start_index, batch)
+                            batch = []
+                    if batch:
+                        await self._put_batch(start_index, batch)
+                break
+            except (aiohttp.ClientResponseError, aiohttp.ClientConnectionError, aiohttp.ClientPayloadError,
+                    asyncio.TimeoutError) as e:
+                if record_count and self.track_pages:
+                    await asyncio.to_thread(self.channel.put_control, "PAGE_ABORT", start_index)
+                status = getattr(e, 'status', None)
+                if attempt == MAX_RETRIES or (status is not None and status not in RETRYABLE_STATUSES):
+                    raise
+                metrics.count('http_retries_total', endpoint=ENDPOINT, reason=status or type(e).__name__)
+                delay = RETRY_BACKOFF * 2 ** attempt
+                print(f"Page at index {start_index} failed ({status or e}), retrying in {delay:.0f}s")
+                await asyncio.sleep(delay)
+
+        total_results = stream.envelope.get('totalResults', 0)
+        if self.track_pages:
+            await asyncio.to_thread(self.channel.put_control, "PAGE_DONE", start_index,
+                                    (record_count, total_results))
+        return total_results
@@ -0,0 +1,114 @@
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import aiohttp
+
+sys.path.append(str(Path(__file__).resolve().parent.parent.parent))  # Make src/ importable
+from nvd.utils import metrics
+from nvd.utils.files import load_cache, save_cache, write_atomic
+
+# The CISA KEV catalog; a local path (e.g. a JSON fixture) or a stub server URL can stand in for it
+KEV_URL = os.getenv('KEV_URL', "https://www.cisa.gov/sites/default/files/feeds/known_exploited_vulnerabilities.json")
+
+# Catalog copy and its validator cache, independent of the working directory
+KEV_DATA_DIR = Path(__file__).resolve().parent.parent.parent.parent / 'data/kev_data'
+CATALOG_FILE = KEV_DATA_DIR / 'known_exploited_vulnerabilities.json'
+CACHE_FILE = KEV_DATA_DIR / 'kev_cache.json'
+
+MAX_RETRIES = int(os.getenv('KEV_MAX_RETRIES', 3))
+RETRY_BACKOFF = float(os.getenv('KEV_RETRY_BACKOFF', 2))
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+
+# Endpoint label of the catalog in the run metrics
+ENDPOINT = 'cisa_kev'
+
+
+async def download(source, entry, conditional):
+    """ GET the catalog; returns (content, etag, last_modified), with content None on a 304. """
+    headers = {}
+    if conditional and entry.get('etag'):
+        headers['If-None-Match'] = entry['etag']
+    if conditional and entry.get('last_modified'):
+        headers['If-Modified-Since'] = entry['last_modified']
+
+    async with aiohttp.ClientSession(trust_env=True) as session:
+        for attempt in range(MAX_RETRIES + 1):
+            try:
+                start = time.perf_counter()
+                async with session.get(source, headers=headers) as response:
+                    metrics.observe('http_request_duration_seconds', time.perf_counter() - start,
+                                    endpoint=ENDPOINT, status=response.status)
+                    if response.status == 304:
+                        return None, entry.get('etag'), entry.get('last_modified')
+                    response.raise_for_status()
+                    return (await response.read(), response.headers.get('ETag'),
+                            response.headers.get('Last-Modified'))
+            except (aiohttp.ClientResponseError, aiohttp.ClientConnectionError, aiohttp.ClientPayloadError,
+                    asyncio.TimeoutError) as e:
+                status = getattr(e, 'status', None)
+                if attempt == MAX_RETRIES or (status is not None and status not in RETRYABLE_STATUSES):
+                    raise
+                metrics.count('http_retries_total', endpoint=ENDPOINT, reason=status or type(e).__name__)
+                delay = RETRY_BACKOFF * 2 ** attempt
+                print(f"KEV catalog {source} failed ({status or e}), retrying in {delay:.0f}s")
+                await asyncio.sleep(delay)
+
+
+async def fetch_catalog(source=KEV_URL, output_file=CATALOG_FILE, cache_path=CACHE_FILE):
+    """ Refresh the local copy of the KEV catalog from `source`, a URL or a local JSON file.
+
+    A 304, or a catalog whose content hashes the same as last time, leaves `output_file`
+    untouched, so its modification time only moves when the catalog changed.
+    Returns True when a new version was written.
+    """
+    output_file = Path(output_file)
+    output_file.parent.mkdir(parents=True, exist_ok=True)
+    Path(cache_path).parent.mkdir(parents=True, exist_ok=True)
+    cache = load_cache(cache_path)
+    entry = cache.get(str(source), {})
+
+    with metrics.stage('kev_fetch') as stage:
+        if str(source).startswith(('http://', 'https://')):
+            content, etag, last_modified = await download(source, entry, conditional=output_file.exists())
+        else:
+            content, etag, last_modified = await asyncio.to_thread(Path(source).read_bytes), None, None
+        if content is None:
+            print(f"Not modified: {source}")
+            return False
+        catalog = json.loads(content)  # Never replace a good copy with a truncated or error page
+        stage.add(len(catalog.get('vulnerabilities', [])))
+
+    digest = hashlib.sha256(content).hexdigest()
+    changed = digest != entry.get('sha256') or not output_file.exists()
+    if changed:
+        write_atomic(output_file, content)
+        print(f"Saved KEV catalog {catalog.get('catalogVersion')} "
+              f"({len(catalog.get('vulnerabilities', []))} entries) to {output_file}")
+    else:
+        print(f"Unchanged content: {source}")
+    cache[str(source)] = {'etag': etag, 'last_modified': last_modified, 'sha256': digest,
+                          'fetched_at': datetime.now(timezone.utc).isoformat()}
+    save_cache(cache, cache_path)
+    return changed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Download the CISA KEV catalog, skipping an unchanged one.")
+    parser.add_argument('--source', default=KEV_URL, help="Catalog URL, or a local JSON file such as a fixture")
+    parser.add_argument('--output-file', type=Path, default=CATALOG_FILE, help="Where to keep the catalog copy")
+    args = parser.parse_args()
+
+    changed = asyncio.run(fetch_catalog(args.source, args.output_file))
+    print(f"KEV catalog {'changed' if changed else 'unchanged'}")
+
+
+if __name__ == "__main__":
+    with metrics.run('kev_fetch'):
+        main()
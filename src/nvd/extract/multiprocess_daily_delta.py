@@ -1,30 +1,42 @@
 import os
+import argparse
 import asyncio
-import aiohttp
 from dotenv import load_dotenv
 import pandas as pd
-import ssl
-from datetime import datetime, timezone
-from multiprocessing import Process, Queue
+from datetime import datetime, timedelta, timezone
+import sys
 from pathlib import Path
 
-# Load API key from .env file
+sys.path.append(str(Path(__file__).resolve().parent.parent.parent))  # Make src/ importable
+from nvd.extract.cve_api import BASE_URL_CVE, ENDPOINT, MAX_QUEUED_BATCHES, NVD_API_KEY, PageFetcher
+from nvd.utils.batch_queue import BatchChannel
+from nvd.utils.processes import context
+from nvd.utils.page_archive import ARCHIVE_DIR, COMPRESSIONS, DEFAULT_COMPRESSION, PageArchive
+from nvd.utils.writers import OUTPUT_FORMATS, open_writer, read_frame
+from nvd.utils.schema import DELTA_SCHEMA
+from nvd.utils import metrics, store
+from nvd.utils.normalize import batch_child_rows
+from nvd.utils.correlation import format_refresh, refresh
+from nvd.extract.extract_kev import CATALOG_FILE as KEV_CATALOG_FILE, KEV_URL, fetch_catalog
+from nvd.load.create_database_and_import import start_load, write_chunk
+from nvd.load.load_kev import load as load_kev
+
+# Load environment variables
 load_dotenv()
-NVD_API_KEY = os.getenv('NVD_API_KEY')
 
-if not NVD_API_KEY:
-    print("API key not found. Please ensure it is set in the .env file.")
-    exit(1)
+# The API rejects lastModStartDate/lastModEndDate ranges longer than 120 days
+MAX_WINDOW_DAYS = 120
 
-# Define the base URL for the NVD API
-BASE_URL_CVE = "https://services.nvd.nist.gov/rest/json/cves/2.0"
+# Delta files and the file-mode watermark, independent of the working directory
+NVD_DATA_DIR = Path(__file__).resolve().parent.parent.parent.parent / 'data/nvd_data'
+LAST_MODIFIED_FILE = NVD_DATA_DIR / 'nvd_daily_deltas.csv'
+WATERMARK_NAME = 'cve_last_modified'
 
-# Create an SSL context that does not verify SSL certificates
-ssl_context = ssl.create_default_context()
-ssl_context.check_hostname = False
-ssl_context.verify_mode = ssl.CERT_NONE
 
-LAST_MODIFIED_FILE = 'nvd_daily_deltas.csv'
+def require_api_key():
+    if not NVD_API_KEY:
+        print("API key not found. Please ensure it is set in the .env file.")
+        exit(1)
 
 
 def read_last_modified_date():
@@ -40,139 +52,286 @@ def write_last_modified_date(last_modified):
     df.to_csv(LAST_MODIFIED_FILE, index=False)
 
 
-async def fetch_data(session, url, params):
-    headers = {
-        'apiKey': NVD_API_KEY
+def latest_last_modified(path):
+    """ Latest 'Last Modified Date' in a delta file or dataset, in the stored text form; None when it is empty. """
+    df = read_frame(path, columns=['Last Modified Date'])
+    dates = pd.to_datetime(df['Last Modified Date'], errors='coerce', utc=True, format='ISO8601').dropna()
+    if dates.empty:
+        return None
+    return store.canonical_timestamp(dates.max())
+
+
+def parse_timestamp(value):
+    """ Parse an NVD timestamp; values without an offset are UTC. """
+    timestamp = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.replace(tzinfo=timezone.utc)
+    return timestamp
+
+
+def split_windows(start, end, max_days=MAX_WINDOW_DAYS):
+    """ Split [start, end) into consecutive windows no longer than the API allows. """
+    windows = []
+    while start < end:
+        window_end = min(start + timedelta(days=max_days), end)
+        windows.append((start, window_end))
+        start = window_end
+    return windows
+
+
+def archived_windows(archive, last_modified=None):
+    """ The lastModified windows of the archived pages that end after `last_modified`, oldest first.
+
+    Replay runs these instead of the windows up to now. Pages archived without a range
+    (a full fetch) count as one unbounded window, replayed only when there is no watermark.
+    """
+    windows = set()
+    for entry in archive.pages(ENDPOINT):
+        params = entry['params']
+        if params.get('startIndex') != '0':
+            continue
+        if 'lastModStartDate' not in params:
+            if last_modified is None:
+                windows.add(None)
+            continue
+        window = (parse_timestamp(params['lastModStartDate']), parse_timestamp(params['lastModEndDate']))
+        if last_modified is None or window[1] > parse_timestamp(last_modified):
+            windows.add(window)
+    return sorted(windows, key=lambda window: window or ())
+
+
+def window_params(window):
+    if window is None:
+        return {}
+    start, end = window
+    return {
+        'lastModStartDate': start.isoformat(timespec='milliseconds'),
+        'lastModEndDate': end.isoformat(timespec='milliseconds')
     }
 
-    async with session.get(url, headers=headers, params=params, ssl=ssl_context) as response:
-        response.raise_for_status()  # Raise an HTTPError for bad responses (4xx and 5xx)
-        print(f"Response status code: {response.status}")
-        json_response = await response.json()
-        return json_response
-
-
-async def extract_data(queue, base_url, params):
-    start_index = 0
-    results_per_page = 2000
-
-    async with aiohttp.ClientSession() as session:
-        while True:
-            params.update({
-                'startIndex': start_index,
-                'resultsPerPage': results_per_page
-            })
-
-            print(f"Fetching CVE data starting at index {start_index}")
-            data = await fetch_data(session, base_url, params)
-            if not data:
-                break
-
-            items = data.get('vulnerabilities', [])
-            for item in items:
-                cve_item = item.get('cve', {})
-                cve_id = cve_item.get('id', 'N/A')
-                source_identifier = cve_item.get('sourceIdentifier', 'N/A')
-                vuln_status = cve_item.get('vulnStatus', 'N/A')
-                published_date = cve_item.get('published', 'N/A')
-                last_modified_date = cve_item.get('lastModified', 'N/A')
-                evaluator_comment = cve_item.get('evaluatorComment', 'N/A')
-                evaluator_solution = cve_item.get('evaluatorSolution', 'N/A')
-                evaluator_impact = cve_item.get('evaluatorImpact', 'N/A')
-                cisa_exploit_add = cve_item.get('cisaExploitAdd', 'N/A')
-                cisa_action_due = cve_item.get('cisaActionDue', 'N/A')
-                cisa_required_action = cve_item.get('cisaRequiredAction', 'N/A')
-                cisa_vulnerability_name = cve_item.get('cisaVulnerabilityName', 'N/A')
-                cve_tags = cve_item.get('cveTags', [])
-                descriptions = cve_item.get('descriptions', [])
-                references = cve_item.get('references', [])
-                metrics = cve_item.get('metrics', {})
-                weaknesses = cve_item.get('weaknesses', [])
-                configurations = cve_item.get('configurations', [])
-                vendor_comments = cve_item.get('vendorComments', [])
-
-                description = next((desc.get('value') for desc in descriptions if desc.get('lang') == 'en'), 'N/A')
-
-                queue.put({
-                    'CVE ID': cve_id,
-                    'Source Identifier': source_identifier,
-                    'Vulnerability Status': vuln_status,
-                    'Published Date': published_date,
-                    'Last Modified Date': last_modified_date,
-                    'Evaluator Comment': evaluator_comment,
-                    'Evaluator Solution': evaluator_solution,
-                    'Evaluator Impact': evaluator_impact,
-                    'CISA Exploit Add': cisa_exploit_add,
-                    'CISA Action Due': cisa_action_due,
-                    'CISA Required Action': cisa_required_action,
-                    'CISA Vulnerability Name': cisa_vulnerability_name,
-                    'CVE Tags': cve_tags,
-                    'Description': description,
-                    'References': ', '.join([ref.get('url', 'N/A') for ref in references]),
-                    'Metrics': metrics,
-                    'Weaknesses': weaknesses,
-                    'Configurations': configurations,
-                    'Vendor Comments': vendor_comments
-                })
-
-            total_results = data.get('totalResults', 0)
-            if start_index + results_per_page >= total_results:
-                break
-
-            start_index += results_per_page
-            await asyncio.sleep(6)  # Respect NVD API rate limits
-
-    queue.put("DONE")
-
-
-def save_data_to_csv(queue, output_file):
-    data_items = []
-    while True:
-        item = queue.get()
-        if item == "DONE":
-            break
-        data_items.append(item)
-        if len(data_items) >= 100:  # Write in batches of 100
-            df = pd.DataFrame(data_items)
-            df.to_csv(output_file, mode='a', header=not os.path.exists(output_file), index=False)
-            data_items = []
-            print(f"Batch of 100 items saved to {output_file}")
-
-    if data_items:
-        df = pd.DataFrame(data_items)
-        df.to_csv(output_file, mode='a', header=not os.path.exists(output_file), index=False)
-        print(f"Remaining items saved to {output_file}")
 
-
-async def main():
-    base_dir = Path(__file__).resolve().parent
-    output_dir = base_dir / '../data/nvd_data'
-    output_dir.mkdir(parents=True, exist_ok=True)
-
-    output_file = output_dir / 'nvd_cve_data.csv'
-    queue = Queue()
-    writer_process = Process(target=save_data_to_csv, args=(queue, output_file))
+async def fetch_window(fetcher, window):
+    params = window_params(window)
+    # The first page tells us how many pages the window has; the rest are fetched concurrently
+    total_results = await fetcher.fetch_page(params, 0)
+    await asyncio.gather(*(
+        fetcher.fetch_page(params, start_index)
+        for start_index in range(fetcher.results_per_page, total_results, fetcher.results_per_page)
+    ))
+    return total_results
+
+
+async def extract_data(channel, base_url, windows, archive=None, replay=False):
+    """ Fetch every window concurrently, sharing one rate limiter and connection pool.
+
+    Pages are also stored in `archive` when one is given, or with `replay` read back from it.
+    """
+    with metrics.stage('nvd_fetch'):
+        async with PageFetcher(channel, DELTA_SCHEMA, base_url, archive, replay) as fetcher:
+            totals = await asyncio.gather(*(fetch_window(fetcher, window) for window in windows))
+    print(f"{sum(totals)} modified CVEs reported across {len(windows)} windows")
+
+
+def save_data(channel, output_file, output_format):
+    """ Merge the delta by CVE ID (latest lastModified wins) and write it once the run is complete.
+
+    Windows and pages arrive in any order, and a retried page may resend
+    records, so rows are kept in memory until the end; a delta is small
+    compared with the full feed.
+    """
+    latest_rows = {}
+    columns = None
+    complete = False
+    for kind, _, batch in channel:
+        if kind == "RUN_COMPLETE":
+            complete = True
+            continue
+        metrics.record_queue('nvd_delta', channel.stats())
+        with metrics.stage('merge') as stage:
+            columns = batch.columns
+            key = columns.index('CVE ID')
+            position = columns.index('Last Modified Date')
+            for row in batch.rows:
+                current = latest_rows.get(row[key])
+                # A record without a lastModified sorts before any dated version of the same CVE
+                if current is None or (row[position] or '') >= (current[position] or ''):
+                    latest_rows[row[key]] = row
+            stage.add(len(batch))
+
+    if not complete:
+        print("Delta run did not complete; nothing written")
+        return
+    if latest_rows:
+        with metrics.stage('write') as stage:
+            writer = open_writer(output_format, output_file)
+            writer.write(pd.DataFrame.from_records(list(latest_rows.values()), columns=columns))
+            writer.close()
+            stage.add(len(latest_rows))
+        print(f"{len(latest_rows)} items saved to {output_file}")
+
+
+def run_writer(target, *args):
+    """ Writer process entry point: record `target` as the run's own `nvd_delta_writer` metrics. """
+    with metrics.run('nvd_delta_writer'):
+        target(*args)
+
+
+def upsert_data(channel, database_path, tenable_database=store.TENABLE_DATABASE_PATH):
+    """ Upsert the delta records batch by batch and advance the watermark once the run is complete.
+
+    Each batch goes through the loader's upsert (write_chunk) in its own short
+    transaction, so the database is only locked while a batch is written, never while
+    the fetcher waits on the network. The watermark is committed in a final transaction
+    once the fetcher reports a complete run. Batches committed by a run that fails are
+    harmless: the upsert keeps the latest version of each CVE, and the unmoved watermark
+    makes the next run fetch the same window again. After the watermark commit the
+    plugin/CVE correlation in `tenable_database` is refreshed for the changed CVEs.
+    """
+    conn = store.connect(database_path)
+    latest = None
+    complete = False
+    upserted = 0
+    try:
+        for kind, _, batch in channel:
+            if kind == "RUN_COMPLETE":
+                complete = True
+                continue
+            metrics.record_queue('nvd_delta', channel.stats())
+            with metrics.stage('upsert') as stage:
+                columns = [store.sanitize_column(column) for column in batch.columns]
+                conn.execute('BEGIN IMMEDIATE')
+                if not upserted:
+                    start_load(conn, False, columns)
+                write_chunk(conn, False, columns, batch.rows, batch_child_rows(columns, batch.rows))
+                conn.commit()
+                stage.add(len(batch))
+            upserted += len(batch)
+            position = batch.columns.index('Last Modified Date')
+            batch_latest = max((parse_timestamp(row[position]) for row in batch.rows if row[position]), default=None)
+            if batch_latest and (latest is None or batch_latest > latest):
+                latest = batch_latest
+
+        if not complete:
+            raise RuntimeError("Delta run did not complete; the watermark was not advanced")
+        with metrics.stage('commit'):
+            if latest:
+                conn.execute('BEGIN IMMEDIATE')
+                store.write_watermark(conn, WATERMARK_NAME, store.canonical_timestamp(latest))
+                conn.commit()
+        print(f"{upserted} items upserted, watermark now {store.read_watermark(conn, WATERMARK_NAME)}")
+    except Exception:
+        if conn.in_transaction:
+            conn.rollback()
+        raise
+    finally:
+        conn.close()
+    if upserted and tenable_database:
+        # Re-join only the plugins covering the CVEs this delta changed
+        print(format_refresh(refresh(tenable_database, database_path)))
+
+
+async def run_delta(last_modified, writer, *writer_args, archive=None, replay=False):
+    """ Fetch the CVEs modified since `last_modified` (everything when None) into a writer process.
+
+    `writer(channel, *writer_args)` runs in its own process and consumes the batches
+    while they are fetched. The raw pages are also stored in `archive` when one is given;
+    with `replay` the archived windows after `last_modified` are read from it instead of
+    the API. Raises if the writer process fails.
+    """
+    if replay:
+        windows = archived_windows(archive, last_modified)
+        print(f"Replaying {len(windows)} archived windows from {archive.directory}")
+    elif last_modified:
+        windows = split_windows(parse_timestamp(last_modified), datetime.now(timezone.utc))
+    else:
+        windows = [None]  # No watermark yet: fetch everything without a lastMod range
+
+    channel = BatchChannel(MAX_QUEUED_BATCHES)
+    writer_process = context.Process(target=run_writer, args=(writer, channel, *writer_args))
     writer_process.start()
-
-    last_modified = read_last_modified_date()
-    current_time = datetime.now(timezone.utc).isoformat() + 'Z'
-
-    params = {}
-    if last_modified:
-        params['lastModStartDate'] = last_modified
-        params['lastModEndDate'] = current_time
-
-    await extract_data(queue, BASE_URL_CVE, params)
-    queue.put("DONE")
-    writer_process.join()
-
-    # Update the last modified date
+    channel.attach(writer_process)
+
+    try:
+        await extract_data(channel, BASE_URL_CVE, windows, archive, replay)
+        # Puts on a full channel block, so they run off the event loop like the batch puts
+        await asyncio.to_thread(channel.put_control, "RUN_COMPLETE")
+    finally:
+        await asyncio.to_thread(channel.close)
+        await asyncio.to_thread(writer_process.join)
+    if writer_process.exitcode:
+        raise RuntimeError(f"Delta writer process exited with code {writer_process.exitcode}")
+
+
+async def save_delta(output_format, archive=None, replay=False):
+    """ Append the delta to the CSV or Parquet extract and advance the file-mode watermark. """
+    if output_format == 'parquet':
+        # Parquet files cannot be appended to, so each run adds one part file to a dataset directory
+        output_path = NVD_DATA_DIR / 'nvd_cve_data'
+        output_path.mkdir(parents=True, exist_ok=True)
+        output_file = output_path / f"part-{datetime.now(timezone.utc):%Y%m%dT%H%M%S}.parquet"
+    else:
+        output_path = output_file = NVD_DATA_DIR / 'nvd_cve_data.csv'
+    await run_delta(read_last_modified_date(), save_data, output_file, output_format, archive=archive, replay=replay)
+
+    # Update the last modified date, reading only the column it needs
     if os.path.exists(output_file):
-        df = pd.read_csv(output_file)
-        if not df.empty:
-            last_modified_date = df['Last Modified Date'].max()
+        last_modified_date = latest_last_modified(output_path)
+        if last_modified_date:
             write_last_modified_date(last_modified_date)
 
 
+async def main():
+    parser = argparse.ArgumentParser(description="Fetch CVEs modified since the last run.")
+    parser.add_argument('--output-format', choices=OUTPUT_FORMATS, default='csv',
+                        help="Append to a CSV (default) or add a typed, compressed Parquet part file")
+    parser.add_argument('--upsert', action='store_true',
+                        help="Upsert into the SQLite store keyed on CVE ID and keep the watermark there")
+    parser.add_argument('--database', type=Path, default=store.DATABASE_PATH,
+                        help="SQLite store used by --upsert")
+    parser.add_argument('--tenable-database', type=Path, default=store.TENABLE_DATABASE_PATH,
+                        help="Tenable SQLite database whose plugin/CVE correlation --upsert refreshes")
+    parser.add_argument('--kev', action='store_true',
+                        help="Also refresh the CISA KEV catalog, fetched while the delta runs, into --database")
+    parser.add_argument('--kev-source', default=KEV_URL, help="KEV catalog URL, or a local JSON file")
+    parser.add_argument('--archive-pages', action='store_true',
+                        help="Also keep every raw API page, compressed, in the page archive")
+    parser.add_argument('--replay', action='store_true',
+                        help="Read the archived windows after the watermark instead of calling the API")
+    parser.add_argument('--archive-dir', type=Path, default=ARCHIVE_DIR, help="Page archive directory")
+    parser.add_argument('--archive-compression', choices=COMPRESSIONS, default=DEFAULT_COMPRESSION,
+                        help="Compression of newly archived pages")
+    args = parser.parse_args()
+    if args.archive_pages and args.replay:
+        parser.error("--archive-pages and --replay are mutually exclusive")
+    if not args.replay:
+        require_api_key()
+    archive = PageArchive(args.archive_dir, args.archive_compression) if args.archive_pages or args.replay else None
+
+    NVD_DATA_DIR.mkdir(parents=True, exist_ok=True)
+    # The catalog downloads alongside the delta; it is loaded once the delta has released the database
+    kev_fetch = asyncio.ensure_future(fetch_catalog(args.kev_source)) if args.kev else None
+
+    try:
+        if args.upsert:
+            conn = store.connect(args.database)
+            last_modified = store.read_watermark(conn, WATERMARK_NAME)
+            conn.close()
+            # The watermark is committed after the last upserted batch
+            await run_delta(last_modified, upsert_data, args.database, args.tenable_database,
+                            archive=archive, replay=args.replay)
+        else:
+            await save_delta(args.output_format, archive, args.replay)
+
+        if kev_fetch:
+            await kev_fetch
+            load_kev(KEV_CATALOG_FILE, args.database, args.tenable_database)
+    finally:
+        # A failed delta must not leave the catalog download running, or its error unretrieved
+        if kev_fetch:
+            kev_fetch.cancel()  # A no-op once the download has finished
+            await asyncio.gather(kev_fetch, return_exceptions=True)
+
+
 if __name__ == "__main__":
-    asyncio.run(main())
+    with metrics.run('nvd_delta'):
+        asyncio.run(main())
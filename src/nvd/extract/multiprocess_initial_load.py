@@ -1,176 +1,180 @@
 import os
+import argparse
 import asyncio
-import aiohttp
 from dotenv import load_dotenv
 import pandas as pd
-import ssl
-from datetime import datetime, timezone
-from multiprocessing import Process, Queue
+import sys
 from pathlib2 import Path
 
+sys.path.append(str(Path(__file__).resolve().parent.parent.parent))  # Make src/ importable
+from nvd.extract.cve_api import MAX_QUEUED_BATCHES, NVD_API_KEY, RESULTS_PER_PAGE, PageFetcher
+from nvd.utils import metrics
+from nvd.utils.checkpoint import CheckpointManifest
+from nvd.utils.batch_queue import BatchChannel
+from nvd.utils.processes import context
+from nvd.utils.page_archive import ARCHIVE_DIR, COMPRESSIONS, DEFAULT_COMPRESSION, PageArchive
+from nvd.utils.writers import OUTPUT_FORMATS, FILE_SUFFIXES, open_writer, read_frame
+from nvd.utils.schema import INITIAL_LOAD_SCHEMA
+
 # Load environment variables
 load_dotenv()
-NVD_API_KEY = os.getenv('NVD_API_KEY')
-
-if not NVD_API_KEY:
-    print("API key not found. Please ensure it is set in the .env file.")
-    exit(1)
-
-# Define the base URL for the NVD API
-BASE_URL_CVE = "https://services.nvd.nist.gov/rest/json/cves/2.0"
-
-# Create an SSL context that does not verify SSL certificates
-ssl_context = ssl.create_default_context()
-ssl_context.check_hostname = False
-ssl_context.verify_mode = ssl.CERT_NONE
-
-
-async def fetch_data(session, url, params):
-    headers = {
-        'apiKey': NVD_API_KEY
-    }
-
-    async with session.get(url, headers=headers, params=params, ssl=ssl_context) as response:
-        response.raise_for_status()  # Raise an HTTPError for bad responses (4xx and 5xx)
-        print(f"Response status code: {response.status}")
-        json_response = await response.json()
-        return json_response
-
-
-async def extract_data(queue):
-    start_index = 0
-    results_per_page = 2000
-
-    async with aiohttp.ClientSession(trust_env=True) as session:
-        while True:
-            params = {
-                'startIndex': start_index,
-                'resultsPerPage': results_per_page
-            }
-
-            print(f"Fetching CVE data starting at index {start_index}")
-            data = await fetch_data(session, BASE_URL_CVE, params)
-            if not data:
-                break
-
-            items = data.get('vulnerabilities', [])
-            for item in items:
-                cve_item = item.get('cve', {})
-                cve_id = cve_item.get('id', 'N/A')
-                source_identifier = cve_item.get('sourceIdentifier', 'N/A')
-                vuln_status = cve_item.get('vulnStatus', 'N/A')
-                published_date = cve_item.get('published', 'N/A')
-                last_modified_date = cve_item.get('lastModified', 'N/A')
-                evaluator_comment = cve_item.get('evaluatorComment', 'N/A')
-                evaluator_solution = cve_item.get('evaluatorSolution', 'N/A')
-                evaluator_impact = cve_item.get('evaluatorImpact', 'N/A')
-                cisa_exploit_add = cve_item.get('cisaExploitAdd', 'N/A')
-                cisa_action_due = cve_item.get('cisaActionDue', 'N/A')
-                cisa_required_action = cve_item.get('cisaRequiredAction', 'N/A')
-                cisa_vulnerability_name = cve_item.get('cisaVulnerabilityName', 'N/A')
-                cve_tags = cve_item.get('cveTags', [])
-                descriptions = cve_item.get('descriptions', [])
-                references = cve_item.get('references', [])
-                metrics = cve_item.get('metrics', {})
-                weaknesses = cve_item.get('weaknesses', [])
-                configurations = cve_item.get('configurations', [])
-                vendor_comments = cve_item.get('vendorComments', [])
-
-                description = next((desc.get('value') for desc in descriptions if desc.get('lang') == 'en'), 'N/A')
-
-                cvss_v3 = metrics.get('cvssMetricV31', [{}])[0].get('cvssData', {})
-
-                queue.put({
-                    'CVE ID': cve_id,
-                    'Source Identifier': source_identifier,
-                    'Vulnerability Status': vuln_status,
-                    'Published Date': published_date,
-                    'Last Modified Date': last_modified_date,
-                    'Evaluator Comment': evaluator_comment,
-                    'Evaluator Solution': evaluator_solution,
-                    'Evaluator Impact': evaluator_impact,
-                    'CISA Exploit Add': cisa_exploit_add,
-                    'CISA Action Due': cisa_action_due,
-                    'CISA Required Action': cisa_required_action,
-                    'CISA Vulnerability Name': cisa_vulnerability_name,
-                    'CVE Tags': cve_tags,
-                    'Description': description,
-                    'References': ', '.join([ref.get('url', 'N/A') for ref in references]),
-                    'CVSSv3 Version': cvss_v3.get('version', 'N/A'),
-                    'CVSSv3 Vector String': cvss_v3.get('vectorString', 'N/A'),
-                    'CVSSv3 Attack Vector': cvss_v3.get('attackVector', 'N/A'),
-                    'CVSSv3 Attack Complexity': cvss_v3.get('attackComplexity', 'N/A'),
-                    'CVSSv3 Privileges Required': cvss_v3.get('privilegesRequired', 'N/A'),
-                    'CVSSv3 User Interaction': cvss_v3.get('userInteraction', 'N/A'),
-                    'CVSSv3 Scope': cvss_v3.get('scope', 'N/A'),
-                    'CVSSv3 Confidentiality Impact': cvss_v3.get('confidentialityImpact', 'N/A'),
-                    'CVSSv3 Integrity Impact': cvss_v3.get('integrityImpact', 'N/A'),
-                    'CVSSv3 Availability Impact': cvss_v3.get('availabilityImpact', 'N/A'),
-                    'CVSSv3 Base Score': cvss_v3.get('baseScore', 'N/A'),
-                    'CVSSv3 Base Severity': cvss_v3.get('baseSeverity', 'N/A'),
-                    'CVSSv3 Exploit Code Maturity': metrics.get('exploitCodeMaturity', 'N/A'),
-                    'CVSSv3 Remediation Level': metrics.get('remediationLevel', 'N/A'),
-                    'CVSSv3 Report Confidence': metrics.get('reportConfidence', 'N/A'),
-                    'CVSSv3 Temporal Score': metrics.get('temporalScore', 'N/A'),
-                    'CVSSv3 Temporal Severity': metrics.get('temporalSeverity', 'N/A'),
-                    'CVSSv3 Confidentiality Requirement': metrics.get('confidentialityRequirement', 'N/A'),
-                    'CVSSv3 Integrity Requirement': metrics.get('integrityRequirement', 'N/A'),
-                    'CVSSv3 Availability Requirement': metrics.get('availabilityRequirement', 'N/A'),
-                    'CVSSv3 Modified Attack Vector': metrics.get('modifiedAttackVector', 'N/A'),
-                    'CVSSv3 Modified Attack Complexity': metrics.get('modifiedAttackComplexity', 'N/A'),
-                    'CVSSv3 Modified Privileges Required': metrics.get('modifiedPrivilegesRequired', 'N/A'),
-                    'CVSSv3 Modified User Interaction': metrics.get('modifiedUserInteraction', 'N/A'),
-                    'CVSSv3 Modified Scope': metrics.get('modifiedScope', 'N/A'),
-                    'CVSSv3 Modified Confidentiality Impact': metrics.get('modifiedConfidentialityImpact', 'N/A'),
-                    'CVSSv3 Modified Integrity Impact': metrics.get('modifiedIntegrityImpact', 'N/A'),
-                    'CVSSv3 Modified Availability Impact': metrics.get('modifiedAvailabilityImpact', 'N/A'),
-                    'CVSSv3 Environmental Score': metrics.get('environmentalScore', 'N/A'),
-                    'CVSSv3 Environmental Severity': metrics.get('environmentalSeverity', 'N/A')
-                })
-
-            total_results = data.get('totalResults', 0)
-            if start_index + results_per_page >= total_results:
-                break
-
-            start_index += results_per_page
-            await asyncio.sleep(6)  # Respect NVD API rate limits
-
-    queue.put("DONE")
-
-
-def save_data_to_csv(queue, output_file):
-    data_items = []
-    while True:
-        item = queue.get()
-        if item == "DONE":
-            break
-        data_items.append(item)
-        if len(data_items) >= 100:  # Write in batches of 100
-            df = pd.DataFrame(data_items)
-            df.to_csv(output_file, mode='a', header=not os.path.exists(output_file), index=False)
-            data_items = []
-            print(f"Batch of 100 items saved to {output_file}")
-
-    if data_items:
-        df = pd.DataFrame(data_items)
-        df.to_csv(output_file, mode='a', header=not os.path.exists(output_file), index=False)
-        print(f"Remaining items saved to {output_file}")
+
+# Where the extract, its page files and checkpoint manifest are written
+NVD_DATA_DIR = Path(__file__).resolve().parent.parent.parent.parent / 'data/nvd_data'
+
+
+async def extract_data(channel, manifest, archive=None, replay=False):
+    """ Fetch every page not yet in `manifest`; returns the start indexes of the pages that failed.
+
+    Pages are also stored in `archive` when one is given, or with `replay` read back from it.
+    """
+    results_per_page = RESULTS_PER_PAGE
+    with metrics.stage('nvd_fetch'):
+        async with PageFetcher(channel, INITIAL_LOAD_SCHEMA, archive=archive, replay=replay, track_pages=True,
+                               results_per_page=results_per_page) as fetcher:
+            # The first page tells us how many pages there are; the rest are fetched concurrently.
+            # A resumed load fetches it again too: the feed has usually grown since the checkpoint
+            if manifest.pages:
+                print(f"Resuming from checkpoint, {len(manifest.pages)} pages already written")
+            checkpoint_total = manifest.total_results
+            total_results = await fetcher.fetch_page({}, 0)
+            manifest.extend(total_results)
+            if checkpoint_total is not None and manifest.total_results != checkpoint_total:
+                print(f"totalResults grew from {checkpoint_total} to {manifest.total_results} since the checkpoint")
+            total_results = manifest.total_results
+
+            pending = [start_index for start_index in range(results_per_page, total_results, results_per_page)
+                       if not manifest.is_written(start_index)]
+            results = await asyncio.gather(*(
+                fetcher.fetch_page({}, start_index) for start_index in pending
+            ), return_exceptions=True)
+
+    failed = []
+    for start_index, result in zip(pending, results):
+        if isinstance(result, Exception):
+            print(f"Page at index {start_index} failed: {result}")
+            failed.append(start_index)
+    return failed
+
+
+def page_file_path(pages_dir, start_index, output_format):
+    return Path(pages_dir) / f'page_{start_index:08d}{FILE_SUFFIXES[output_format]}'
+
+
+def save_data(channel, output_file, pages_dir, manifest_file, results_per_page, output_format):
+    """ Write each fetched page to its own file and record it in the checkpoint manifest.
+
+    Page files are replaced rather than appended to, so refetching a page after a
+    failed run cannot duplicate rows. Once every page is written the pages are
+    stitched into `output_file`, which is rewritten from scratch each time.
+    """
+    manifest = CheckpointManifest.load(manifest_file, results_per_page)
+    # Pages are fetched concurrently, so their batches arrive interleaved and are grouped here
+    pending_pages = {}
+    for kind, start_index, payload in channel:
+        if kind == "BATCH":
+            pending_pages.setdefault(start_index, []).append(payload)
+        elif kind == "PAGE_ABORT":
+            # The page failed part way through and will be refetched from scratch
+            pending_pages.pop(start_index, None)
+        elif kind == "PAGE_DONE":
+            metrics.record_queue('nvd_initial_load', channel.stats())
+            record_count, total_results = payload
+            with metrics.stage('write_page') as stage:
+                batches = pending_pages.pop(start_index, [])
+                columns = batches[0].columns if batches else None
+                rows = [row for batch in batches for row in batch.rows]
+                page_file = page_file_path(pages_dir, start_index, output_format)
+                if rows:
+                    tmp_file = page_file.with_suffix('.tmp')
+                    writer = open_writer(output_format, tmp_file, append=False)
+                    writer.write(pd.DataFrame.from_records(rows, columns=columns))
+                    writer.close()
+                    os.replace(tmp_file, page_file)
+                manifest.extend(total_results)
+                manifest.mark_written(start_index, record_count, page_file)
+                stage.add(len(rows))
+            print(f"Page at index {start_index} ({record_count} items) saved to {page_file}")
+
+    if not manifest.is_complete():
+        print(f"{len(manifest.missing_pages())} pages still missing; rerun with --resume to fetch them")
+        return
+
+    with metrics.stage('combine') as stage:
+        tmp_output = Path(f"{output_file}.tmp")
+        writer = open_writer(output_format, tmp_output, append=False)
+        for start_index, page_info in sorted(manifest.pages.items()):
+            if not page_info['records']:
+                continue
+            writer.write(read_frame(Path(pages_dir) / page_info['file']))
+            stage.add(page_info['records'])
+        writer.close()
+        os.replace(tmp_output, output_file)
+    print(f"All {len(manifest.pages)} pages combined into {output_file}")
+
+
+def run_writer(*args):
+    """ Writer process entry point: record save_data as the run's own `nvd_initial_load_writer` metrics. """
+    with metrics.run('nvd_initial_load_writer'):
+        save_data(*args)
 
 
 async def main():
-    base_dir = Path(__file__).resolve().parent.parent.parent  # Adjust the path to the root of the project
-    output_dir = base_dir / '../data/nvd_data'
+    parser = argparse.ArgumentParser(description="Mirror the full NVD CVE feed.")
+    parser.add_argument('--resume', action='store_true',
+                        help="Only fetch pages missing from the checkpoint manifest of a previous run")
+    parser.add_argument('--output-format', choices=OUTPUT_FORMATS, default='csv',
+                        help="Write CSV (default) or typed, compressed Parquet")
+    parser.add_argument('--archive-pages', action='store_true',
+                        help="Also keep every raw API page, compressed, in the page archive")
+    parser.add_argument('--replay', action='store_true',
+                        help="Read the pages from the page archive instead of the API (no API key needed)")
+    parser.add_argument('--archive-dir', type=Path, default=ARCHIVE_DIR, help="Page archive directory")
+    parser.add_argument('--archive-compression', choices=COMPRESSIONS, default=DEFAULT_COMPRESSION,
+                        help="Compression of newly archived pages")
+    args = parser.parse_args()
+    if args.archive_pages and args.replay:
+        parser.error("--archive-pages and --replay are mutually exclusive")
+    if not NVD_API_KEY and not args.replay:
+        print("API key not found. Please ensure it is set in the .env file.")
+        exit(1)
+
+    output_dir = NVD_DATA_DIR
     output_dir.mkdir(parents=True, exist_ok=True)
 
-    output_file = output_dir / 'nvd_data.csv'
-    queue = Queue()
-    writer_process = Process(target=save_data_to_csv, args=(queue, output_file))
+    output_file = output_dir / f'nvd_data{FILE_SUFFIXES[args.output_format]}'
+    pages_dir = output_dir / 'nvd_data_pages'
+    manifest_file = output_dir / 'nvd_data.manifest.json'
+
+    if not args.resume:
+        # A fresh load starts from an empty checkpoint
+        if manifest_file.exists():
+            manifest_file.unlink()
+        if pages_dir.exists():
+            for page_file in pages_dir.glob('page_*'):
+                page_file.unlink()
+    pages_dir.mkdir(parents=True, exist_ok=True)
+    manifest = CheckpointManifest.load(manifest_file, RESULTS_PER_PAGE)
+
+    channel = BatchChannel(MAX_QUEUED_BATCHES)
+    writer_process = context.Process(target=run_writer,
+                                     args=(channel, output_file, pages_dir, manifest_file, RESULTS_PER_PAGE,
+                                           args.output_format))
     writer_process.start()
+    channel.attach(writer_process)
+
+    archive = PageArchive(args.archive_dir, args.archive_compression) if args.archive_pages or args.replay else None
+    try:
+        failed = await extract_data(channel, manifest, archive, args.replay)
+    finally:
+        await asyncio.to_thread(channel.close)
+        await asyncio.to_thread(writer_process.join)
 
-    await extract_data(queue)
-    queue.put("DONE")
-    writer_process.join()
+    if failed:
+        print(f"{len(failed)} pages failed; rerun with --resume to fetch only those")
+        exit(1)
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    with metrics.run('nvd_initial_load'):
+        asyncio.run(main())
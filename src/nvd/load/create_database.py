@@ -1,92 +1,66 @@
 import pandas as pd
-from sqlalchemy import create_engine, Table, Column, String, MetaData, Float, Boolean, Text, DateTime, Date
-from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy import Table, Column, String, MetaData, Float, Boolean, Text, DateTime, Date
+from sqlalchemy.dialects import sqlite
+from sqlalchemy.schema import CreateTable
 from pathlib2 import Path
 from dotenv import load_dotenv
 import logging
+import sys
 
-# Configure logging
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+sys.path.append(str(Path(__file__).resolve().parent.parent.parent))  # Make src/ importable
+from nvd.utils.db_writer import DatabaseWriter
+from nvd.utils.schema import BOOLEAN, DATE, FLOAT, INITIAL_LOAD_SCHEMA, JSON, STRING, TIMESTAMP
+from nvd.utils.store import DATABASE_PATH, create_key_index, sanitize_column, upsert_rows
+from nvd.utils.writers import date_text, timestamp_text
 
 # Load environment variables
 load_dotenv()
 
 # Define the database name and CSV file path
-DATABASE_NAME = 'NVDb.db'
-CSV_FILE = Path(__file__).parent / 'data/nvd_data/nvd_data.csv'
+DATABASE_NAME = DATABASE_PATH
+CSV_FILE = Path(__file__).resolve().parent.parent.parent.parent / 'data/nvd_data/nvd_data.csv'
+CHUNK_SIZE = 50000
 
-# Create a connection to the SQLite3 database using SQLAlchemy
-engine = create_engine(f'sqlite:///{DATABASE_NAME}')
 metadata = MetaData()
 
-# Define the nvd_data table using column names and data types from the API schema
-nvd_data_table = Table('nvd_data', metadata,
-    Column('cve_id', String),
-    Column('sourceIdentifier', String),
-    Column('vulnStatus', String),
-    Column('published', DateTime),
-    Column('lastModified', DateTime),
-    Column('evaluatorComment', Text),
-    Column('evaluatorSolution', Text),
-    Column('evaluatorImpact', Text),
-    Column('cisaExploitAdd', Date),
-    Column('cisaActionDue', Date),
-    Column('cisaRequiredAction', Text),
-    Column('cisaVulnerabilityName', String),
-    Column('cveTags', Text),
-    Column('descriptions', Text),
-    Column('references', Text),
-    Column('cvssMetricV31_version', String),
-    Column('cvssMetricV31_vectorString', String),
-    Column('cvssMetricV31_attackVector', String),
-    Column('cvssMetricV31_attackComplexity', String),
-    Column('cvssMetricV31_privilegesRequired', String),
-    Column('cvssMetricV31_userInteraction', String),
-    Column('cvssMetricV31_scope', String),
-    Column('cvssMetricV31_confidentialityImpact', String),
-    Column('cvssMetricV31_integrityImpact', String),
-    Column('cvssMetricV31_availabilityImpact', String),
-    Column('cvssMetricV31_baseScore', Float),
-    Column('cvssMetricV31_baseSeverity', String),
-    Column('cvssMetricV31_exploitCodeMaturity', String),
-    Column('cvssMetricV31_remediationLevel', String),
-    Column('cvssMetricV31_reportConfidence', String),
-    Column('cvssMetricV31_temporalScore', Float),
-    Column('cvssMetricV31_temporalSeverity', String),
-    Column('cvssMetricV31_confidentialityRequirement', String),
-    Column('cvssMetricV31_integrityRequirement', String),
-    Column('cvssMetricV31_availabilityRequirement', String),
-    Column('cvssMetricV31_modifiedAttackVector', String),
-    Column('cvssMetricV31_modifiedAttackComplexity', String),
-    Column('cvssMetricV31_modifiedPrivilegesRequired', String),
-    Column('cvssMetricV31_modifiedUserInteraction', String),
-    Column('cvssMetricV31_modifiedScope', String),
-    Column('cvssMetricV31_modifiedConfidentialityImpact', String),
-    Column('cvssMetricV31_modifiedIntegrityImpact', String),
-    Column('cvssMetricV31_modifiedAvailabilityImpact', String),
-    Column('cvssMetricV31_environmentalScore', Float),
-    Column('cvssMetricV31_environmentalSeverity', String)
-)
+# The nvd_data table of the initial-load extract, typed from its declared schema; column
+# names are sanitized the same way as create_database_and_import.py, e.g. 'CVE ID' -> 'CVE_ID'
+SQL_TYPES = {STRING: String, FLOAT: Float, TIMESTAMP: DateTime, DATE: Date, JSON: Text, BOOLEAN: Boolean}
+nvd_data_table = Table('nvd_data', metadata, *(
+    Column(sanitize_column(field.column), SQL_TYPES[field.kind]) for field in INITIAL_LOAD_SCHEMA.fields))
 
-# Create the table in the database
-metadata.create_all(engine)
-logging.info(f"Table 'nvd_data' created in the database '{DATABASE_NAME}'.")
+# DDL for the table, rendered by SQLAlchemy and run by the shared database writer
+create_table_sql = str(CreateTable(nvd_data_table, if_not_exists=True).compile(dialect=sqlite.dialect()))
 
-# Load the data from the CSV file into a pandas DataFrame
-csv_path = Path(CSV_FILE)
-df = pd.read_csv(csv_path, dtype=str)
-logging.info(f"Data loaded from '{csv_path}' into DataFrame.")
 
-# Convert date columns to datetime
-date_columns = ['published', 'lastModified', 'cisaExploitAdd', 'cisaActionDue']
-for col in date_columns:
-    if col in df.columns:
-        df[col] = pd.to_datetime(df[col], errors='coerce')
+def create_table(conn):
+    conn.execute(create_table_sql)
+    # Rows are upserted on CVE_ID, so re-running the script never duplicates a CVE
+    create_key_index(conn)
 
-# Convert DataFrame to list of dictionaries
-data = df.to_dict(orient='records')
 
-# Insert data into the nvd_data table using SQLAlchemy bulk insert
-with engine.connect() as conn:
-    conn.execute(insert(nvd_data_table), data)
-    logging.info(f"Data from '{csv_path}' has been successfully inserted into the '{DATABASE_NAME}' database.")
\ No newline at end of file
+def main():
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    # Load the data from the CSV file into a pandas DataFrame, one chunk at a time
+    csv_path = Path(CSV_FILE)
+    columns = [column.name for column in nvd_data_table.columns]
+
+    # Write dates in the API's text form, as every other loader stores them, and upsert each chunk as one batch
+    timestamp_columns = [sanitize_column(column) for column in INITIAL_LOAD_SCHEMA.columns_of_kind(TIMESTAMP)]
+    date_columns = [sanitize_column(column) for column in INITIAL_LOAD_SCHEMA.columns_of_kind(DATE)]
+    rows = 0
+    # Two chunks in the writer's queue at most, so the file is never held in memory
+    with DatabaseWriter(DATABASE_NAME, setup=create_table, max_pending=2) as writer:
+        for df in pd.read_csv(csv_path, dtype=str, chunksize=CHUNK_SIZE):
+            df = df.rename(columns=sanitize_column).reindex(columns=columns)
+            for col in timestamp_columns:
+                df[col] = timestamp_text(df[col])
+            for col in date_columns:
+                df[col] = date_text(df[col])
+            writer.call(upsert_rows, columns, df.astype(object).where(df.notna(), None).values.tolist())
+            rows += len(df)
+    logging.info(f"{rows} rows from '{csv_path}' have been upserted into the '{DATABASE_NAME}' database.")
+
+
+if __name__ == "__main__":
+    main()
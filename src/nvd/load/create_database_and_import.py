@@ -1,56 +1,219 @@
-import pandas as pd
-from sqlalchemy import create_engine, Table, Column, MetaData
-from sqlalchemy.dialects.sqlite import insert
-from sqlalchemy.types import String, DateTime, Float, Text
 from pathlib2 import Path
 from dotenv import load_dotenv
+import argparse
 import logging
-import re
+import os
+import sys
+import time
 
-# Configure logging
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+sys.path.append(str(Path(__file__).resolve().parent.parent.parent))  # Make src/ importable
+from nvd.utils import metrics, store
+from nvd.utils.correlation import format_refresh, refresh, track_cve_changes
+from nvd.utils.db_writer import DatabaseWriter
+from nvd.utils.schema import CVE_FIELDS, DATE, TIMESTAMP
+from nvd.utils.normalize import (batch_child_rows, check_child_keys, create_child_indexes, create_child_tables,
+                                 insert_children, replace_children, CHILD_COLUMNS)
+from nvd.utils.search import create_search_index, drop_search_index
+from nvd.utils.writers import date_text, iter_frames, timestamp_text
 
 # Load environment variables
 load_dotenv()
 
-# Define the database name and CSV file path
-DATABASE_NAME = 'NVDb.db'
-CSV_FILE = Path(__file__).resolve().parent.parent.parent / '../data/nvd_data/nvd_data.csv'
-
-# Create a connection to the SQLite3 database using SQLAlchemy
-engine = create_engine(f'sqlite:///{DATABASE_NAME}')
-metadata = MetaData()
-
-# Load the data from the CSV file into a pandas DataFrame
-csv_path = Path(CSV_FILE)
-df = pd.read_csv(csv_path, dtype=str, quotechar='"', escapechar='\\', on_bad_lines='skip')
-logging.info(f"Data loaded from '{csv_path}' into DataFrame.")
-logging.info(f"First few rows of the DataFrame:\n{df.head()}")
-
-# Sanitize column names
-sanitized_columns = {col: re.sub(r'\W|^(?=\d)', '_', col) for col in df.columns}
-df.rename(columns=sanitized_columns, inplace=True)
-logging.info(f"Sanitized columns: {sanitized_columns}")
-
-# Define the nvd_data table using sanitized column names
-columns = [Column(col, String) for col in df.columns]
-nvd_data_table = Table('nvd_data', metadata, *columns)
-
-# Create the table in the database
-metadata.create_all(engine)
-logging.info(f"Table 'nvd_data' created in the database '{DATABASE_NAME}' with columns: {df.columns.tolist()}")
-
-# Convert date columns to datetime and then to string
-date_columns = ['Published_Date', 'Last_Modified_Date', 'CISA_Exploit_Add', 'CISA_Action_Due']
-for col in date_columns:
-    if col in df.columns:
-        df[col] = pd.to_datetime(df[col], errors='coerce').dt.strftime('%Y-%m-%d %H:%M:%S')
-
-# Convert DataFrame to list of dictionaries
-data = df.to_dict(orient='records')
-logging.info(f"First few records to be inserted:\n{data[:5]}")
-
-# Insert data into the nvd_data table using SQLAlchemy bulk insert
-with engine.connect() as conn:
-    conn.execute(insert(nvd_data_table), data)
-    logging.info(f"Data from '{csv_path}' has been successfully inserted into the '{DATABASE_NAME}' database.")
\ No newline at end of file
+# Define the input file paths
+CSV_FILE = Path(__file__).resolve().parent.parent.parent.parent / 'data/nvd_data/nvd_data.csv'
+PARQUET_FILE = CSV_FILE.with_suffix('.parquet')
+
+# Rows read, converted and written per transaction; bounds the loader's memory
+CHUNK_SIZE = int(os.getenv('NVD_LOAD_CHUNK_SIZE', 50000))
+# Prepared chunks queued for the writer: enough to keep it busy, not enough to hold the extract in memory
+MAX_PENDING_CHUNKS = int(os.getenv('NVD_LOAD_MAX_PENDING_CHUNKS', 2))
+
+TIMESTAMP_COLUMNS = sorted(store.sanitize_column(column) for column in CVE_FIELDS.columns_of_kind(TIMESTAMP))
+DATE_COLUMNS = sorted(store.sanitize_column(column) for column in CVE_FIELDS.columns_of_kind(DATE))
+CSV_OPTIONS = {'quotechar': '"', 'escapechar': '\\', 'on_bad_lines': 'skip'}
+
+
+def prepare_chunk(frame, drop_empty=False):
+    """ Sanitize column names and write dates in the API's text form (as the delta upsert stores them).
+
+    Returns the sanitized column names and the rows, as lists with NULLs for missing values. With
+    `drop_empty` the columns without a value in this chunk are left out of both: an insert leaves
+    them NULL anyway, and a typical NVD chunk has dozens of them (the CVSS versions and temporal
+    metrics its CVEs lack), each of which would otherwise be bound for every row.
+    """
+    frame = frame.rename(columns=store.sanitize_column)
+    for col in TIMESTAMP_COLUMNS:
+        if col in frame.columns:
+            frame[col] = timestamp_text(frame[col])
+    for col in DATE_COLUMNS:
+        if col in frame.columns:
+            frame[col] = date_text(frame[col])
+    missing = frame.isna()
+    if drop_empty:
+        present = ~missing.all().to_numpy()
+        frame, missing = frame.loc[:, present], missing.loc[:, present]
+    values = frame.to_numpy(dtype=object)
+    values[missing.to_numpy()] = None
+    return list(frame.columns), values.tolist()
+
+
+def peak_rss_mib():
+    """ Peak RSS of this process or of its largest finished child (the database writer). """
+    return max(metrics.peak_rss_bytes(), metrics.peak_rss_bytes(children=True)) / 1024 / 1024
+
+
+def defer_foreign_keys(conn):
+    """ Writer setup of a bulk load: nvd_data has no unique CVE_ID for the child rows to reference until
+    finish_bulk_load builds it, so foreign keys go unchecked until then.
+    """
+    conn.execute('PRAGMA foreign_keys=OFF')
+
+
+def start_load(conn, bulk, table_columns):
+    """ Prepare nvd_data and the child tables before the first chunk; runs on the writer connection.
+
+    `table_columns` are all the columns of the extract, which nvd_data is given even when
+    the chunk's rows leave some out. A bulk load rebuilds the child tables, without indexes,
+    alongside nvd_data; an upsert instead makes sure the search index and change tracking
+    triggers exist, once per load rather than once per chunk.
+    """
+    if bulk:
+        for table in CHILD_COLUMNS:
+            conn.execute(f'DROP TABLE IF EXISTS {table}')
+        drop_search_index(conn, 'cve')
+    store.ensure_cve_table(conn, table_columns, unique=not bulk)
+    create_child_tables(conn, indexes=not bulk)
+    if not bulk:
+        create_search_index(conn, 'cve')
+        track_cve_changes(conn)
+
+
+def write_chunk(conn, bulk, columns_sql, rows, rows_by_table):
+    """ Insert (bulk) or upsert one prepared chunk and its child rows; runs on the writer connection.
+
+    An upsert keeps only the child rows of the CVEs whose version won.
+    """
+    if bulk:
+        store.insert_rows(conn, columns_sql, rows)
+        insert_children(conn, rows_by_table)
+    else:
+        store.upsert_rows(conn, columns_sql, rows)
+        if store.LAST_MODIFIED_COLUMN in columns_sql:
+            rows = store.current_rows(conn, columns_sql, rows)
+        key = columns_sql.index(store.KEY_COLUMN)
+        cve_ids = {row[key] for row in rows if row[key]}
+        rows_by_table = {table: [child for child in children if child[0] in cve_ids]
+                         for table, children in rows_by_table.items()}
+        replace_children(conn, cve_ids, rows_by_table)
+    return {table: len(table_rows) for table, table_rows in rows_by_table.items()}
+
+
+def finish_bulk_load(conn):
+    """ Drop duplicate CVE IDs, build the deferred indexes, check the child rows' foreign keys against
+    the new unique CVE_ID index and mark every CVE for the next correlation refresh.
+
+    Returns the number of duplicates dropped.
+    """
+    duplicates = store.drop_duplicate_keys(conn)
+    store.create_key_index(conn)
+    check_child_keys(conn)
+    create_child_indexes(conn)
+    create_search_index(conn, 'cve')
+    track_cve_changes(conn, mark_all=True)
+    return duplicates
+
+
+def load(input_path, database_path=store.DATABASE_PATH, columns=None, chunk_size=CHUNK_SIZE,
+         tenable_database=store.TENABLE_DATABASE_PATH, watermark=None):
+    """ Stream an NVD extract into SQLite one chunk (and one transaction) at a time.
+
+    Chunks are read and prepared here while the shared database writer process
+    applies the previous one. Into an empty database the rows are appended with a
+    plain prepared insert and the unique CVE_ID index and child-table indexes are
+    built once at the end. Into an existing table the rows are upserted on CVE_ID,
+    keeping the latest Last_Modified_Date, so re-running the load never duplicates a CVE.
+    With a `watermark` name, that watermark is advanced to the latest Last_Modified_Date
+    loaded, by the same writer once every chunk is in; a failed chunk leaves it where it was.
+    Afterwards the plugin/CVE correlation in `tenable_database` (None to skip) is refreshed.
+    """
+    conn = store.connect(database_path)
+    bulk = not store.table_exists(conn)
+    conn.close()
+    logging.info(f"{'Bulk loading' if bulk else 'Upserting'} '{input_path}' into '{database_path}' "
+                 f"in chunks of {chunk_size} rows.")
+
+    start = time.perf_counter()
+    loaded = 0
+    latest = None
+    # One chunk per transaction keeps the WAL bounded
+    writer = DatabaseWriter(database_path, setup=defer_foreign_keys if bulk else None, batch_rows=1,
+                            max_pending=MAX_PENDING_CHUNKS)
+    with metrics.stage('nvd_load') as load_stage, writer:
+        frames = iter_frames(input_path, columns=columns, chunk_size=chunk_size, **CSV_OPTIONS)
+        while True:
+            # Reading and preparing a chunk overlaps with the writer applying the previous one
+            with metrics.stage('nvd_read') as read_stage:
+                frame = next(frames, None)
+                if frame is None:
+                    break
+                table_columns = [store.sanitize_column(column) for column in frame.columns]
+                # An upsert binds every column, so that values a newer version no longer has are cleared
+                columns_sql, rows = prepare_chunk(frame, drop_empty=bulk)
+                # The child rows are extracted here too, leaving the writer only the inserts
+                rows_by_table = batch_child_rows(columns_sql, rows)
+                read_stage.add(len(rows))
+            if not loaded:
+                writer.call(start_load, bulk, table_columns)
+            writer.call(write_chunk, bulk, columns_sql, rows, rows_by_table)
+            metrics.gauge('db_writer_queue_depth', writer.queue_depth(), database=Path(database_path).name)
+            loaded += len(rows)
+            if store.LAST_MODIFIED_COLUMN in columns_sql:
+                position = columns_sql.index(store.LAST_MODIFIED_COLUMN)
+                # The dates are all in the stored text form here, which sorts in time order
+                chunk_latest = max((row[position] for row in rows if row[position]), default=None)
+                if chunk_latest and (latest is None or chunk_latest > latest):
+                    latest = chunk_latest
+            logging.info(f"{loaded} rows read ({loaded / (time.perf_counter() - start):,.0f} rows/s)")
+        if bulk and loaded:
+            writer.call(finish_bulk_load)
+        if watermark and latest:
+            writer.call(store.write_watermark, watermark, latest)
+        load_stage.add(loaded)
+
+    child_counts = dict.fromkeys(CHILD_COLUMNS, 0)
+    for result in writer.results:
+        if isinstance(result, dict):
+            for table, count in result.items():
+                child_counts[table] += count
+        elif result:
+            logging.warning(f"Dropped {result} duplicate {store.KEY_COLUMN} rows, keeping the latest of each.")
+
+    elapsed = time.perf_counter() - start
+    if loaded and tenable_database:
+        logging.info(format_refresh(refresh(tenable_database, database_path)))
+    logging.info(f"Loaded {loaded} rows in {elapsed:.1f}s (peak RSS {peak_rss_mib():.0f} MiB). Child tables: "
+                 + ", ".join(f"{table} ({count} rows)" for table, count in child_counts.items()))
+    return {'rows': loaded, 'seconds': elapsed, 'peak_rss_mib': peak_rss_mib(), 'children': child_counts}
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Load the NVD extract into the SQLite database.")
+    parser.add_argument('--input', type=Path, default=None,
+                        help="CSV or Parquet file to load (default: the Parquet extract if present, else the CSV)")
+    parser.add_argument('--columns', nargs='+', default=None,
+                        help="Only load these columns (read selectively from Parquet)")
+    parser.add_argument('--database', type=Path, default=store.DATABASE_PATH, help="SQLite database to load into")
+    parser.add_argument('--tenable-database', type=Path, default=store.TENABLE_DATABASE_PATH,
+                        help="Tenable SQLite database whose plugin/CVE correlation is refreshed afterwards")
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help="Rows per chunk and transaction")
+    args = parser.parse_args()
+
+    input_path = args.input or (PARQUET_FILE if PARQUET_FILE.exists() else CSV_FILE)
+    load(input_path, args.database, columns=args.columns, chunk_size=args.chunk_size,
+         tenable_database=args.tenable_database)
+
+
+if __name__ == "__main__":
+    with metrics.run('nvd_load'):
+        main()
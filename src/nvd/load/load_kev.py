@@ -0,0 +1,58 @@
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent.parent))  # Make src/ importable
+from nvd.extract.extract_kev import CATALOG_FILE
+from nvd.utils import metrics, store
+from nvd.utils.correlation import format_refresh, refresh, track_kev_changes
+from nvd.utils.db_writer import DatabaseWriter
+from nvd.utils.kev import KEV_TABLE, apply_catalog, catalog_rows, create_kev_table, format_counts
+
+
+def setup_kev(conn):
+    """ Create the kev table and let its changes mark CVEs for the next correlation refresh. """
+    create_kev_table(conn)
+    track_kev_changes(conn)
+
+
+def load(catalog_file=CATALOG_FILE, database_path=store.DATABASE_PATH, tenable_database=store.TENABLE_DATABASE_PATH):
+    """ Diff the KEV catalog against the kev table and write only new, changed and withdrawn entries.
+
+    Afterwards the plugin/CVE correlation in `tenable_database` (None to skip) is refreshed
+    for the CVEs whose KEV status changed. Returns the counts of `kev.apply_catalog`.
+    """
+    start = time.perf_counter()
+    with open(catalog_file, 'r', encoding='utf-8') as file:
+        catalog = json.load(file)
+    rows = catalog_rows(catalog)
+
+    Path(database_path).parent.mkdir(parents=True, exist_ok=True)
+    with metrics.stage('kev_load') as stage, DatabaseWriter(database_path, setup=setup_kev) as writer:
+        writer.call(apply_catalog, rows)
+        stage.add(len(rows))
+    counts = writer.results[0]
+    print(f"Loaded KEV catalog {catalog.get('catalogVersion')} into {KEV_TABLE} "
+          f"({format_counts(counts)}) in {time.perf_counter() - start:.2f}s")
+
+    if (counts['inserted'] or counts['updated'] or counts['removed']) and tenable_database:
+        print(format_refresh(refresh(tenable_database, database_path)))
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load the CISA KEV catalog into the NVD database.")
+    parser.add_argument('--input', type=Path, default=CATALOG_FILE, help="KEV catalog JSON file to load")
+    parser.add_argument('--database', type=Path, default=store.DATABASE_PATH, help="SQLite database to load into")
+    parser.add_argument('--tenable-database', type=Path, default=store.TENABLE_DATABASE_PATH,
+                        help="Tenable SQLite database whose plugin/CVE correlation is refreshed afterwards")
+    args = parser.parse_args()
+
+    load(args.input, args.database, args.tenable_database)
+
+
+if __name__ == "__main__":
+    with metrics.run('kev_load'):
+        main()
@@ -0,0 +1,291 @@
+import argparse
+import csv
+import re
+import sqlite3
+import sys
+import time
+from collections import defaultdict
+from functools import lru_cache
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent.parent))  # Make src/ importable
+from nvd.utils.normalize import parse_nested
+from nvd.utils import store
+
+# CPE 2.3 formatted-string field positions after the "cpe:2.3" prefix
+PART, VENDOR, PRODUCT, VERSION = 2, 3, 4, 5
+CPE_FIELDS = 13
+ANY = '*'
+WILDCARD_KEY = '*'
+
+_unescaped_colon = re.compile(r'(?<!\\):')
+_version_token = re.compile(r'\d+|[a-z]+')
+# An unescaped CPE 2.3 wildcard: '*' stands for any run of characters, '?' for exactly one
+_unescaped_wildcard = re.compile(r'(?<!\\)[*?]')
+_wildcard_part = re.compile(r'(\\.|[*?])')
+
+# Pre-release labels, in release order; they sort below the release they precede ('1.0rc1' < '1.0').
+# Single letters only count when a number follows ('1.0a1'), since '1.1.1a' is a patch release.
+PRE_RELEASES = {'dev': 0, 'alpha': 1, 'a': 1, 'beta': 2, 'b': 2, 'pre': 3, 'preview': 3, 'rc': 4, 'c': 4}
+_SINGLE_LETTER_PRE_RELEASES = frozenset(label for label in PRE_RELEASES if len(label) == 1)
+# Version key token classes: pre-release label < end of version < other text < number
+_PRE_RELEASE, _END, _TEXT, _NUMBER = 0, 1, 2, 3
+_END_TOKEN = (_END, 0, '')
+
+
+def split_cpe(cpe):
+    """ Split a CPE 2.3 formatted string into its 13 lower-cased fields. """
+    cpe = cpe.strip().lower()
+    fields = _unescaped_colon.split(cpe) if '\\' in cpe else cpe.split(':')
+    if len(fields) < CPE_FIELDS:
+        fields += [ANY] * (CPE_FIELDS - len(fields))
+    return tuple(fields)
+
+
+@lru_cache(maxsize=None)
+def version_key(version):
+    """ Sortable key for a version string: numeric parts compare numerically, text parts lexically.
+
+    Every key ends in an end-of-version token, which sorts above pre-release labels and below
+    everything else: '1.0rc1' < '1.0' < '1.0a' < '1.0.1'.
+    """
+    tokens = _version_token.findall(version.lower())
+    key = []
+    for position, token in enumerate(tokens):
+        if token.isdigit():
+            key.append((_NUMBER, int(token), ''))
+        elif token in PRE_RELEASES and (token not in _SINGLE_LETTER_PRE_RELEASES
+                                        or (position + 1 < len(tokens) and tokens[position + 1].isdigit())):
+            key.append((_PRE_RELEASE, PRE_RELEASES[token], ''))
+        else:
+            key.append((_TEXT, 0, token))
+    key.append(_END_TOKEN)
+    return tuple(key)
+
+
+def field_pattern(value):
+    """ A compiled pattern for a CPE field holding partial wildcards ('micro*', '1.?'), else None.
+
+    Escaped characters ('\\*') stay literal; a bare '*' (ANY) needs no pattern.
+    """
+    if value == ANY or not _unescaped_wildcard.search(value):
+        return None
+    return re.compile(''.join('.*' if part == '*' else '.' if part == '?' else re.escape(part)
+                              for part in _wildcard_part.split(value)))
+
+
+class CompiledMatch:
+    """ One distinct cpeMatch criteria (CPE pattern plus version range), pre-parsed for fast evaluation. """
+
+    __slots__ = ('fields', 'checks', 'patterns', 'start_including', 'start_excluding', 'end_including',
+                 'end_excluding', 'has_range')
+
+    def __init__(self, criteria, bounds):
+        fields = self.fields = split_cpe(criteria)
+        # Only concrete fields need comparing; vendor and product are already implied by the index key
+        # unless the criteria itself wildcards them
+        first = PART if self.index_key == WILDCARD_KEY else VERSION
+        checks = [(PART, fields[PART])] if first == VERSION and fields[PART] != ANY else []
+        for position in range(first, CPE_FIELDS):
+            if fields[position] != ANY:
+                checks.append((position, fields[position]))
+        # Fields with partial wildcards are matched by pattern, the rest by plain comparison
+        patterns = [(position, field_pattern(value)) for position, value in checks]
+        self.checks = tuple(check for check, (_, pattern) in zip(checks, patterns) if pattern is None)
+        self.patterns = tuple((position, pattern) for position, pattern in patterns if pattern is not None)
+        start_including, start_excluding, end_including, end_excluding = bounds
+        self.start_including = version_key(start_including) if start_including else None
+        self.start_excluding = version_key(start_excluding) if start_excluding else None
+        self.end_including = version_key(end_including) if end_including else None
+        self.end_excluding = version_key(end_excluding) if end_excluding else None
+        self.has_range = bool(start_including or start_excluding or end_including or end_excluding)
+
+    @property
+    def index_key(self):
+        vendor, product = self.fields[VENDOR], self.fields[PRODUCT]
+        if ANY in vendor or ANY in product or '?' in vendor or '?' in product:
+            return WILDCARD_KEY
+        return f'{vendor}:{product}'
+
+    def matches(self, host_fields, host_version_key):
+        for position, value in self.checks:
+            if host_fields[position] != value:
+                return False
+        for position, pattern in self.patterns:
+            if not pattern.fullmatch(host_fields[position]):
+                return False
+        if not self.has_range:
+            return True
+        if host_version_key is None:
+            # A host without a concrete version cannot be placed inside a version range
+            return False
+        if self.start_including is not None and host_version_key < self.start_including:
+            return False
+        if self.start_excluding is not None and host_version_key <= self.start_excluding:
+            return False
+        if self.end_including is not None and host_version_key > self.end_including:
+            return False
+        if self.end_excluding is not None and host_version_key >= self.end_excluding:
+            return False
+        return True
+
+
+class CpeMatchIndex:
+    """ Every CVE configuration compiled into an index keyed by vendor:product.
+
+    Identical cpeMatch criteria are compiled once and shared by every CVE that
+    uses them, so a common platform entry ("running on Windows") costs one
+    check rather than one per CVE. Configurations become small trees of
+    ('AND' | 'OR', negate, children) with criteria ids as leaves. Matching a
+    host looks up only the criteria for the host's own vendor:product pairs,
+    then evaluates the trees of the CVEs whose vulnerable criteria matched.
+    """
+
+    def __init__(self):
+        self.matches = []
+        self.match_ids = {}
+        self.vulnerable_cves = []
+        self.by_key = defaultdict(list)
+        self.cve_ids = []
+        self.cve_configurations = []
+
+    def add_cve(self, cve_id, configurations):
+        cve_index = len(self.cve_ids)
+        trees = []
+        for configuration in configurations or []:
+            nodes = [self._compile_node(node, cve_index) for node in configuration.get('nodes', [])]
+            trees.append((configuration.get('operator', 'OR'), configuration.get('negate', False), nodes))
+        if trees:
+            self.cve_ids.append(cve_id)
+            self.cve_configurations.append(trees)
+
+    def _compile_node(self, node, cve_index):
+        children = []
+        for cpe_match in node.get('cpeMatch', []):
+            if not cpe_match.get('criteria'):
+                continue
+            bounds = (cpe_match.get('versionStartIncluding'), cpe_match.get('versionStartExcluding'),
+                      cpe_match.get('versionEndIncluding'), cpe_match.get('versionEndExcluding'))
+            signature = (cpe_match['criteria'].lower(), bounds)
+            match_id = self.match_ids.get(signature)
+            if match_id is None:
+                compiled = CompiledMatch(*signature)
+                match_id = self.match_ids[signature] = len(self.matches)
+                self.matches.append(compiled)
+                self.vulnerable_cves.append([])
+                self.by_key[compiled.index_key].append(match_id)
+            if cpe_match.get('vulnerable', True):
+                self.vulnerable_cves[match_id].append(cve_index)
+            children.append(match_id)
+        return (node.get('operator', 'OR'), node.get('negate', False), children)
+
+    def matched_ids(self, cpe):
+        """ Ids of every distinct criteria satisfied by one host CPE. """
+        fields = split_cpe(cpe)
+        version = fields[VERSION]
+        host_version_key = None if version in (ANY, '-', '') else version_key(version)
+        candidates = self.by_key.get(f'{fields[VENDOR]}:{fields[PRODUCT]}', [])
+        wildcards = self.by_key.get(WILDCARD_KEY, [])
+        return [match_id for match_id in (*candidates, *wildcards)
+                if self.matches[match_id].matches(fields, host_version_key)]
+
+    def _evaluate(self, tree, matched):
+        operator, negate, children = tree
+        results = ((child in matched) if isinstance(child, int) else self._evaluate(child, matched)
+                   for child in children)
+        result = all(results) if operator == 'AND' else any(results)
+        return not result if negate else result
+
+    def match_hosts(self, inventory):
+        """ Yield (host, cve_id) for every CVE applicable to a host's set of CPEs.
+
+        `inventory` maps host -> iterable of CPE strings. The result of matching
+        a CPE string is cached, since large inventories repeat the same CPEs.
+        """
+        cache = {}
+        for host, cpes in inventory.items():
+            matched = set()
+            candidate_cves = set()
+            for cpe in cpes:
+                if cpe not in cache:
+                    match_ids = self.matched_ids(cpe)
+                    # Only vulnerable criteria make a CVE a candidate; platform criteria just satisfy AND nodes
+                    cves = {cve_index for match_id in match_ids for cve_index in self.vulnerable_cves[match_id]}
+                    cache[cpe] = (match_ids, cves)
+                match_ids, cves = cache[cpe]
+                matched.update(match_ids)
+                candidate_cves |= cves
+            for cve_index in sorted(candidate_cves):
+                if any(self._evaluate(tree, matched) for tree in self.cve_configurations[cve_index]):
+                    yield host, self.cve_ids[cve_index]
+
+
+def load_configurations(source):
+    """ Yield (cve_id, configurations) from the SQLite store or from a CSV/Parquet extract. """
+    source = Path(source)
+    if source.suffix in ('.db', '.sqlite', '.sqlite3'):
+        conn = sqlite3.connect(source)
+        try:
+            for cve_id, configurations in conn.execute(
+                    f'SELECT "{store.KEY_COLUMN}", "Configurations" FROM "{store.CVE_TABLE}"'):
+                yield cve_id, parse_nested(configurations)
+        finally:
+            conn.close()
+    else:
+        from nvd.utils.writers import read_frame
+        frame = read_frame(source, columns=['CVE ID', 'Configurations'])
+        for cve_id, configurations in zip(frame['CVE ID'], frame['Configurations']):
+            yield cve_id, parse_nested(configurations)
+
+
+def build_index(configurations):
+    index = CpeMatchIndex()
+    for cve_id, cve_configurations in configurations:
+        index.add_cve(cve_id, cve_configurations)
+    return index
+
+
+def read_inventory(path):
+    """ Read `host,cpe` rows (or bare CPE lines, each its own host) into host -> [cpe]. """
+    inventory = defaultdict(list)
+    with open(path, 'r', encoding='utf-8') as file:
+        for row in csv.reader(file):
+            if not row or row[0].startswith('#') or row[0].lower() == 'host':
+                continue
+            host, cpe = (row[0], row[1]) if len(row) > 1 else (row[0], row[0])
+            inventory[host].append(cpe)
+    return inventory
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Match an inventory of host CPEs against NVD CVE configurations.")
+    parser.add_argument('inventory', type=Path, help="CSV of host,cpe rows or a file with one CPE per line")
+    parser.add_argument('--source', type=Path, default=store.DATABASE_PATH,
+                        help="SQLite store or CSV/Parquet extract holding CVE configurations")
+    parser.add_argument('--output', type=Path, default=None, help="Write host,cve_id rows here instead of stdout")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    index = build_index(load_configurations(args.source))
+    compiled = time.perf_counter()
+    print(f"Compiled {len(index.cve_ids)} CVEs ({len(index.matches)} distinct cpeMatch criteria) "
+          f"in {compiled - start:.1f}s", file=sys.stderr)
+
+    inventory = read_inventory(args.inventory)
+    output = open(args.output, 'w', newline='', encoding='utf-8') if args.output else sys.stdout
+    try:
+        writer = csv.writer(output)
+        writer.writerow(['host', 'cve_id'])
+        matches = 0
+        for host, cve_id in index.match_hosts(inventory):
+            writer.writerow([host, cve_id])
+            matches += 1
+    finally:
+        if args.output:
+            output.close()
+    print(f"Matched {len(inventory)} hosts, {matches} host/CVE pairs in {time.perf_counter() - compiled:.1f}s",
+          file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,30 @@
+""" Refresh the Tenable plugin x NVD CVE correlation table from the plugins and CVEs changed since the last run.
+
+The loaders refresh it after every Tenable load and NVD delta; run this to catch up
+by hand or, with --full, to rebuild it from scratch.
+
+Usage: python src/nvd/refresh_correlation.py [--full]
+"""
+import argparse
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))  # Make src/ importable
+from nvd.utils import metrics, store
+from nvd.utils.correlation import format_refresh, refresh
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--full', action='store_true', help="Rebuild the whole table instead of the changed rows")
+    parser.add_argument('--database', type=Path, default=store.DATABASE_PATH, help="NVD SQLite database")
+    parser.add_argument('--tenable-database', type=Path, default=store.TENABLE_DATABASE_PATH,
+                        help="Tenable SQLite database holding the correlation table")
+    args = parser.parse_args()
+
+    print(format_refresh(refresh(args.tenable_database, args.database, full=args.full)))
+
+
+if __name__ == '__main__':
+    with metrics.run('correlation'):
+        main()
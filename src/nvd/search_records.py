@@ -0,0 +1,72 @@
+""" Keyword search over NVD CVE descriptions and Tenable plugin text, ranked by bm25.
+
+Usage: python src/nvd/search_records.py "jackson deserialization" [--kind cve|plugin|all] [--limit 10]
+"""
+import argparse
+import sqlite3
+import sys
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))  # Make src/ importable
+from nvd.utils import store
+from nvd.utils.db_writer import connect_reader
+from nvd.utils.search import SEARCH_INDEXES, create_search_index, rebuild_search_index, search
+
+
+def rebuild(database, index):
+    """ (Re)create the search index of one database, e.g. after a VACUUM. """
+    conn = sqlite3.connect(database)
+    try:
+        with conn:
+            if create_search_index(conn, index):
+                rebuild_search_index(conn, index)
+                print(f"Rebuilt {SEARCH_INDEXES[index].name} in {database}")
+            else:
+                print(f"{database} has no {SEARCH_INDEXES[index].table} table to index")
+    finally:
+        conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('query', nargs='?', help="Keywords; every term must match")
+    parser.add_argument('--kind', choices=('cve', 'plugin', 'all'), default='all')
+    parser.add_argument('--limit', type=int, default=10)
+    parser.add_argument('--raw', action='store_true', help="Pass the query to FTS5 as is (OR, NOT, prefix*, ...)")
+    parser.add_argument('--database', type=Path, default=store.DATABASE_PATH, help="NVD SQLite database")
+    parser.add_argument('--tenable-database', type=Path, default=store.TENABLE_DATABASE_PATH,
+                        help="Tenable SQLite database")
+    parser.add_argument('--rebuild', action='store_true', help="Rebuild the search indexes instead of searching")
+    args = parser.parse_args()
+
+    databases = {'cve': args.database, 'plugin': args.tenable_database}
+    kinds = ('cve', 'plugin') if args.kind == 'all' else (args.kind,)
+    if args.rebuild:
+        for kind in kinds:
+            rebuild(databases[kind], kind)
+        return
+    if not args.query:
+        parser.error("a query is required unless --rebuild is given")
+
+    for kind in kinds:
+        if not databases[kind].exists():
+            print(f"{kind}: {databases[kind]} does not exist", file=sys.stderr)
+            continue
+        conn = connect_reader(databases[kind])
+        try:
+            start = time.perf_counter()
+            results = search(conn, kind, args.query, limit=args.limit, raw=args.raw)
+            elapsed = time.perf_counter() - start
+        except sqlite3.OperationalError as e:
+            print(f"{kind}: {e} (load the data, or run with --rebuild)", file=sys.stderr)
+            continue
+        finally:
+            conn.close()
+        print(f"{SEARCH_INDEXES[kind].table}: {len(results)} matches in {elapsed * 1000:.1f} ms")
+        for result in results:
+            print(f"  {result['key']:<18} {result['score']:8.2f}  {result['snippet']}")
+
+
+if __name__ == '__main__':
+    main()
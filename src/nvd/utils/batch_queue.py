@@ -0,0 +1,139 @@
+import os
+import pickle
+import queue
+import zlib
+from operator import itemgetter
+
+from nvd.utils.processes import context
+
+SENTINEL = "DONE"
+
+# How often a put blocked on a full channel checks that the consumer is still alive
+LIVENESS_INTERVAL = 1.0
+# zlib level batch payloads are compressed with (0 sends them raw); level 1 cuts CVE batches about 3x for little CPU
+COMPRESSION_LEVEL = int(os.getenv('NVD_CHANNEL_COMPRESSION_LEVEL', 1))
+
+
+class RecordBatch:
+    """ A block of records: the column names once, then one tuple per row. """
+
+    __slots__ = ('columns', 'rows')
+
+    def __init__(self, columns, rows):
+        self.columns = columns
+        self.rows = rows
+
+    @classmethod
+    def from_records(cls, records):
+        if not records:
+            return cls((), [])
+        columns = tuple(records[0])
+        getter = itemgetter(*columns) if len(columns) > 1 else (lambda record: (record[columns[0]],))
+        return cls(columns, [getter(record) for record in records])
+
+    def records(self):
+        return [dict(zip(self.columns, row)) for row in self.rows]
+
+    def __len__(self):
+        return len(self.rows)
+
+
+class BatchChannel:
+    """ Bounded channel that moves records between processes in serialized batches.
+
+    Each batch is pickled once into a single bytes buffer before it is queued,
+    so the queue's feeder thread only copies one block per batch, and the column
+    names travel once per batch rather than once per record. The buffer is then
+    zlib-compressed at `compression_level`: CVE records are mostly configuration
+    trees full of repeated CPE strings, so a cheap level shrinks both the bytes
+    piped between processes and what queued batches hold in memory. The queue
+    holds at most `max_batches` messages; `put` blocks when it is full, which
+    throttles the producer to the speed of the writer. Once the consumer process is attached, a blocked put gives up
+    with an error if that process exits instead of waiting forever for room.
+    Queue depth and bytes in flight are tracked for monitoring.
+    """
+
+    def __init__(self, max_batches=16, compression_level=COMPRESSION_LEVEL):
+        self._queue = context.Queue(maxsize=max_batches)
+        self._compression_level = compression_level
+        self._bytes_in_flight = context.Value('q', 0)
+        self._consumer = None
+
+    def attach(self, consumer):
+        """ Watch the started consumer process while a put waits on a full channel. """
+        self._consumer = consumer
+
+    def _put(self, message):
+        if self._consumer is None:
+            self._queue.put(message)
+            return
+        while True:
+            try:
+                self._queue.put(message, timeout=LIVENESS_INTERVAL)
+                return
+            except queue.Full:
+                if not self._consumer.is_alive():
+                    raise RuntimeError(f"Channel consumer exited with code {self._consumer.exitcode} "
+                                       f"while the channel was full")
+
+    def put_batch(self, key, records, columns=None):
+        """ Serialize `records` and queue them as one block.
+
+        `records` are tuples in `columns` order (see nvd.utils.schema) or, without
+        `columns`, dicts sharing the same keys.
+        """
+        batch = RecordBatch(tuple(columns), records) if columns is not None else RecordBatch.from_records(records)
+        payload = pickle.dumps((batch.columns, batch.rows), protocol=pickle.HIGHEST_PROTOCOL)
+        if self._compression_level:
+            payload = zlib.compress(payload, self._compression_level)
+        with self._bytes_in_flight.get_lock():
+            self._bytes_in_flight.value += len(payload)
+        try:
+            self._put(("BATCH", key, payload))
+        except RuntimeError:
+            with self._bytes_in_flight.get_lock():
+                self._bytes_in_flight.value -= len(payload)
+            raise
+
+    def put_control(self, kind, key=None, payload=None):
+        """ Queue a small control message, e.g. the end or abort of a page. """
+        self._put((kind, key, payload))
+
+    def close(self):
+        """ Tell the consumer that no more messages will follow; a no-op once an attached consumer has exited. """
+        try:
+            self._put(SENTINEL)
+        except RuntimeError:
+            pass  # Nobody is left to tell
+
+    def get(self):
+        """ Return the next `(kind, key, payload)` message, or None once the channel is closed.
+
+        BATCH payloads are returned decoded as a RecordBatch.
+        """
+        message = self._queue.get()
+        if message == SENTINEL:
+            return None
+        kind, key, payload = message
+        if kind == "BATCH":
+            with self._bytes_in_flight.get_lock():
+                self._bytes_in_flight.value -= len(payload)
+            if self._compression_level:
+                payload = zlib.decompress(payload)
+            columns, rows = pickle.loads(payload)
+            payload = RecordBatch(columns, rows)
+        return kind, key, payload
+
+    def __iter__(self):
+        while True:
+            message = self.get()
+            if message is None:
+                return
+            yield message
+
+    def stats(self):
+        try:
+            depth = self._queue.qsize()
+        except NotImplementedError:  # macOS has no sem_getvalue
+            depth = None
+        return {'queue_depth': depth, 'bytes_in_flight': self._bytes_in_flight.value}
@@ -0,0 +1,83 @@
+import json
+import os
+from datetime import datetime, timezone
+
+from nvd.utils.files import write_atomic
+
+
+class CheckpointManifest:
+    """ Durable record of which page ranges of a paged NVD extract have been written.
+
+    The manifest is a small JSON file rewritten atomically (temp file + rename)
+    after every page, so a crash leaves either the previous or the new version
+    on disk, never a partial one.
+    """
+
+    def __init__(self, path, results_per_page, total_results=None, pages=None):
+        self.path = path
+        self.results_per_page = results_per_page
+        self.total_results = total_results
+        self.pages = pages or {}
+
+    @classmethod
+    def load(cls, path, results_per_page):
+        """ Load an existing manifest, or start an empty one if none exists. """
+        if not os.path.exists(path):
+            return cls(path, results_per_page)
+
+        with open(path, 'r', encoding='utf-8') as file:
+            state = json.load(file)
+
+        if state['results_per_page'] != results_per_page:
+            raise ValueError(
+                f"Checkpoint {path} was written with resultsPerPage={state['results_per_page']}, "
+                f"cannot resume with resultsPerPage={results_per_page}")
+
+        pages = {int(start_index): page for start_index, page in state['pages'].items()}
+        return cls(path, results_per_page, state.get('total_results'), pages)
+
+    def is_written(self, start_index):
+        return start_index in self.pages
+
+    def mark_written(self, start_index, record_count, page_file):
+        self.pages[start_index] = {
+            'start_index': start_index,
+            'end_index': start_index + record_count,
+            'records': record_count,
+            'file': os.path.basename(page_file),
+            'written_at': datetime.now(timezone.utc).isoformat()
+        }
+        self.save()
+
+    def extend(self, total_results):
+        """ Record the feed's current totalResults, which only ever grows.
+
+        Records the feed gained since the checkpoint extend its last page, so a last page
+        written short of the new total is forgotten and fetched again.
+        """
+        if self.total_results is not None:
+            if total_results <= self.total_results:
+                return
+            last_page = (max(self.total_results, 1) - 1) // self.results_per_page * self.results_per_page
+            page = self.pages.get(last_page)
+            if page and page['records'] < min(self.results_per_page, total_results - last_page):
+                del self.pages[last_page]
+        self.total_results = total_results
+
+    def missing_pages(self):
+        """ Start indexes of every page that still has to be fetched. """
+        if self.total_results is None:
+            return [0]
+        return [start_index for start_index in range(0, max(self.total_results, 1), self.results_per_page)
+                if not self.is_written(start_index)]
+
+    def is_complete(self):
+        return self.total_results is not None and not self.missing_pages()
+
+    def save(self):
+        state = {
+            'results_per_page': self.results_per_page,
+            'total_results': self.total_results,
+            'pages': {str(start_index): page for start_index, page in sorted(self.pages.items())}
+        }
+        write_atomic(self.path, json.dumps(state, indent=2))
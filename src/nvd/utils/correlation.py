@@ -0,0 +1,223 @@
+import sqlite3
+import time
+from pathlib import Path
+
+from nvd.utils import metrics
+from nvd.utils.db_writer import connect_writer
+from nvd.utils.kev import KEV_TABLE
+from nvd.utils.store import CVE_TABLE, KEY_COLUMN, table_exists
+
+# Materialized Tenable plugin x NVD CVE join, kept in the Tenable database so dashboards
+# read one indexed table; the NVD database is attached read-only while it is refreshed
+CORRELATION_TABLE = 'plugin_cve_correlation'
+PLUGIN_TABLE = 'TenablePluginData'
+PLUGIN_CVE_TABLE = 'plugin_cve'
+
+# Keys changed since the last refresh, recorded by triggers on the source tables. `version`
+# is bumped on every change, so a refresh only clears the markers it has actually read.
+PLUGIN_CHANGE_TABLE = 'plugin_change'  # in the Tenable database
+CVE_CHANGE_TABLE = 'cve_change'  # in the NVD database
+
+CORRELATION_COLUMNS = ('plugin_id', 'cve_id', 'plugin_title', 'plugin_severity', 'plugin_published',
+                       'cvss_version', 'base_score', 'base_severity', 'kev', 'kev_date_added',
+                       'cve_published', 'cve_last_modified')
+
+create_correlation_sql = [
+    f"""
+    CREATE TABLE IF NOT EXISTS {CORRELATION_TABLE} (
+        plugin_id TEXT NOT NULL,
+        cve_id TEXT NOT NULL,
+        plugin_title TEXT,
+        plugin_severity TEXT,
+        plugin_published TEXT,
+        cvss_version TEXT,
+        base_score REAL,
+        base_severity TEXT,
+        kev INTEGER NOT NULL DEFAULT 0,
+        kev_date_added TEXT,
+        cve_published TEXT,
+        cve_last_modified TEXT,
+        PRIMARY KEY (plugin_id, cve_id)
+    ) WITHOUT ROWID;
+    """,
+    f"CREATE INDEX IF NOT EXISTS ix_{CORRELATION_TABLE}_cve ON {CORRELATION_TABLE} (cve_id, plugin_id)",
+    f"CREATE INDEX IF NOT EXISTS ix_{CORRELATION_TABLE}_score ON {CORRELATION_TABLE} (base_score, cve_id)",
+    f"CREATE INDEX IF NOT EXISTS ix_{CORRELATION_TABLE}_kev ON {CORRELATION_TABLE} (kev, base_score)",
+]
+
+
+def _track_changes(conn, change_table, table, key_column, name=None):
+    conn.execute(f"""
+    CREATE TABLE IF NOT EXISTS {change_table} (
+        key TEXT PRIMARY KEY,
+        version INTEGER NOT NULL
+    ) WITHOUT ROWID;
+    """)
+    for suffix, event, row in (('ai', 'INSERT', 'new'), ('au', 'UPDATE', 'new'), ('ad', 'DELETE', 'old')):
+        conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS {name or change_table}_{suffix} AFTER {event} ON "{table}"
+        WHEN {row}."{key_column}" IS NOT NULL BEGIN
+            INSERT INTO {change_table} (key, version) VALUES ({row}."{key_column}", 1)
+            ON CONFLICT(key) DO UPDATE SET version = version + 1;
+        END
+        """)
+
+
+def track_plugin_changes(conn):
+    """ Record the PluginId of every plugin row inserted, updated or deleted, for the next refresh. """
+    _track_changes(conn, PLUGIN_CHANGE_TABLE, PLUGIN_TABLE, 'PluginId')
+
+
+def track_cve_changes(conn, mark_all=False):
+    """ Record the CVE_ID of every nvd_data row inserted, updated or deleted, for the next refresh.
+
+    A bulk load creates nvd_data without the triggers and passes `mark_all=True` afterwards.
+    """
+    _track_changes(conn, CVE_CHANGE_TABLE, CVE_TABLE, KEY_COLUMN)
+    if mark_all:
+        conn.execute(f"""
+        INSERT INTO {CVE_CHANGE_TABLE} (key, version) SELECT "{KEY_COLUMN}", 1 FROM "{CVE_TABLE}"
+        WHERE "{KEY_COLUMN}" IS NOT NULL
+        ON CONFLICT(key) DO UPDATE SET version = version + 1
+        """)
+
+
+def track_kev_changes(conn):
+    """ Record the cve_id of every kev row inserted, updated or deleted in cve_change, for the next refresh. """
+    _track_changes(conn, CVE_CHANGE_TABLE, KEV_TABLE, 'cve_id', name='kev_change')
+
+
+def _table_columns(conn, table, schema='main'):
+    return [row[1] for row in conn.execute(f'PRAGMA {schema}.table_info("{table}")')]
+
+
+def correlation_insert_sql(conn, pairs_sql, nvd_attached):
+    """ INSERT ... SELECT of the correlation rows for the (plugin_id, cve_id) pairs `pairs_sql` selects.
+
+    NVD columns are NULL while the NVD database, or the part of it a column comes from, is not loaded.
+    The KEV flag comes from the kev table, falling back to the CISA fields NVD copies onto its CVEs.
+    """
+    nvd_columns = _table_columns(conn, CVE_TABLE, 'nvd') if nvd_attached else []
+    nvd_columns = nvd_columns if KEY_COLUMN in nvd_columns else []
+    has_metrics = nvd_attached and bool(_table_columns(conn, 'cve_metric', 'nvd'))
+    has_kev = nvd_attached and bool(_table_columns(conn, KEV_TABLE, 'nvd'))
+
+    def nvd_value(column):
+        return f'n."{column}"' if column in nvd_columns else 'NULL'
+
+    joins = []
+    if nvd_columns:
+        joins.append(f'LEFT JOIN nvd."{CVE_TABLE}" n ON n."{KEY_COLUMN}" = pc.cve_id')
+    if has_metrics:
+        # One score per CVE: NVD's own (Primary) assessment first, then the newest CVSS version
+        joins.append("""LEFT JOIN nvd.cve_metric m ON m.rowid = (
+            SELECT rowid FROM nvd.cve_metric WHERE cve_id = pc.cve_id
+            ORDER BY type = 'Primary' DESC, version DESC, base_score DESC LIMIT 1
+        )""")
+    if has_kev:
+        joins.append(f'LEFT JOIN nvd.{KEV_TABLE} k ON k.cve_id = pc.cve_id')
+    metrics = 'm.version, m.base_score, m.base_severity' if has_metrics else 'NULL, NULL, NULL'
+    kev_added = f"NULLIF(NULLIF({nvd_value('CISA_Exploit_Add')}, 'N/A'), '')"
+    if has_kev:
+        kev_added = f"COALESCE(k.date_added, {kev_added})"
+    return f"""
+    INSERT OR REPLACE INTO {CORRELATION_TABLE} ({', '.join(CORRELATION_COLUMNS)})
+    SELECT pc.plugin_id, pc.cve_id, p.Title, p.Severity, p.PublicationDate, {metrics},
+           {kev_added} IS NOT NULL, {kev_added}, {nvd_value('Published_Date')}, {nvd_value('Last_Modified_Date')}
+    FROM ({pairs_sql}) pc
+    JOIN {PLUGIN_TABLE} p ON p.PluginId = pc.plugin_id
+    {' '.join(joins)}
+    """
+
+
+def _clear_cve_changes(nvd_database, consumed):
+    """ Delete the cve_change markers a refresh has read, unless they changed again since. """
+    conn = connect_writer(nvd_database)
+    try:
+        with conn:
+            conn.executemany(f'DELETE FROM {CVE_CHANGE_TABLE} WHERE key = ? AND version = ?', consumed)
+        return True
+    except sqlite3.OperationalError as e:
+        # The NVD writer holds the lock; the markers stay and are simply refreshed again next time
+        print(f"Could not clear {CVE_CHANGE_TABLE} in {nvd_database} ({e}); left for the next refresh")
+        return False
+    finally:
+        conn.close()
+
+
+def refresh(tenable_database, nvd_database, full=False):
+    """ Bring the correlation table up to date with the plugins and CVEs changed since the last refresh.
+
+    Only the rows of changed plugins and of plugins covering changed CVEs are deleted and
+    re-joined; the first refresh, or `full=True`, rebuilds the table from every plugin_cve
+    pair. Returns {'full', 'plugins', 'cves', 'rows', 'seconds'}, or None while the Tenable
+    database has no plugins loaded.
+    """
+    with metrics.stage('correlation') as stage:
+        result = _refresh(tenable_database, nvd_database, full)
+        if result:
+            stage.add(result['rows'])
+    return result
+
+
+def _refresh(tenable_database, nvd_database, full):
+    start = time.perf_counter()
+    if not Path(tenable_database).exists():
+        return None
+    conn = connect_writer(Path(tenable_database).resolve().as_uri(), uri=True)
+    try:
+        if not (table_exists(conn, PLUGIN_TABLE) and table_exists(conn, PLUGIN_CVE_TABLE)):
+            return None
+        nvd_attached = Path(nvd_database).exists()
+        if nvd_attached:
+            # Read-only, so the refresh never waits for (or blocks) a running NVD load
+            conn.execute("ATTACH DATABASE ? AS nvd", (f'{Path(nvd_database).resolve().as_uri()}?mode=ro',))
+        has_cve_changes = nvd_attached and bool(_table_columns(conn, CVE_CHANGE_TABLE, 'nvd'))
+
+        conn.execute('BEGIN IMMEDIATE')
+        full = full or not table_exists(conn, CORRELATION_TABLE)
+        for statement in create_correlation_sql:
+            conn.execute(statement)
+        track_plugin_changes(conn)
+
+        plugins = dict(conn.execute(f'SELECT key, version FROM {PLUGIN_CHANGE_TABLE}'))
+        cves = dict(conn.execute(f'SELECT key, version FROM nvd.{CVE_CHANGE_TABLE}')) if has_cve_changes else {}
+        if full:
+            conn.execute(f'DELETE FROM {CORRELATION_TABLE}')
+            pairs_sql = f'SELECT plugin_id, cve_id FROM {PLUGIN_CVE_TABLE}'
+        else:
+            conn.execute('CREATE TEMP TABLE IF NOT EXISTS refresh_plugin (key TEXT PRIMARY KEY) WITHOUT ROWID')
+            conn.execute('CREATE TEMP TABLE IF NOT EXISTS refresh_cve (key TEXT PRIMARY KEY) WITHOUT ROWID')
+            conn.executemany('INSERT INTO temp.refresh_plugin (key) VALUES (?)', ((key,) for key in plugins))
+            conn.executemany('INSERT INTO temp.refresh_cve (key) VALUES (?)', ((key,) for key in cves))
+            conn.execute(f'DELETE FROM {CORRELATION_TABLE} WHERE plugin_id IN (SELECT key FROM temp.refresh_plugin)')
+            conn.execute(f'DELETE FROM {CORRELATION_TABLE} WHERE cve_id IN (SELECT key FROM temp.refresh_cve)')
+            pairs_sql = f"""
+            SELECT plugin_id, cve_id FROM {PLUGIN_CVE_TABLE} WHERE plugin_id IN (SELECT key FROM temp.refresh_plugin)
+            UNION
+            SELECT plugin_id, cve_id FROM {PLUGIN_CVE_TABLE} WHERE cve_id IN (SELECT key FROM temp.refresh_cve)
+            """
+        rows = conn.execute(correlation_insert_sql(conn, pairs_sql, nvd_attached)).rowcount
+        conn.executemany(f'DELETE FROM {PLUGIN_CHANGE_TABLE} WHERE key = ? AND version = ?', plugins.items())
+        if not full:
+            conn.execute('DELETE FROM temp.refresh_plugin')
+            conn.execute('DELETE FROM temp.refresh_cve')
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+    if cves:
+        _clear_cve_changes(nvd_database, cves.items())
+    return {'full': full, 'plugins': len(plugins), 'cves': len(cves), 'rows': rows,
+            'seconds': time.perf_counter() - start}
+
+
+def format_refresh(result):
+    if result is None:
+        return "No Tenable plugins loaded yet; correlation not refreshed"
+    kind = 'Rebuilt' if result['full'] else 'Refreshed'
+    return (f"{kind} {CORRELATION_TABLE}: {result['rows']} rows for {result['plugins']} changed plugins "
+            f"and {result['cves']} changed CVEs in {result['seconds']:.2f}s")
@@ -0,0 +1,61 @@
+""" Flatten the CVSS metrics of a page of CVEs into columns.
+
+NVD publishes up to four CVSS versions per CVE (v2, v3.0, v3.1 and v4.0), each as a list
+of metrics: NVD's own assessment (type 'Primary') and any scored by the CNA ('Secondary').
+One metric is chosen per version, the Primary one when there is one, and every column
+is then read for the whole page at once, one list per column, instead of walking the
+nested metrics again for every field of every record. A key that no CVE of the page
+carries (a version the page lacks, or the temporal metrics NVD does not publish) is
+not read at all.
+
+Scores, vectors and base metrics live in the metric's 'cvssData' object; the
+exploitability and impact subscores (and v2's severity) sit on the metric itself.
+"""
+PRIMARY = 'Primary'
+
+# Stands in for an absent metric or cvssData object so the column reads need no checks
+_EMPTY = {}
+
+
+class CvssVersion:
+    """ One metrics list of the API, e.g. 'cvssMetricV31', and the (column, key) pairs read from
+    its chosen metric: `data_columns` from the metric's cvssData, `metric_columns` from the metric.
+    """
+
+    __slots__ = ('key', 'data_columns', 'metric_columns')
+
+    def __init__(self, key, data_columns, metric_columns):
+        self.key = key
+        self.data_columns = tuple(data_columns)
+        self.metric_columns = tuple(metric_columns)
+
+
+def preferred_metric(metrics):
+    """ The Primary metric of one version's list, else its first (Secondary) one; None for an empty list. """
+    if not metrics:
+        return None
+    for metric in metrics:
+        if metric.get('type') == PRIMARY:
+            return metric
+    return metrics[0]
+
+
+def flatten_page(cves, versions):
+    """ {column: [one value per CVE]} for every column of `versions`, in the order of `cves`. """
+    page_metrics = [cve.get('metrics') or _EMPTY for cve in cves]
+    count = len(page_metrics)
+    columns = {}
+    for version in versions:
+        key = version.key
+        lists = [metrics.get(key) for metrics in page_metrics]
+        # Most CVEs have one metric per version, which needs no Primary/Secondary choice
+        chosen = [(found[0] if len(found) == 1 else preferred_metric(found)) if found else _EMPTY
+                  for found in lists]
+        data = [metric.get('cvssData') or _EMPTY for metric in chosen]
+        present = set().union(*data)
+        for column, field in version.data_columns:
+            columns[column] = [values.get(field) for values in data] if field in present else [None] * count
+        present = set().union(*chosen)
+        for column, field in version.metric_columns:
+            columns[column] = [metric.get(field) for metric in chosen] if field in present else [None] * count
+    return columns
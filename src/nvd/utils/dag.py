@@ -0,0 +1,188 @@
+""" Run pipeline stages as a dependency graph, concurrently wherever the graph allows.
+
+Every stage starts as soon as the stages it depends on have finished, so independent
+branches (the Tenable refresh and the NVD delta) overlap. Coroutine stages run on the
+event loop; plain functions run in a worker thread so they never stall it.
+
+A stage is skipped when its inputs have not changed since it last succeeded:
+- a stage with a `fingerprint` (a function describing its inputs, e.g. file sizes
+  and modification times) is skipped when the fingerprint matches the one recorded
+  in the state file;
+- a stage without one is skipped when none of its dependencies changed anything,
+  i.e. each was skipped or returned a falsy result. Stages without dependencies
+  always run.
+A fingerprint is only recorded once every stage downstream of it has succeeded, so a
+failed run repeats the whole affected branch next time.
+"""
+import asyncio
+import inspect
+import time
+import traceback
+from datetime import datetime, timezone
+from pathlib import Path
+
+from nvd.utils.files import load_cache, save_cache
+
+OK, SKIPPED, FAILED, BLOCKED = 'ok', 'skipped', 'failed', 'blocked'
+
+
+class Stage:
+
+    def __init__(self, name, run, after=(), fingerprint=None):
+        """ `run(results)` gets the results of the stages in `after`, None for skipped ones. """
+        self.name = name
+        self.run = run
+        self.after = tuple(after)
+        self.fingerprint = fingerprint
+
+
+class Outcome:
+
+    def __init__(self, status, result=None, seconds=0.0, fingerprint=None, error=None):
+        self.status = status
+        self.result = result
+        self.seconds = seconds
+        self.fingerprint = fingerprint
+        self.error = error
+
+    @property
+    def changed(self):
+        return self.status == OK and bool(self.result)
+
+
+def file_fingerprint(*paths, pattern='*'):
+    """ Name, size and modification time of the files at `paths` (directories are globbed with `pattern`). """
+    entries = []
+    for path in map(Path, paths):
+        files = sorted(path.glob(pattern)) if path.is_dir() else [path]
+        for file in files:
+            if file.is_file():
+                stat = file.stat()
+                entries.append(f"{file.name}:{stat.st_size}:{stat.st_mtime_ns}")
+    return '|'.join(entries)
+
+
+class Dag:
+
+    def __init__(self, stages, state_file):
+        self.stages = {stage.name: stage for stage in stages}
+        self.state_file = Path(state_file)
+        for stage in stages:
+            missing = [name for name in stage.after if name not in self.stages]
+            if missing:
+                raise ValueError(f"Stage {stage.name} depends on unknown stages: {', '.join(missing)}")
+        self.order = self._topological_order()
+
+    def _topological_order(self):
+        order, visiting, done = [], set(), set()
+
+        def visit(name):
+            if name in done:
+                return
+            if name in visiting:
+                raise ValueError(f"Dependency cycle through stage {name}")
+            visiting.add(name)
+            for dependency in self.stages[name].after:
+                visit(dependency)
+            visiting.discard(name)
+            done.add(name)
+            order.append(name)
+
+        for name in self.stages:
+            visit(name)
+        return order
+
+    def select(self, names):
+        """ The sub-graph needed for the stages `names`: those stages and everything upstream of them. """
+        selected = set()
+        pending = list(names)
+        while pending:
+            name = pending.pop()
+            if name not in self.stages:
+                raise ValueError(f"Unknown stage {name}; stages are {', '.join(self.order)}")
+            if name not in selected:
+                selected.add(name)
+                pending.extend(self.stages[name].after)
+        return Dag([self.stages[name] for name in self.order if name in selected], self.state_file)
+
+    def downstream(self, name):
+        found = set()
+        pending = [name]
+        while pending:
+            current = pending.pop()
+            for stage in self.stages.values():
+                if current in stage.after and stage.name not in found:
+                    found.add(stage.name)
+                    pending.append(stage.name)
+        return found
+
+    def load_state(self):
+        return load_cache(self.state_file)
+
+    def save_state(self, state):
+        self.state_file.parent.mkdir(parents=True, exist_ok=True)
+        save_cache(state, self.state_file)
+
+    async def run(self, force=False):
+        """ Run every stage once its dependencies are done; returns {name: Outcome} in graph order.
+
+        With `force` no stage is skipped.
+        """
+        state = self.load_state()
+        tasks = {}
+
+        async def execute(stage):
+            dependencies = [await tasks[name] for name in stage.after]
+            if any(outcome.status in (FAILED, BLOCKED) for outcome in dependencies):
+                return Outcome(BLOCKED)
+            fingerprint = await asyncio.to_thread(stage.fingerprint) if stage.fingerprint else None
+            if not force:
+                if stage.fingerprint and fingerprint == state.get(stage.name, {}).get('fingerprint'):
+                    return Outcome(SKIPPED, fingerprint=fingerprint)
+                if not stage.fingerprint and dependencies and not any(outcome.changed for outcome in dependencies):
+                    return Outcome(SKIPPED)
+            results = {name: outcome.result for name, outcome in zip(stage.after, dependencies)}
+            print(f"[{stage.name}] started")
+            start = time.perf_counter()
+            try:
+                if inspect.iscoroutinefunction(stage.run):
+                    result = await stage.run(results)
+                else:
+                    result = await asyncio.to_thread(stage.run, results)
+            except Exception:
+                error = traceback.format_exc()
+                print(f"[{stage.name}] failed after {time.perf_counter() - start:.1f}s\n{error}")
+                return Outcome(FAILED, seconds=time.perf_counter() - start, fingerprint=fingerprint, error=error)
+            seconds = time.perf_counter() - start
+            print(f"[{stage.name}] finished in {seconds:.1f}s")
+            return Outcome(OK, result, seconds, fingerprint)
+
+        for name in self.order:
+            tasks[name] = asyncio.ensure_future(execute(self.stages[name]))
+        outcomes = {name: await tasks[name] for name in self.order}
+
+        finished_at = datetime.now(timezone.utc).isoformat()
+        for name, outcome in outcomes.items():
+            if outcome.status == OK:
+                entry = state.setdefault(name, {})
+                entry.update(status=OK, finished_at=finished_at, seconds=round(outcome.seconds, 3))
+                settled = all(outcomes[other].status in (OK, SKIPPED)
+                              for other in self.downstream(name) if other in outcomes)
+                if outcome.fingerprint is not None and settled:
+                    entry['fingerprint'] = outcome.fingerprint
+                else:
+                    entry.pop('fingerprint', None)
+            elif outcome.status == FAILED:
+                entry = state.setdefault(name, {})
+                entry.update(status=FAILED, finished_at=finished_at)
+                entry.pop('fingerprint', None)
+        self.save_state(state)
+        return outcomes
+
+
+def format_outcomes(outcomes):
+    lines = []
+    for name, outcome in outcomes.items():
+        seconds = f"{outcome.seconds:.1f}s" if outcome.status in (OK, FAILED) else ''
+        lines.append(f"  {name:<20} {outcome.status:<8} {seconds}")
+    return '\n'.join(lines)
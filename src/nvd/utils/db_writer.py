@@ -0,0 +1,197 @@
+import os
+import queue
+import sqlite3
+import time
+import traceback
+from threading import Thread
+
+from nvd.utils.metrics import Histogram, record_writer
+from nvd.utils.processes import context
+from nvd.utils.store import BUSY_TIMEOUT_MS, tune_for_bulk_load
+
+SENTINEL = "DONE"
+
+# Rows (or calls) gathered into one transaction, and how long an idle writer waits before committing
+BATCH_ROWS = int(os.getenv('DB_WRITER_BATCH_ROWS', 50000))
+FLUSH_INTERVAL = float(os.getenv('DB_WRITER_FLUSH_INTERVAL', 1.0))
+# Requests queued before producers block; this is the backpressure when the writer falls behind.
+# Callers sending large chunks per request pass a much smaller max_pending, e.g. the NVD loader's 2
+MAX_PENDING = int(os.getenv('DB_WRITER_MAX_PENDING', 64))
+
+
+def connect_writer(path, uri=False):
+    """ The single write connection: WAL so readers are never blocked, large cache for batched writes.
+
+    Foreign keys are enforced unless the writer's `setup` turns them off, as a bulk load does.
+    With `uri=True` the path may be a file: URI, as may the databases it ATTACHes.
+    """
+    conn = sqlite3.connect(path, uri=uri)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    conn.execute(f'PRAGMA busy_timeout={BUSY_TIMEOUT_MS}')
+    conn.execute('PRAGMA foreign_keys=ON')
+    tune_for_bulk_load(conn)
+    return conn
+
+
+def connect_reader(path):
+    """ Read-only connection that keeps querying a consistent snapshot while the writer commits. """
+    conn = sqlite3.connect(f'file:{path}?mode=ro', uri=True)
+    conn.execute(f'PRAGMA busy_timeout={BUSY_TIMEOUT_MS}')
+    return conn
+
+
+class WriterClient:
+    """ Producer handle of a DatabaseWriter; picklable, so it can be passed to producer processes. """
+
+    def __init__(self, requests):
+        self._requests = requests
+
+    def executemany(self, sql, rows):
+        rows = list(rows)
+        if rows:
+            self._requests.put(('executemany', sql, rows))
+
+    def execute(self, sql, parameters=()):
+        self._requests.put(('execute', sql, tuple(parameters)))
+
+    def call(self, function, *args):
+        """ Run `function(conn, *args)` on the writer connection inside the current batch.
+
+        The function must not commit; its return value is collected in `DatabaseWriter.results`.
+        Across processes it must be picklable, i.e. a module-level function.
+        """
+        self._requests.put(('call', function, args))
+
+
+class DatabaseWriter(WriterClient):
+    """ One process (or thread) owning the only write connection to a SQLite database.
+
+    Any number of producers, in this process or others, queue statements and
+    row batches through a bounded queue; the writer applies them in arrival order
+    and groups them into large transactions, committing once `batch_rows` rows are
+    pending or the queue has been idle for `flush_interval` seconds. Producers
+    block when `max_pending` requests are queued, so they can never outrun the
+    disk. Because the database is in WAL mode, readers keep querying while loads
+    run, and loads from different pipelines no longer contend for the lock.
+
+    A failed request rolls back the open transaction; the writer then discards
+    further requests and `close()` raises the error. On close the writer's request,
+    commit-latency and queue-depth statistics are added to the caller's run metrics.
+    """
+
+    def __init__(self, path, setup=None, batch_rows=BATCH_ROWS, flush_interval=FLUSH_INTERVAL,
+                 max_pending=MAX_PENDING, thread=False):
+        super().__init__(context.Queue(maxsize=max_pending))
+        self.path = path
+        self.results = None
+        self.stats = None
+        self._replies = context.Queue()
+        worker = Thread if thread else context.Process
+        self._worker = worker(target=serve, args=(path, self._requests, self._replies, setup, batch_rows,
+                                                  flush_interval), daemon=True)
+
+    def start(self):
+        self._worker.start()
+        return self
+
+    def client(self):
+        return WriterClient(self._requests)
+
+    def queue_depth(self):
+        try:
+            return self._requests.qsize()
+        except NotImplementedError:  # macOS has no sem_getvalue
+            return None
+
+    def close(self):
+        """ Commit what is pending, stop the writer and return the results of every `call`. """
+        self._requests.put(SENTINEL)
+        error, self.results, self.stats = self._replies.get()
+        self._worker.join()
+        record_writer(self.path, self.stats)
+        if error:
+            raise RuntimeError(f"Database writer for {self.path} failed:\n{error}")
+        return self.results
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def serve(path, requests, replies, setup=None, batch_rows=BATCH_ROWS, flush_interval=FLUSH_INTERVAL):
+    """ Writer loop: apply queued requests in batched transactions until the sentinel arrives. """
+    conn = None
+    results = []
+    stats = {'requests': 0, 'rows': 0, 'transactions': 0, 'max_queue_depth': 0, 'commit_seconds': Histogram()}
+    error = None
+    pending = 0
+    try:
+        conn = connect_writer(path)
+        if setup is not None:
+            setup(conn)
+            conn.commit()
+    except Exception:
+        error = traceback.format_exc()
+
+    while True:
+        try:
+            message = requests.get(timeout=flush_interval) if pending else requests.get()
+        except queue.Empty:
+            message = None
+        if message == SENTINEL:
+            break
+        stats['max_queue_depth'] = max(stats['max_queue_depth'], _qsize(requests))
+        if error is not None:
+            continue  # Keep draining so producers never block on a dead writer
+        try:
+            if message is not None:
+                kind, target, args = message
+                if not conn.in_transaction:
+                    conn.execute('BEGIN IMMEDIATE')
+                if kind == 'executemany':
+                    conn.executemany(target, args)
+                    pending += len(args)
+                elif kind == 'execute':
+                    conn.execute(target, args)
+                    pending += 1
+                else:
+                    results.append(target(conn, *args))
+                    pending += 1
+                stats['requests'] += 1
+            if pending and (message is None or pending >= batch_rows):
+                _commit(conn, stats)
+                stats['rows'] += pending
+                stats['transactions'] += 1
+                pending = 0
+        except Exception:
+            error = traceback.format_exc()
+            conn.rollback()
+            pending = 0
+
+    try:
+        if error is None and conn.in_transaction:
+            _commit(conn, stats)
+            stats['rows'] += pending
+            stats['transactions'] += 1
+    except Exception:
+        error = traceback.format_exc()
+    finally:
+        if conn is not None:
+            conn.close()
+    replies.put((error, results, stats))
+
+
+def _commit(conn, stats):
+    start = time.perf_counter()
+    conn.commit()
+    stats['commit_seconds'].observe(time.perf_counter() - start)
+
+
+def _qsize(requests):
+    try:
+        return requests.qsize()
+    except NotImplementedError:  # macOS has no sem_getvalue
+        return 0
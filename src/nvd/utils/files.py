@@ -0,0 +1,26 @@
+import json
+import os
+
+
+def write_atomic(path, content):
+    """ Write bytes (or text, as UTF-8) to `path` through a temp file so readers never see a partial file. """
+    if isinstance(content, str):
+        content = content.encode('utf-8')
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as file:
+        file.write(content)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(tmp_path, path)
+
+
+def load_cache(path):
+    """ A JSON state file written by save_cache, e.g. the validators of each URL from the previous run; {} if absent. """
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r', encoding='utf-8') as file:
+        return json.load(file)
+
+
+def save_cache(cache, path):
+    write_atomic(path, json.dumps(cache, indent=2, sort_keys=True))
@@ -0,0 +1,103 @@
+import codecs
+import json
+import re
+
+CHUNK_SIZE = 64 * 1024
+
+_decoder = json.JSONDecoder()
+_whitespace = re.compile(r'[ \t\n\r]*')
+
+
+class JsonArrayStream:
+    """ Incremental decoder for NVD API responses that yields one array element at a time.
+
+    NVD pages look like `{"resultsPerPage": ..., "totalResults": ..., "vulnerabilities": [...]}`.
+    Text is fed in as it arrives; every complete element of the named array is
+    decoded with the C scanner and handed back immediately, so at most one
+    element plus one network chunk is ever buffered. The remaining top-level
+    fields are collected into `envelope`.
+    """
+
+    def __init__(self, array_key):
+        self.array_key = array_key
+        self.envelope = {}
+        self._key_pattern = re.compile(r'"%s"\s*:\s*\[' % re.escape(array_key))
+        self._buffer = ''
+        self._state = 'header'
+
+    def feed(self, text):
+        """ Add decoded text and return the array elements it completed. """
+        self._buffer += text
+        items = []
+
+        if self._state == 'header':
+            match = self._key_pattern.search(self._buffer)
+            if not match:
+                return items
+            header = self._buffer[:match.start()].rstrip().rstrip(',')
+            self.envelope.update(json.loads(header + '}'))
+            self._buffer = self._buffer[match.end():]
+            self._state = 'array'
+
+        if self._state == 'array':
+            buffer = self._buffer
+            pos = 0
+            while True:
+                pos = _whitespace.match(buffer, pos).end()
+                if pos < len(buffer) and buffer[pos] == ',':
+                    pos = _whitespace.match(buffer, pos + 1).end()
+                if pos >= len(buffer):
+                    break
+                if buffer[pos] == ']':
+                    pos += 1
+                    self._state = 'trailer'
+                    break
+                try:
+                    item, pos_after = _decoder.raw_decode(buffer, pos)
+                except json.JSONDecodeError:
+                    # The element is still incomplete; wait for the next chunk
+                    break
+                items.append(item)
+                pos = pos_after
+            self._buffer = buffer[pos:]
+
+        return items
+
+    def close(self):
+        """ Finish the stream and collect any top-level fields that followed the array. """
+        if self._state == 'header':
+            # No array in the response (an empty page or an error body); decode it whole
+            if self._buffer.strip():
+                self.envelope.update(json.loads(self._buffer))
+        elif self._state == 'array':
+            raise ValueError(f"Response ended inside the '{self.array_key}' array")
+        else:
+            trailer = self._buffer.strip().lstrip(',').strip()
+            if trailer != '}':
+                self.envelope.update(json.loads('{' + trailer))
+        self._buffer = ''
+        self._state = 'closed'
+        return self.envelope
+
+    async def iter_response(self, response, chunk_size=CHUNK_SIZE, sink=None):
+        """ Yield array elements from an aiohttp response body as it downloads.
+
+        Each raw chunk is also passed to `sink.write`, e.g. a page archive writer, when one is given.
+        """
+        decoder = codecs.getincrementaldecoder('utf-8')()
+        async for chunk in response.content.iter_chunked(chunk_size):
+            if sink is not None:
+                sink.write(chunk)
+            for item in self.feed(decoder.decode(chunk)):
+                yield item
+        for item in self.feed(decoder.decode(b'', final=True)):
+            yield item
+        self.close()
+
+    def iter_chunks(self, chunks):
+        """ Yield array elements from an iterable of raw body chunks, such as an archived page. """
+        decoder = codecs.getincrementaldecoder('utf-8')()
+        for chunk in chunks:
+            yield from self.feed(decoder.decode(chunk))
+        yield from self.feed(decoder.decode(b'', final=True))
+        self.close()
@@ -0,0 +1,91 @@
+import hashlib
+import json
+from datetime import datetime, timezone
+
+# CISA Known Exploited Vulnerabilities, kept in the NVD database next to nvd_data and
+# joined to it on cve_id = CVE_ID (both unique-indexed)
+KEV_TABLE = 'kev'
+
+# Catalog field -> column, in catalog order (see reference/fields/kev_fields.md)
+KEV_FIELDS = (('cveID', 'cve_id'), ('vendorProject', 'vendor_project'), ('product', 'product'),
+              ('vulnerabilityName', 'vulnerability_name'), ('dateAdded', 'date_added'),
+              ('shortDescription', 'short_description'), ('requiredAction', 'required_action'),
+              ('dueDate', 'due_date'), ('knownRansomwareCampaignUse', 'known_ransomware_campaign_use'),
+              ('notes', 'notes'), ('cwes', 'cwes'))
+KEV_COLUMNS = tuple(column for _, column in KEV_FIELDS) + ('content_hash', 'loaded_at')
+
+create_kev_sql = [
+    f"""
+    CREATE TABLE IF NOT EXISTS {KEV_TABLE} (
+        cve_id TEXT PRIMARY KEY,
+        vendor_project TEXT,
+        product TEXT,
+        vulnerability_name TEXT,
+        date_added TEXT,
+        short_description TEXT,
+        required_action TEXT,
+        due_date TEXT,
+        known_ransomware_campaign_use TEXT,
+        notes TEXT,
+        cwes TEXT,
+        content_hash TEXT NOT NULL,
+        loaded_at TEXT NOT NULL
+    ) WITHOUT ROWID;
+    """,
+    f"CREATE INDEX IF NOT EXISTS ix_{KEV_TABLE}_date_added ON {KEV_TABLE} (date_added, cve_id)",
+    f"CREATE INDEX IF NOT EXISTS ix_{KEV_TABLE}_due_date ON {KEV_TABLE} (due_date, cve_id)",
+]
+
+
+def create_kev_table(conn):
+    for statement in create_kev_sql:
+        conn.execute(statement)
+
+
+def entry_hash(entry):
+    """ Stable hash of one catalog entry, independent of key order and whitespace. """
+    canonical = json.dumps(entry, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+def catalog_rows(catalog):
+    """ One row per catalog entry in KEV_COLUMNS order, minus loaded_at; missing fields are NULL. """
+    rows = []
+    for entry in catalog.get('vulnerabilities', []):
+        if not entry.get('cveID'):
+            continue
+        values = [entry.get(field) for field, _ in KEV_FIELDS]
+        values[-1] = json.dumps(values[-1]) if values[-1] is not None else None  # cwes is a list
+        rows.append((*values, entry_hash(entry)))
+    return rows
+
+
+def apply_catalog(conn, rows):
+    """ Bring the kev table in line with the catalog `rows` within the caller's transaction.
+
+    Entries are diffed by content hash: only new and changed entries are written and
+    entries CISA has withdrawn are deleted, so an unchanged catalog writes nothing.
+    Returns {'inserted', 'updated', 'removed', 'unchanged'}.
+    """
+    stored = dict(conn.execute(f'SELECT cve_id, content_hash FROM {KEV_TABLE}'))
+    loaded_at = datetime.now(timezone.utc).isoformat()
+    inserts, updates = [], []
+    for row in rows:
+        current = stored.pop(row[0], None)
+        if current is None:
+            inserts.append((*row, loaded_at))
+        elif current != row[-1]:
+            updates.append((*row, loaded_at))
+    unchanged = len(rows) - len(inserts) - len(updates)
+
+    column_sql = ', '.join(KEV_COLUMNS)
+    placeholders = ', '.join('?' for _ in KEV_COLUMNS)
+    updates_sql = ', '.join(f'{column} = excluded.{column}' for column in KEV_COLUMNS[1:])
+    conn.executemany(f'INSERT INTO {KEV_TABLE} ({column_sql}) VALUES ({placeholders}) '
+                     f'ON CONFLICT(cve_id) DO UPDATE SET {updates_sql}', inserts + updates)
+    conn.executemany(f'DELETE FROM {KEV_TABLE} WHERE cve_id = ?', ((cve_id,) for cve_id in stored))
+    return {'inserted': len(inserts), 'updated': len(updates), 'removed': len(stored), 'unchanged': unchanged}
+
+
+def format_counts(counts):
+    return ', '.join(f"{count} {name}" for name, count in counts.items())
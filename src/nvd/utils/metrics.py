@@ -0,0 +1,421 @@
+""" Per-stage run metrics for the extractors, writer processes and loaders.
+
+Each process records into one run: `stage()` times a block and counts the records
+it handled, `observe()` feeds latency histograms (HTTP requests, SQLite commits),
+`count()` counts retries and the like, and `gauge()` samples queue depth. When the
+run finishes it is written to METRICS_DIR as a Prometheus textfile (`<job>.prom`,
+for node_exporter's textfile collector) and a JSON summary (`<job>.json`).
+
+Stages can be profiled without code changes: PIPELINE_PROFILE and PIPELINE_TRACEMALLOC
+take a comma-separated list of stage names (`nvd_fetch`, or `nvd_delta.nvd_fetch` for one job)
+or `all`, and write a cProfile dump and the top allocation sites beside the summaries.
+"""
+import bisect
+import cProfile
+import json
+import os
+import resource
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+
+from nvd.utils.files import write_atomic
+
+METRICS_DIR = Path(os.getenv('PIPELINE_METRICS_DIR',
+                             Path(__file__).resolve().parent.parent.parent.parent / 'data/metrics'))
+PROFILE_STAGES = frozenset(filter(None, os.getenv('PIPELINE_PROFILE', '').split(',')))
+TRACEMALLOC_STAGES = frozenset(filter(None, os.getenv('PIPELINE_TRACEMALLOC', '').split(',')))
+TRACEMALLOC_TOP = 15
+
+PREFIX = 'conmon'
+# Upper bounds in seconds; NVD pages take from a fraction of a second to over a minute
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+DESCRIPTIONS = {
+    'http_request_duration_seconds': "Time from sending an HTTP request to receiving the response headers.",
+    'http_retries_total': "HTTP requests retried after a transient failure.",
+    'queue_depth': "Messages waiting in an inter-process queue when sampled.",
+    'queue_bytes_in_flight': "Encoded bytes waiting in an inter-process queue when sampled.",
+    'db_commit_duration_seconds': "Time taken by one SQLite commit of the database writer.",
+    'db_writer_requests_total': "Requests applied by the database writer.",
+    'db_writer_rows_total': "Rows (or calls) applied by the database writer.",
+    'db_writer_transactions_total': "Transactions committed by the database writer.",
+    'db_writer_queue_depth': "Requests waiting for the database writer when sampled.",
+}
+
+
+def peak_rss_bytes(children=False):
+    """ Peak RSS of this process, or of its largest finished child process. """
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF).ru_maxrss
+    return usage if sys.platform == 'darwin' else usage * 1024  # bytes on macOS, KiB on Linux
+
+
+class Histogram:
+    """ Latency histogram with Prometheus-style buckets; plain data, so it pickles across processes. """
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # The last slot is +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def merge(self, other):
+        if other.buckets != self.buckets:
+            raise ValueError("Cannot merge histograms with different buckets")
+        self.counts = [a + b for a, b in zip(self.counts, other.counts)]
+        self.count += other.count
+        self.sum += other.sum
+        self.max = max(self.max, other.max)
+
+    def quantile(self, q):
+        """ Upper bound of the bucket holding the q-quantile (the maximum for the +Inf bucket). """
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return round(min(bound, self.max), 6)
+        return round(self.max, 6)
+
+    def cumulative(self):
+        seen = 0
+        for bound, count in zip(self.buckets + (float('inf'),), self.counts):
+            seen += count
+            yield bound, seen
+
+    def summary(self):
+        return {'count': self.count, 'sum': round(self.sum, 6),
+                'mean': round(self.sum / self.count, 6) if self.count else None,
+                'p50': self.quantile(0.5), 'p95': self.quantile(0.95), 'p99': self.quantile(0.99),
+                'max': round(self.max, 6)}
+
+
+class Stage:
+    """ Accumulated wall time and record count of one named stage; a stage may be entered repeatedly. """
+
+    def __init__(self, name):
+        self.name = name
+        self.seconds = 0.0
+        self.records = 0
+        self.runs = 0
+        self.peak_rss_bytes = 0
+        self.profiler = None
+        self.profile = None
+        self.allocations = None
+
+    def add(self, records):
+        self.records += records
+
+    def summary(self):
+        summary = {'seconds': round(self.seconds, 6), 'records': self.records,
+                   'records_per_second': round(self.records / self.seconds, 1) if self.seconds else None,
+                   'runs': self.runs, 'peak_rss_bytes': self.peak_rss_bytes}
+        if self.profile:
+            summary['profile'] = self.profile
+        if self.allocations:
+            summary['allocations'] = self.allocations
+        return summary
+
+
+def _key(name, labels):
+    return name, tuple(sorted((label, str(value)) for label, value in labels.items()))
+
+
+class Run:
+    """ Everything one process records between `start_run` and `finish_run`. """
+
+    def __init__(self, job, directory=METRICS_DIR):
+        self.job = job
+        self.directory = Path(directory)
+        self.started_at = datetime.now(timezone.utc)
+        self._start = time.perf_counter()
+        self.stages = {}
+        self.counters = {}
+        self.gauges = {}
+        self.histograms = {}
+        self._started_tracing = False
+        self._lock = threading.Lock()
+
+    def stage_for(self, name):
+        with self._lock:
+            return self.stages.setdefault(name, Stage(name))
+
+    def count(self, name, value=1, **labels):
+        key = _key(name, labels)
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def gauge(self, name, value, **labels):
+        """ Record a sample; the last and the largest value are kept. """
+        if value is None:
+            return
+        key = _key(name, labels)
+        with self._lock:
+            previous = self.gauges.get(key)
+            self.gauges[key] = {'last': value, 'max': value if previous is None else max(previous['max'], value)}
+
+    def observe(self, name, value, **labels):
+        key = _key(name, labels)
+        with self._lock:
+            self.histograms.setdefault(key, Histogram()).observe(value)
+
+    def merge_histogram(self, name, histogram, **labels):
+        key = _key(name, labels)
+        with self._lock:
+            self.histograms.setdefault(key, Histogram(histogram.buckets)).merge(histogram)
+
+    def _wants(self, stages, name):
+        return 'all' in stages or name in stages or f"{self.job}.{name}" in stages
+
+    @contextmanager
+    def stage(self, name):
+        """ Time the block as stage `name`; the yielded Stage counts records via `add`. """
+        stage = self.stage_for(name)
+        if stage.profiler is None and self._wants(PROFILE_STAGES, name):
+            stage.profiler = cProfile.Profile()
+        trace = self._wants(TRACEMALLOC_STAGES, name)
+        if trace:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self._started_tracing = True
+            tracemalloc.reset_peak()
+        if stage.profiler:
+            stage.profiler.enable()  # Re-entering a stage adds to the same profile
+        start = time.perf_counter()
+        try:
+            yield stage
+        finally:
+            elapsed = time.perf_counter() - start
+            if stage.profiler:
+                stage.profiler.disable()
+            with self._lock:
+                stage.seconds += elapsed
+                stage.runs += 1
+                stage.peak_rss_bytes = peak_rss_bytes()
+            if trace:
+                self._record_allocations(stage)
+
+    @staticmethod
+    def _record_allocations(stage):
+        """ Keep the top allocation sites from the entry of the stage with the highest traced peak. """
+        _, peak = tracemalloc.get_traced_memory()
+        if stage.allocations and stage.allocations['peak_traced_bytes'] >= peak:
+            return
+        top = tracemalloc.take_snapshot().statistics('lineno')[:TRACEMALLOC_TOP]
+        stage.allocations = {'peak_traced_bytes': peak,
+                             'top': [{'location': f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}",
+                                      'bytes': stat.size, 'blocks': stat.count} for stat in top]}
+
+    def _dump_profiles(self):
+        for name, stage in self.stages.items():
+            if stage.profiler is None:
+                continue
+            path = self.directory / 'profiles' / f"{self.job}.{name}.prof"
+            path.parent.mkdir(parents=True, exist_ok=True)
+            stage.profiler.dump_stats(path)  # Inspect with `python -m pstats <file>` or snakeviz
+            stage.profile = str(path)
+
+    def summary(self, status='ok'):
+        with self._lock:
+            return {
+                'job': self.job,
+                'status': status,
+                'started_at': self.started_at.isoformat(),
+                'finished_at': datetime.now(timezone.utc).isoformat(),
+                'seconds': round(time.perf_counter() - self._start, 6),
+                'peak_rss_bytes': peak_rss_bytes(),
+                'children_peak_rss_bytes': peak_rss_bytes(children=True),
+                'stages': {name: stage.summary() for name, stage in self.stages.items()},
+                'counters': [dict(labels, name=name, value=value)
+                             for (name, labels), value in sorted(self.counters.items())],
+                'gauges': [dict(labels, name=name, **value) for (name, labels), value in sorted(self.gauges.items())],
+                'histograms': [dict(labels, name=name, **histogram.summary())
+                               for (name, labels), histogram in sorted(self.histograms.items())],
+            }
+
+    def prometheus(self, summary):
+        """ The run in the Prometheus text exposition format, one family per metric name. """
+        job = {'job': self.job}
+        families = {}
+
+        def add(name, kind, help_text, labels, value):
+            family = families.setdefault(f"{PREFIX}_{name}", (kind, help_text, []))
+            family[2].append((labels, value))
+
+        add('run_duration_seconds', 'gauge', "Wall time of the last run.", job, summary['seconds'])
+        add('run_success', 'gauge', "1 if the last run finished without an error.", job,
+            int(summary['status'] == 'ok'))
+        add('run_finished_timestamp_seconds', 'gauge', "When the last run finished.", job, time.time())
+        add('run_peak_rss_bytes', 'gauge', "Peak RSS of the run's process.", job, summary['peak_rss_bytes'])
+        add('run_children_peak_rss_bytes', 'gauge', "Peak RSS of the run's largest child process.", job,
+            summary['children_peak_rss_bytes'])
+        for name, stage in summary['stages'].items():
+            labels = dict(job, stage=name)
+            add('stage_duration_seconds', 'gauge', "Wall time spent in a stage.", labels, stage['seconds'])
+            add('stage_records', 'gauge', "Records handled by a stage.", labels, stage['records'])
+            add('stage_records_per_second', 'gauge', "Stage throughput.", labels, stage['records_per_second'] or 0)
+            add('stage_peak_rss_bytes', 'gauge', "Peak RSS of the process when the stage ended.", labels,
+                stage['peak_rss_bytes'])
+        with self._lock:
+            for (name, labels), value in sorted(self.counters.items()):
+                add(name, 'counter', DESCRIPTIONS.get(name, name), dict(job, **dict(labels)), value)
+            for (name, labels), value in sorted(self.gauges.items()):
+                add(name, 'gauge', DESCRIPTIONS.get(name, name), dict(job, **dict(labels)), value['last'])
+                add(f"{name}_max", 'gauge', f"Largest sample of {PREFIX}_{name}.", dict(job, **dict(labels)),
+                    value['max'])
+            histograms = sorted(self.histograms.items())
+
+        lines = []
+        for metric, (kind, help_text, samples) in families.items():
+            lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} {kind}"]
+            lines += [f"{metric}{_labels(labels)} {_number(value)}" for labels, value in samples]
+        for name, group in _group(histograms):
+            metric = f"{PREFIX}_{name}"
+            lines += [f"# HELP {metric} {DESCRIPTIONS.get(name, name)}", f"# TYPE {metric} histogram"]
+            for labels, histogram in group:
+                labels = dict(job, **dict(labels))
+                for bound, seen in histogram.cumulative():
+                    lines.append(f"{metric}_bucket{_labels(dict(labels, le=_number(bound)))} {seen}")
+                lines.append(f"{metric}_sum{_labels(labels)} {_number(histogram.sum)}")
+                lines.append(f"{metric}_count{_labels(labels)} {histogram.count}")
+        return '\n'.join(lines) + '\n'
+
+    def write(self, status='ok'):
+        """ Write `<job>.json` and `<job>.prom` atomically and return the summary. """
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._dump_profiles()
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+        summary = self.summary(status)
+        write_atomic(self.directory / f"{self.job}.json", json.dumps(summary, indent=2))
+        write_atomic(self.directory / f"{self.job}.prom", self.prometheus(summary))
+        return summary
+
+
+def _group(histograms):
+    groups = {}
+    for (name, labels), histogram in histograms:
+        groups.setdefault(name, []).append((labels, histogram))
+    return groups.items()
+
+
+def _labels(labels):
+    if not labels:
+        return ''
+    escaped = (str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+               for value in labels.values())
+    return '{' + ','.join(f'{label}="{value}"' for label, value in zip(labels, escaped)) + '}'
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+_run = None
+
+
+def start_run(job, directory=METRICS_DIR):
+    """ Start recording a fresh run for this process, e.g. in a writer process forked from an extractor. """
+    global _run
+    _run = Run(job, directory)
+    return _run
+
+
+def current_run():
+    """ The process's run, started on first use and named after the script when nobody started one. """
+    if _run is None:
+        start_run(Path(sys.argv[0]).stem or 'python')
+    return _run
+
+
+def finish_run(status='ok'):
+    summary = current_run().write(status)
+    print(format_summary(summary))
+    return summary
+
+
+@contextmanager
+def run(job, directory=METRICS_DIR):
+    """ Record the block as run `job` and export it when the block ends, marking it failed on an exception. """
+    start_run(job, directory)
+    status = 'ok'
+    try:
+        yield _run
+    except BaseException:
+        status = 'failed'
+        raise
+    finally:
+        finish_run(status)
+
+
+def stage(name):
+    return current_run().stage(name)
+
+
+def add_records(stage_name, records):
+    """ Count records for a stage timed elsewhere, e.g. by the coroutines of a concurrent fetch. """
+    current_run().stage_for(stage_name).add(records)
+
+
+def count(name, value=1, **labels):
+    current_run().count(name, value, **labels)
+
+
+def gauge(name, value, **labels):
+    current_run().gauge(name, value, **labels)
+
+
+def observe(name, value, **labels):
+    current_run().observe(name, value, **labels)
+
+
+def record_queue(queue, stats):
+    """ Sample a BatchChannel's `stats()`. """
+    gauge('queue_depth', stats['queue_depth'], queue=queue)
+    gauge('queue_bytes_in_flight', stats['bytes_in_flight'], queue=queue)
+
+
+def record_writer(database, stats):
+    """ Fold the statistics a DatabaseWriter process returned on close into this run. """
+    run_ = current_run()
+    labels = {'database': Path(database).name}
+    run_.count('db_writer_requests_total', stats['requests'], **labels)
+    run_.count('db_writer_rows_total', stats['rows'], **labels)
+    run_.count('db_writer_transactions_total', stats['transactions'], **labels)
+    run_.gauge('db_writer_queue_depth', stats.get('max_queue_depth'), **labels)
+    if stats.get('commit_seconds') is not None:
+        run_.merge_histogram('db_commit_duration_seconds', stats['commit_seconds'], **labels)
+
+
+def format_summary(summary):
+    lines = [f"Run {summary['job']} {summary['status']} in {summary['seconds']:.1f}s "
+             f"(peak RSS {summary['peak_rss_bytes'] / 2 ** 20:.0f} MiB)"]
+    for name, stage in summary['stages'].items():
+        rate = f", {stage['records_per_second']:,.0f} records/s" if stage['records'] and stage['seconds'] else ''
+        lines.append(f"  {name:<24} {stage['seconds']:>9.2f}s {stage['records']:>10} records{rate}")
+    for histogram in summary['histograms']:
+        labels = ', '.join(f"{key}={value}" for key, value in histogram.items()
+                           if key not in ('name', 'count', 'sum', 'mean', 'p50', 'p95', 'p99', 'max'))
+        lines.append(f"  {histogram['name']} [{labels}]: {histogram['count']} observations, "
+                     f"p50 {histogram['p50']}s, p95 {histogram['p95']}s, max {histogram['max']}s")
+    for counter in summary['counters']:
+        if counter['name'] == 'http_retries_total':
+            labels = ', '.join(f"{key}={value}" for key, value in counter.items() if key not in ('name', 'value'))
+            lines.append(f"  retries [{labels}]: {counter['value']}")
+    return '\n'.join(lines)
@@ -0,0 +1,281 @@
+import ast
+import json
+import re
+import sqlite3
+
+from nvd.utils.schema import CVSS_PREFIXES
+from nvd.utils.store import CVE_TABLE, KEY_COLUMN, sanitize_column, table_exists
+
+# Child tables hanging off nvd_data(CVE_ID); each index covers the query it serves,
+# so e.g. "CWE-79 with base score >= 9" is answered from the indexes alone
+CHILD_TABLES_SQL = [
+    f"""
+    CREATE TABLE IF NOT EXISTS cve_metric (
+        cve_id TEXT NOT NULL REFERENCES {CVE_TABLE}({KEY_COLUMN}) ON DELETE CASCADE,
+        version TEXT NOT NULL,
+        source TEXT,
+        type TEXT,
+        vector_string TEXT,
+        base_score REAL,
+        base_severity TEXT,
+        exploitability_score REAL,
+        impact_score REAL
+    );
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_cve_metric_cve ON cve_metric (cve_id, version, base_score)",
+    "CREATE INDEX IF NOT EXISTS ix_cve_metric_score ON cve_metric (version, base_score, cve_id)",
+    "CREATE INDEX IF NOT EXISTS ix_cve_metric_severity ON cve_metric (base_severity, cve_id)",
+    f"""
+    CREATE TABLE IF NOT EXISTS cve_weakness (
+        cve_id TEXT NOT NULL REFERENCES {CVE_TABLE}({KEY_COLUMN}) ON DELETE CASCADE,
+        cwe_id TEXT NOT NULL,
+        source TEXT,
+        type TEXT
+    );
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_cve_weakness_cwe ON cve_weakness (cwe_id, cve_id)",
+    "CREATE INDEX IF NOT EXISTS ix_cve_weakness_cve ON cve_weakness (cve_id, cwe_id)",
+    f"""
+    CREATE TABLE IF NOT EXISTS cve_reference (
+        cve_id TEXT NOT NULL REFERENCES {CVE_TABLE}({KEY_COLUMN}) ON DELETE CASCADE,
+        url TEXT NOT NULL,
+        domain TEXT,
+        source TEXT,
+        tags TEXT
+    );
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_cve_reference_domain ON cve_reference (domain, cve_id)",
+    "CREATE INDEX IF NOT EXISTS ix_cve_reference_cve ON cve_reference (cve_id)",
+    f"""
+    CREATE TABLE IF NOT EXISTS cve_tag (
+        cve_id TEXT NOT NULL REFERENCES {CVE_TABLE}({KEY_COLUMN}) ON DELETE CASCADE,
+        tag TEXT NOT NULL,
+        source TEXT
+    );
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_cve_tag_tag ON cve_tag (tag, cve_id)",
+    "CREATE INDEX IF NOT EXISTS ix_cve_tag_cve ON cve_tag (cve_id, tag)",
+]
+
+CHILD_COLUMNS = {
+    'cve_metric': ('cve_id', 'version', 'source', 'type', 'vector_string', 'base_score', 'base_severity',
+                   'exploitability_score', 'impact_score'),
+    'cve_weakness': ('cve_id', 'cwe_id', 'source', 'type'),
+    'cve_reference': ('cve_id', 'url', 'domain', 'source', 'tags'),
+    'cve_tag': ('cve_id', 'tag', 'source'),
+}
+
+# The network location of a URL: whatever follows the scheme's '//' up to the path, query or fragment
+_NETLOC = re.compile(r'(?:[A-Za-z][A-Za-z0-9+.-]*:)?//([^/?#]*)')
+
+# metrics keys in the API response and the CVSS version each one carries
+METRIC_VERSIONS = {
+    'cvssMetricV2': '2.0',
+    'cvssMetricV30': '3.0',
+    'cvssMetricV31': '3.1',
+    'cvssMetricV40': '4.0',
+}
+
+
+def create_child_tables(conn, indexes=True):
+    """ Create the child tables and, unless a bulk load will add them afterwards, their indexes.
+
+    A child table created without its foreign key (by an older version) is rebuilt with it,
+    keeping the rows whose CVE is still in nvd_data; this needs nvd_data's unique CVE_ID index.
+    """
+    rebuilt = [table for table in CHILD_COLUMNS
+               if table_exists(conn, table) and not conn.execute(f'PRAGMA foreign_key_list({table})').fetchone()]
+    for table in rebuilt:
+        conn.execute(f'ALTER TABLE {table} RENAME TO {table}_rebuilt')
+    for statement in CHILD_TABLES_SQL:
+        if not statement.startswith('CREATE INDEX'):
+            conn.execute(statement)
+    for table in rebuilt:
+        columns = ', '.join(CHILD_COLUMNS[table])
+        conn.execute(f'INSERT INTO {table} ({columns}) SELECT {columns} FROM {table}_rebuilt '
+                     f'WHERE cve_id IN (SELECT "{KEY_COLUMN}" FROM "{CVE_TABLE}")')
+        # Dropping the old table also drops its indexes, whose names the new ones reuse
+        conn.execute(f'DROP TABLE {table}_rebuilt')
+    if indexes:
+        create_child_indexes(conn)
+
+
+def create_child_indexes(conn):
+    for statement in CHILD_TABLES_SQL:
+        if statement.startswith('CREATE INDEX'):
+            conn.execute(statement)
+
+
+def check_child_keys(conn):
+    """ Raise if a child row references a CVE missing from nvd_data.
+
+    A bulk load inserts with foreign key enforcement off, because nvd_data has no unique
+    CVE_ID to check against until the load is finished; this checks the rows it wrote.
+    """
+    for table in CHILD_COLUMNS:
+        orphan = conn.execute(f'PRAGMA foreign_key_check({table})').fetchone()
+        if orphan is not None:
+            raise sqlite3.IntegrityError(f"Table '{table}' has rows whose cve_id is not in {CVE_TABLE}")
+
+
+def parse_nested(value):
+    """ Decode a nested column that may hold JSON (Parquet/SQLite), a Python repr (CSV) or the object itself. """
+    if isinstance(value, (list, dict)):
+        return value
+    if value is None or not isinstance(value, str) or value in ('', 'N/A', 'nan'):
+        return None
+    try:
+        return json.loads(value)
+    except ValueError:
+        try:
+            return ast.literal_eval(value)
+        except (ValueError, SyntaxError):
+            return None
+
+
+def url_domain(url):
+    """ The lower-cased network location of a URL, as urlparse(url).netloc would give it; None without one. """
+    match = _NETLOC.match(url)
+    return (match.group(1).lower() or None) if match else None
+
+
+def to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def metric_rows(cve_id, metrics):
+    rows = []
+    for key, version in METRIC_VERSIONS.items():
+        for metric in (metrics or {}).get(key, []):
+            cvss = metric.get('cvssData', {})
+            rows.append((
+                cve_id,
+                cvss.get('version', version),
+                metric.get('source'),
+                metric.get('type'),
+                cvss.get('vectorString'),
+                to_float(cvss.get('baseScore')),
+                cvss.get('baseSeverity') or metric.get('baseSeverity'),
+                to_float(metric.get('exploitabilityScore')),
+                to_float(metric.get('impactScore')),
+            ))
+    return rows
+
+
+# Columns, after the version's sanitized prefix, read from the flattened CVSS columns into a cve_metric row
+FLATTENED_METRIC_SUFFIXES = ('Version', 'Source', 'Type', 'Vector_String', 'Base_Score', 'Base_Severity',
+                             'Exploitability_Score', 'Impact_Score')
+
+
+def flattened_metric_positions(position):
+    """ Per CVSS version present in a row layout ({column: index}), the indexes of FLATTENED_METRIC_SUFFIXES. """
+    layouts = []
+    for key in METRIC_VERSIONS:
+        prefix = sanitize_column(CVSS_PREFIXES[key])
+        layout = tuple(position.get(f'{prefix}_{suffix}') for suffix in FLATTENED_METRIC_SUFFIXES)
+        if layout[0] is not None and layout[4] is not None:
+            layouts.append(layout)
+    return layouts
+
+
+def flattened_metric_rows(cve_id, row, layouts):
+    """ Metric rows, one per CVSS version, for extracts that only carry the flattened CVSS columns. """
+    rows = []
+    for layout in layouts:
+        version, source, kind, vector, base_score, severity, exploitability, impact = (
+            None if index is None else row[index] for index in layout)
+        base_score = to_float(base_score)
+        if base_score is None or version in (None, '', 'N/A'):
+            continue
+        rows.append((cve_id, version, source, kind, vector, base_score, severity, to_float(exploitability),
+                     to_float(impact)))
+    return rows
+
+
+def weakness_rows(cve_id, weaknesses):
+    rows = []
+    for weakness in weaknesses or []:
+        for description in weakness.get('description', []):
+            if description.get('value'):
+                rows.append((cve_id, description['value'], weakness.get('source'), weakness.get('type')))
+    return rows
+
+
+def reference_rows(cve_id, references):
+    if isinstance(references, str):
+        # The extractors flatten references to a comma-separated URL list
+        references = [{'url': url.strip()} for url in references.split(',') if url.strip() not in ('', 'N/A')]
+    if not isinstance(references, list):
+        return []
+    rows = []
+    for reference in references:
+        url = reference.get('url')
+        if url:
+            tags = reference.get('tags')
+            rows.append((cve_id, url, url_domain(url), reference.get('source'), ','.join(tags) if tags else None))
+    return rows
+
+
+def tag_rows(cve_id, cve_tags):
+    rows = []
+    for cve_tag in cve_tags or []:
+        for tag in cve_tag.get('tags', []):
+            rows.append((cve_id, tag, cve_tag.get('sourceIdentifier')))
+    return rows
+
+
+def child_rows(record, rows_by_table=None):
+    """ Add the child-table rows of one CVE record (raw or sanitized column names) to `rows_by_table`. """
+    return batch_child_rows(list(record), [tuple(record.values())], rows_by_table)
+
+
+def batch_child_rows(columns, rows, rows_by_table=None):
+    """ Add the child-table rows of many CVE records that share `columns` (raw or sanitized names).
+
+    The columns are resolved to row positions once for the whole batch rather than once per record.
+    """
+    if rows_by_table is None:
+        rows_by_table = {table: [] for table in CHILD_COLUMNS}
+    position = {sanitize_column(column): index for index, column in enumerate(columns)}
+    key = position.get(KEY_COLUMN)
+    if key is None:
+        return rows_by_table
+    metrics_at, weaknesses_at, references_at, tags_at = (
+        position.get(column) for column in ('Metrics', 'Weaknesses', 'References', 'CVE_Tags'))
+    layouts = flattened_metric_positions(position)
+    metric, weakness, reference, tag = (rows_by_table[table] for table in CHILD_COLUMNS)
+
+    for row in rows:
+        cve_id = row[key]
+        if not cve_id or cve_id == 'N/A':
+            continue
+        metrics = parse_nested(row[metrics_at]) if metrics_at is not None else None
+        if metrics is not None:
+            metric.extend(metric_rows(cve_id, metrics))
+        else:
+            metric.extend(flattened_metric_rows(cve_id, row, layouts))
+        if weaknesses_at is not None:
+            weakness.extend(weakness_rows(cve_id, parse_nested(row[weaknesses_at])))
+        if references_at is not None:
+            reference.extend(reference_rows(cve_id, row[references_at]))
+        if tags_at is not None:
+            tag.extend(tag_rows(cve_id, parse_nested(row[tags_at])))
+    return rows_by_table
+
+
+def insert_children(conn, rows_by_table):
+    for table, columns in CHILD_COLUMNS.items():
+        placeholders = ', '.join('?' for _ in columns)
+        conn.executemany(f'INSERT INTO {table} ({", ".join(columns)}) VALUES ({placeholders})',
+                         rows_by_table.get(table, []))
+
+
+def replace_children(conn, cve_ids, rows_by_table):
+    """ Replace every child row of `cve_ids` within the caller's transaction. """
+    cve_ids = [(cve_id,) for cve_id in cve_ids]
+    for table in CHILD_COLUMNS:
+        conn.executemany(f'DELETE FROM {table} WHERE cve_id = ?', cve_ids)
+    insert_children(conn, rows_by_table)
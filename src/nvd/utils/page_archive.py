@@ -0,0 +1,165 @@
+import gzip
+import hashlib
+import json
+import os
+from datetime import datetime, timezone
+from pathlib import Path
+
+try:
+    import zstandard
+except ImportError:  # zstd archives are optional; gzip ones need nothing beyond the standard library
+    zstandard = None
+
+# Raw API pages, kept so extracts can be rebuilt offline after a transform or schema change
+ARCHIVE_DIR = Path(os.getenv('NVD_PAGE_ARCHIVE_DIR',
+                             Path(__file__).resolve().parent.parent.parent.parent / 'data/nvd_data/page_archive'))
+
+COMPRESSIONS = ('zstd', 'gzip')
+SUFFIXES = {'zstd': '.json.zst', 'gzip': '.json.gz'}
+DEFAULT_COMPRESSION = os.getenv('NVD_ARCHIVE_COMPRESSION', 'zstd' if zstandard else 'gzip')
+# Compression levels; archiving runs while the page downloads, so zstd stays at its fast default
+LEVELS = {'zstd': int(os.getenv('NVD_ARCHIVE_ZSTD_LEVEL', 3)), 'gzip': int(os.getenv('NVD_ARCHIVE_GZIP_LEVEL', 6))}
+
+INDEX_FILE = 'index.jsonl'
+READ_SIZE = 64 * 1024
+
+
+class MissingPage(LookupError):
+    """ A page that replay needs was never archived (or was archived with other query parameters). """
+
+
+def page_key(endpoint, params):
+    """ Content address of one API page: a hash of its endpoint and query parameters.
+
+    The parameters are the page's startIndex and resultsPerPage and, for the delta, its
+    lastModStartDate/lastModEndDate range; the same query always maps to the same page file.
+    """
+    canonical = json.dumps({'endpoint': endpoint, 'params': {name: str(value) for name, value in params.items()}},
+                           sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+def _require_zstd():
+    if zstandard is None:
+        raise ImportError("zstd page archives require the zstandard package; install it or use gzip")
+
+
+def open_compressed(path, compression, mode):
+    """ Binary file object that (de)compresses `path` with `compression`, for mode 'rb' or 'wb'. """
+    if compression == 'gzip':
+        return gzip.open(path, mode, compresslevel=LEVELS['gzip']) if mode == 'wb' else gzip.open(path, mode)
+    _require_zstd()
+    if mode == 'wb':
+        return zstandard.ZstdCompressor(level=LEVELS['zstd']).stream_writer(open(path, 'wb'))
+    return zstandard.ZstdDecompressor().stream_reader(open(path, 'rb'))
+
+
+class PageWriter:
+    """ Compresses one page's raw response body into a temp file while it downloads.
+
+    `commit(envelope)` publishes the file under the page's key and records it in the
+    archive index; `close()` without a commit (a failed or retried download) discards it.
+    """
+
+    def __init__(self, archive, endpoint, params):
+        self.archive = archive
+        self.endpoint = endpoint
+        self.params = dict(params)
+        self.key = page_key(endpoint, params)
+        self.path = archive.directory / endpoint / f'{self.key}{SUFFIXES[archive.compression]}'
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._tmp_path = self.path.with_name(f'{self.path.name}.tmp')
+        self._file = open_compressed(self._tmp_path, archive.compression, 'wb')
+        self.raw_bytes = 0
+        self.committed = False
+
+    def write(self, chunk):
+        self._file.write(chunk)
+        self.raw_bytes += len(chunk)
+
+    def commit(self, envelope):
+        self._file.close()
+        os.replace(self._tmp_path, self.path)
+        self.committed = True
+        for compression, suffix in SUFFIXES.items():
+            # A page archived earlier with the other compression is superseded
+            if compression != self.archive.compression:
+                self.path.with_name(f'{self.key}{suffix}').unlink(missing_ok=True)
+        self.archive.record({
+            'key': self.key,
+            'endpoint': self.endpoint,
+            'params': {name: str(value) for name, value in self.params.items()},
+            'file': str(self.path.relative_to(self.archive.directory)),
+            'compression': self.archive.compression,
+            'raw_bytes': self.raw_bytes,
+            'bytes': self.path.stat().st_size,
+            'envelope': envelope,
+            'archived_at': datetime.now(timezone.utc).isoformat(),
+        })
+
+    def close(self):
+        if not self.committed:
+            self._file.close()
+            self._tmp_path.unlink(missing_ok=True)
+
+
+class PageArchive:
+    """ Directory of compressed raw API pages, one file per query, plus an append-only index.
+
+    A page refetched with the same query parameters replaces the earlier copy, so the
+    archive holds the latest response to every query the extractors have made. The
+    index (one JSON line per archived page, the last line for a key wins) records each
+    page's query parameters and envelope, which is what replay needs to find the pages
+    of a run without the network.
+    """
+
+    def __init__(self, directory=ARCHIVE_DIR, compression=DEFAULT_COMPRESSION):
+        if compression not in COMPRESSIONS:
+            raise ValueError(f"Unknown archive compression '{compression}'; use one of {', '.join(COMPRESSIONS)}")
+        if compression == 'zstd':
+            _require_zstd()
+        self.directory = Path(directory)
+        self.compression = compression
+        self._entries = None
+
+    def writer(self, endpoint, params):
+        """ A PageWriter for the raw body of the page `params` returns from `endpoint`. """
+        return PageWriter(self, endpoint, params)
+
+    def record(self, entry):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        with open(self.directory / INDEX_FILE, 'a', encoding='utf-8') as file:
+            file.write(json.dumps(entry, sort_keys=True) + '\n')
+        if self._entries is not None:
+            self._entries[entry['key']] = entry
+
+    def entries(self):
+        """ {key: index entry} of every archived page whose file is present. """
+        if self._entries is None:
+            self._entries = {}
+            index_path = self.directory / INDEX_FILE
+            if index_path.exists():
+                with open(index_path, 'r', encoding='utf-8') as file:
+                    for line in file:
+                        if line.strip():
+                            entry = json.loads(line)
+                            self._entries[entry['key']] = entry
+            self._entries = {key: entry for key, entry in self._entries.items()
+                             if (self.directory / entry['file']).exists()}
+        return self._entries
+
+    def pages(self, endpoint):
+        """ Index entries of every archived page of `endpoint`. """
+        return [entry for entry in self.entries().values() if entry['endpoint'] == endpoint]
+
+    def read(self, endpoint, params, read_size=READ_SIZE):
+        """ Yield the decompressed raw body of an archived page in chunks; raises MissingPage if there is none. """
+        entry = self.entries().get(page_key(endpoint, params))
+        if entry is None:
+            raise MissingPage(f"No archived {endpoint} page for {params} in {self.directory}")
+        with open_compressed(self.directory / entry['file'], entry['compression'], 'rb') as file:
+            while True:
+                chunk = file.read(read_size)
+                if not chunk:
+                    break
+                yield chunk
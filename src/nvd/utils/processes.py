@@ -0,0 +1,13 @@
+import multiprocessing
+import os
+
+# Start method of the writer and worker processes. run_pipeline.py starts them from a multi-threaded
+# process, where a plain fork copies locks other threads may be holding and can deadlock the child;
+# forkserver children are forked from a single-threaded server process instead
+START_METHOD = os.getenv('NVD_START_METHOD', 'forkserver')
+# Imported once by the fork server rather than by every child it starts
+PRELOAD = ['pandas', 'nvd.utils.batch_queue', 'nvd.utils.db_writer', 'nvd.utils.metrics']
+
+context = multiprocessing.get_context(START_METHOD)
+if START_METHOD == 'forkserver':
+    context.set_forkserver_preload(PRELOAD)
@@ -0,0 +1,36 @@
+import asyncio
+import time
+from collections import deque
+
+
+class RateLimiter:
+    """ Token bucket shared by concurrent requests, refilled over a rolling window.
+
+    Each request takes one token, and that token only returns to the bucket
+    `window` seconds after it was taken. No rolling window can therefore ever
+    see more than `max_requests` requests, which is how the NVD quota is enforced.
+    """
+
+    def __init__(self, max_requests, window):
+        self.max_requests = max_requests
+        self.window = window
+        self._issued = deque()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                while self._issued and now - self._issued[0] >= self.window:
+                    self._issued.popleft()
+                if len(self._issued) < self.max_requests:
+                    self._issued.append(now)
+                    return
+                await asyncio.sleep(self.window - (now - self._issued[0]))
+
+    async def __aenter__(self):
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        return False
@@ -0,0 +1,257 @@
+""" Declared record schemas for the NVD extracts.
+
+Every column the extractors produce is declared once here, with its type and how it
+is read from an API element. A record is a plain tuple in schema order, so a batch
+of records carries no per-record keys, and an absent field is None rather than a
+placeholder string. The extractors, the batch channel, the file writers and the
+loaders all take their column lists and column types from these schemas.
+
+The CVSS columns are page fields: `RecordSchema.rows` reads them for a whole page of
+CVEs in one `cvss.flatten_page` call rather than field by field for each record.
+"""
+from nvd.utils.cvss import CvssVersion, flatten_page
+
+# Column kinds: how a value is typed in Parquet and SQLite
+STRING, FLOAT, TIMESTAMP, DATE, JSON, BOOLEAN = 'string', 'float', 'timestamp', 'date', 'json', 'boolean'
+
+
+class Field:
+    """ One column: its name in the extracts, its kind, and how it is read.
+
+    Either `extract(element)` reads it from one API element, or `page(elements)` returns
+    {column: values} for a whole page, shared by every field with the same `page`.
+    """
+
+    __slots__ = ('column', 'kind', 'extract', 'page')
+
+    def __init__(self, column, kind, extract=None, page=None):
+        self.column = column
+        self.kind = kind
+        self.extract = extract
+        self.page = page
+
+
+class RecordSchema:
+    """ An ordered set of fields; records are tuples with one value per field. """
+
+    __slots__ = ('fields', 'columns', '_positions', '_extractors')
+
+    def __init__(self, fields):
+        self.fields = tuple(fields)
+        self.columns = tuple(field.column for field in self.fields)
+        self._positions = {column: position for position, column in enumerate(self.columns)}
+        self._extractors = None
+        if all(field.page is None for field in self.fields):
+            self._extractors = tuple(field.extract for field in self.fields)
+
+    def row(self, element):
+        """ The record of one API element (the object under 'cve' or 'cpe'). """
+        if self._extractors is None:
+            return self.rows((element,))[0]
+        return tuple([extract(element) for extract in self._extractors])
+
+    def rows(self, elements):
+        """ The records of a page of API elements, read a column at a time. """
+        pages = {}
+        columns = []
+        for field in self.fields:
+            if field.page is None:
+                columns.append(list(map(field.extract, elements)))
+            else:
+                if field.page not in pages:
+                    pages[field.page] = field.page(elements)
+                columns.append(pages[field.page][field.column])
+        return list(zip(*columns))
+
+    def select(self, *columns):
+        """ A schema of just `columns`, in the order given. """
+        return RecordSchema(self.fields[self._positions[column]] for column in columns)
+
+    def position(self, column):
+        return self._positions[column]
+
+    def columns_of_kind(self, *kinds):
+        return frozenset(field.column for field in self.fields if field.kind in kinds)
+
+    def __len__(self):
+        return len(self.fields)
+
+
+def value(key):
+    return lambda element: element.get(key)
+
+
+def english(key, attribute):
+    """ The English entry of a list of localized objects such as descriptions or titles. """
+    def extract(element):
+        return next((entry.get(attribute) for entry in element.get(key) or () if entry.get('lang') == 'en'), None)
+    return extract
+
+
+def reference_urls(cve):
+    urls = [reference['url'] for reference in cve.get('references') or () if reference.get('url')]
+    return ', '.join(urls) or None
+
+
+# Column prefix of each CVSS version's metrics list; 'CVSSv3' has always meant v3.1 in these extracts
+CVSS_PREFIXES = {
+    'cvssMetricV2': 'CVSSv2',
+    'cvssMetricV30': 'CVSSv30',
+    'cvssMetricV31': 'CVSSv3',
+    'cvssMetricV40': 'CVSSv40',
+}
+
+# CVSS columns as (column suffix, kind, key of the metric or its cvssData)
+CVSS_V2 = (
+    ('Version', STRING, 'version'),
+    ('Vector String', STRING, 'vectorString'),
+    ('Access Vector', STRING, 'accessVector'),
+    ('Access Complexity', STRING, 'accessComplexity'),
+    ('Authentication', STRING, 'authentication'),
+    ('Confidentiality Impact', STRING, 'confidentialityImpact'),
+    ('Integrity Impact', STRING, 'integrityImpact'),
+    ('Availability Impact', STRING, 'availabilityImpact'),
+    ('Base Score', FLOAT, 'baseScore'),
+    ('Base Severity', STRING, 'baseSeverity'),
+    ('Exploitability Score', FLOAT, 'exploitabilityScore'),
+    ('Impact Score', FLOAT, 'impactScore'),
+)
+CVSS_V3_BASE = (
+    ('Version', STRING, 'version'),
+    ('Vector String', STRING, 'vectorString'),
+    ('Attack Vector', STRING, 'attackVector'),
+    ('Attack Complexity', STRING, 'attackComplexity'),
+    ('Privileges Required', STRING, 'privilegesRequired'),
+    ('User Interaction', STRING, 'userInteraction'),
+    ('Scope', STRING, 'scope'),
+    ('Confidentiality Impact', STRING, 'confidentialityImpact'),
+    ('Integrity Impact', STRING, 'integrityImpact'),
+    ('Availability Impact', STRING, 'availabilityImpact'),
+    ('Base Score', FLOAT, 'baseScore'),
+    ('Base Severity', STRING, 'baseSeverity'),
+)
+CVSS_V3_SUBSCORES = (
+    ('Exploitability Score', FLOAT, 'exploitabilityScore'),
+    ('Impact Score', FLOAT, 'impactScore'),
+)
+# Temporal and environmental metrics, part of cvssData in the CVSS 3.x JSON schema; NVD leaves them
+# out today, and the v3.1 columns are kept for the extracts and tables that already have them
+CVSS_V3_TEMPORAL_ENVIRONMENTAL = (
+    ('Exploit Code Maturity', STRING, 'exploitCodeMaturity'),
+    ('Remediation Level', STRING, 'remediationLevel'),
+    ('Report Confidence', STRING, 'reportConfidence'),
+    ('Temporal Score', FLOAT, 'temporalScore'),
+    ('Temporal Severity', STRING, 'temporalSeverity'),
+    ('Confidentiality Requirement', STRING, 'confidentialityRequirement'),
+    ('Integrity Requirement', STRING, 'integrityRequirement'),
+    ('Availability Requirement', STRING, 'availabilityRequirement'),
+    ('Modified Attack Vector', STRING, 'modifiedAttackVector'),
+    ('Modified Attack Complexity', STRING, 'modifiedAttackComplexity'),
+    ('Modified Privileges Required', STRING, 'modifiedPrivilegesRequired'),
+    ('Modified User Interaction', STRING, 'modifiedUserInteraction'),
+    ('Modified Scope', STRING, 'modifiedScope'),
+    ('Modified Confidentiality Impact', STRING, 'modifiedConfidentialityImpact'),
+    ('Modified Integrity Impact', STRING, 'modifiedIntegrityImpact'),
+    ('Modified Availability Impact', STRING, 'modifiedAvailabilityImpact'),
+    ('Environmental Score', FLOAT, 'environmentalScore'),
+    ('Environmental Severity', STRING, 'environmentalSeverity'),
+)
+CVSS_V4 = (
+    ('Version', STRING, 'version'),
+    ('Vector String', STRING, 'vectorString'),
+    ('Attack Vector', STRING, 'attackVector'),
+    ('Attack Complexity', STRING, 'attackComplexity'),
+    ('Attack Requirements', STRING, 'attackRequirements'),
+    ('Privileges Required', STRING, 'privilegesRequired'),
+    ('User Interaction', STRING, 'userInteraction'),
+    ('Vulnerable System Confidentiality', STRING, 'vulnConfidentialityImpact'),
+    ('Vulnerable System Integrity', STRING, 'vulnIntegrityImpact'),
+    ('Vulnerable System Availability', STRING, 'vulnAvailabilityImpact'),
+    ('Subsequent System Confidentiality', STRING, 'subConfidentialityImpact'),
+    ('Subsequent System Integrity', STRING, 'subIntegrityImpact'),
+    ('Subsequent System Availability', STRING, 'subAvailabilityImpact'),
+    ('Exploit Maturity', STRING, 'exploitMaturity'),
+    ('Base Score', FLOAT, 'baseScore'),
+    ('Base Severity', STRING, 'baseSeverity'),
+)
+# Which of a version's metrics was flattened: NVD's Primary one or a CNA's Secondary one
+CVSS_SOURCE = (
+    ('Source', STRING, 'source'),
+    ('Type', STRING, 'type'),
+)
+
+CVSS_LAYOUT = {
+    'cvssMetricV2': CVSS_V2 + CVSS_SOURCE,
+    'cvssMetricV30': CVSS_V3_BASE + CVSS_V3_SUBSCORES + CVSS_SOURCE,
+    'cvssMetricV31': CVSS_V3_BASE + CVSS_V3_TEMPORAL_ENVIRONMENTAL + CVSS_V3_SUBSCORES + CVSS_SOURCE,
+    'cvssMetricV40': CVSS_V4 + CVSS_SOURCE,
+}
+# Keys read from the chosen metric itself; all others are in its cvssData
+CVSS_METRIC_KEYS = {
+    'cvssMetricV2': {'source', 'type', 'baseSeverity', 'exploitabilityScore', 'impactScore'},
+    'cvssMetricV30': {'source', 'type', 'exploitabilityScore', 'impactScore'},
+    'cvssMetricV31': {'source', 'type', 'exploitabilityScore', 'impactScore'},
+    'cvssMetricV40': {'source', 'type'},
+}
+
+
+def cvss_version(key):
+    """ The `cvss.CvssVersion` reading the CVSS_LAYOUT columns of one metrics list. """
+    columns = [(f'{CVSS_PREFIXES[key]} {suffix}', field) for suffix, _, field in CVSS_LAYOUT[key]]
+    on_metric = CVSS_METRIC_KEYS[key]
+    return CvssVersion(key, [(column, field) for column, field in columns if field not in on_metric],
+                       [(column, field) for column, field in columns if field in on_metric])
+
+
+CVSS_VERSIONS = tuple(cvss_version(key) for key in CVSS_LAYOUT)
+
+
+def flatten_cvss(cves):
+    return flatten_page(cves, CVSS_VERSIONS)
+
+
+CVSS_FIELDS = tuple(Field(f'{CVSS_PREFIXES[key]} {suffix}', kind, page=flatten_cvss)
+                    for key, layout in CVSS_LAYOUT.items() for suffix, kind, _ in layout)
+
+CVE_FIELDS = RecordSchema([
+    Field('CVE ID', STRING, value('id')),
+    Field('Source Identifier', STRING, value('sourceIdentifier')),
+    Field('Vulnerability Status', STRING, value('vulnStatus')),
+    Field('Published Date', TIMESTAMP, value('published')),
+    Field('Last Modified Date', TIMESTAMP, value('lastModified')),
+    Field('Evaluator Comment', STRING, value('evaluatorComment')),
+    Field('Evaluator Solution', STRING, value('evaluatorSolution')),
+    Field('Evaluator Impact', STRING, value('evaluatorImpact')),
+    Field('CISA Exploit Add', DATE, value('cisaExploitAdd')),
+    Field('CISA Action Due', DATE, value('cisaActionDue')),
+    Field('CISA Required Action', STRING, value('cisaRequiredAction')),
+    Field('CISA Vulnerability Name', STRING, value('cisaVulnerabilityName')),
+    Field('CVE Tags', JSON, value('cveTags')),
+    Field('Description', STRING, english('descriptions', 'value')),
+    Field('References', STRING, reference_urls),
+    Field('Metrics', JSON, value('metrics')),
+    Field('Weaknesses', JSON, value('weaknesses')),
+    Field('Configurations', JSON, value('configurations')),
+    Field('Vendor Comments', JSON, value('vendorComments')),
+    *CVSS_FIELDS,
+])
+
+BASE_COLUMNS = CVE_FIELDS.columns[:CVE_FIELDS.position('Metrics')]
+NESTED_COLUMNS = ('Metrics', 'Weaknesses', 'Configurations', 'Vendor Comments')
+CVSS_COLUMNS = tuple(field.column for field in CVSS_FIELDS)
+
+# The daily delta also keeps the nested structures, which the loaders normalize into child tables
+DELTA_SCHEMA = CVE_FIELDS.select(*BASE_COLUMNS, *NESTED_COLUMNS, *CVSS_COLUMNS)
+# The initial load carries the flattened CVSS columns only
+INITIAL_LOAD_SCHEMA = CVE_FIELDS.select(*BASE_COLUMNS, *CVSS_COLUMNS)
+# get_all_cpe_cve.py's lightweight CVE list
+CVE_SUMMARY_SCHEMA = CVE_FIELDS.select('CVE ID', 'Published Date', 'Last Modified Date', 'Description')
+
+CPE_SCHEMA = RecordSchema([
+    Field('CPE Name', STRING, value('cpeName')),
+    Field('CPE Name ID', STRING, value('cpeNameId')),
+    Field('Deprecated', BOOLEAN, lambda cpe: cpe.get('deprecated', False)),
+    Field('Created Date', TIMESTAMP, value('created')),
+    Field('Last Modified Date', TIMESTAMP, value('lastModified')),
+    Field('Title', STRING, english('titles', 'title')),
+])
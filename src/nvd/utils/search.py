@@ -0,0 +1,107 @@
+import re
+from collections import namedtuple
+
+# An FTS5 index over text columns of a loader table. The index is an external-content
+# table: it stores only the inverted index and reads column values from `table` by rowid,
+# and triggers keep it in sync with every insert, upsert and delete the loaders make.
+SearchIndex = namedtuple('SearchIndex', ['name', 'table', 'key', 'columns', 'weights'])
+
+SEARCH_INDEXES = {
+    'cve': SearchIndex('nvd_fts', 'nvd_data', 'CVE_ID', ('Description',), (1.0,)),
+    'plugin': SearchIndex('plugin_fts', 'TenablePluginData', 'PluginId',
+                          ('Title', 'Synopsis', 'Description', 'Solution'), (3.0, 2.0, 1.0, 0.5)),
+}
+
+# Porter stemming so "deserialization" also finds "deserialize" and "deserialized"
+TOKENIZER = 'porter unicode61'
+
+_term = re.compile(r'\S+')
+
+
+def _table_columns(conn, table):
+    return [row[1] for row in conn.execute(f'PRAGMA table_info("{table}")')]
+
+
+def create_search_index(conn, index):
+    """ Create the FTS5 table and its sync triggers for `index` (a SEARCH_INDEXES entry or key).
+
+    A newly created index is filled from the rows already in the table. Returns False,
+    creating nothing, while the table does not exist yet or lacks the indexed columns.
+    """
+    index = SEARCH_INDEXES.get(index, index)
+    existing = _table_columns(conn, index.table)
+    if not all(column in existing for column in (index.key, *index.columns)):
+        return False
+    created = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?",
+                           (index.name,)).fetchone() is None
+
+    columns = [index.key, *index.columns]
+    column_sql = ', '.join([f'"{index.key}" UNINDEXED', *(f'"{column}"' for column in index.columns)])
+    names = ', '.join(f'"{column}"' for column in columns)
+    new_values = ', '.join(f'new."{column}"' for column in columns)
+    old_values = ', '.join(f'old."{column}"' for column in columns)
+    conn.execute(f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS {index.name} USING fts5(
+        {column_sql}, content='{index.table}', content_rowid='rowid', tokenize='{TOKENIZER}'
+    )
+    """)
+    conn.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS {index.name}_ai AFTER INSERT ON "{index.table}" BEGIN
+        INSERT INTO {index.name} (rowid, {names}) VALUES (new.rowid, {new_values});
+    END
+    """)
+    conn.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS {index.name}_ad AFTER DELETE ON "{index.table}" BEGIN
+        INSERT INTO {index.name} ({index.name}, rowid, {names}) VALUES ('delete', old.rowid, {old_values});
+    END
+    """)
+    conn.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS {index.name}_au AFTER UPDATE ON "{index.table}" BEGIN
+        INSERT INTO {index.name} ({index.name}, rowid, {names}) VALUES ('delete', old.rowid, {old_values});
+        INSERT INTO {index.name} (rowid, {names}) VALUES (new.rowid, {new_values});
+    END
+    """)
+    if created:
+        rebuild_search_index(conn, index)
+    return True
+
+
+def drop_search_index(conn, index):
+    """ Drop the FTS5 table; its triggers go away with the content table or are dropped here. """
+    index = SEARCH_INDEXES.get(index, index)
+    for suffix in ('ai', 'ad', 'au'):
+        conn.execute(f'DROP TRIGGER IF EXISTS {index.name}_{suffix}')
+    conn.execute(f'DROP TABLE IF EXISTS {index.name}')
+
+
+def rebuild_search_index(conn, index):
+    """ Re-index every row of the content table, e.g. after a VACUUM renumbered its rowids. """
+    index = SEARCH_INDEXES.get(index, index)
+    conn.execute(f"INSERT INTO {index.name} ({index.name}) VALUES ('rebuild')")
+
+
+def to_match_query(text):
+    """ Quote each whitespace-separated term so input like "log4j-core" or "c++" is matched literally. """
+    return ' '.join('"{}"'.format(term.replace('"', '""')) for term in _term.findall(text))
+
+
+def search(conn, index, query, limit=10, raw=False):
+    """ bm25-ranked matches for `query`, best first, as dicts of key, snippet and score (lower is better).
+
+    All terms must match. With `raw=True` the query is passed to FTS5 unchanged, allowing
+    its own syntax (OR, NOT, "phrases", prefix*, column filters).
+    """
+    index = SEARCH_INDEXES.get(index, index)
+    match = query if raw else to_match_query(query)
+    if not match:
+        return []
+    weights = ', '.join(str(weight) for weight in (0.0, *index.weights))
+    # Snippet from whichever indexed column matched best (-1)
+    rows = conn.execute(f"""
+    SELECT "{index.key}", snippet({index.name}, -1, '[', ']', '...', 16), bm25({index.name}, {weights}) AS score
+    FROM {index.name}
+    WHERE {index.name} MATCH ?
+    ORDER BY score
+    LIMIT ?
+    """, (match, limit))
+    return [{'key': key, 'snippet': snippet, 'score': score} for key, snippet, score in rows]
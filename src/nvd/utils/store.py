@@ -0,0 +1,204 @@
+import functools
+import json
+import os
+import re
+import sqlite3
+from datetime import datetime, timezone
+from pathlib import Path
+
+from nvd.utils.schema import CVE_FIELDS, JSON
+
+# Default location of the NVD SQLite store, independent of the working directory
+DATABASE_PATH = Path(os.getenv('NVD_DATABASE',
+                               Path(__file__).resolve().parent.parent.parent.parent / 'data/NVDb.db'))
+# Default location of the Tenable SQLite store, whose plugin/CVE correlation the NVD loaders refresh
+TENABLE_DATABASE_PATH = Path(os.getenv('TENABLE_DATABASE',
+                                       Path(__file__).resolve().parent.parent.parent.parent / 'data/Tenable.db'))
+
+CVE_TABLE = 'nvd_data'
+STATE_TABLE = 'nvd_sync_state'
+KEY_COLUMN = 'CVE_ID'
+LAST_MODIFIED_COLUMN = 'Last_Modified_Date'
+
+# Page cache and memory map used during bulk loads
+BULK_CACHE_MIB = int(os.getenv('NVD_BULK_CACHE_MIB', 256))
+BULK_MMAP_MIB = int(os.getenv('NVD_BULK_MMAP_MIB', 1024))
+# How long a connection waits for another writer's lock before failing
+BUSY_TIMEOUT_MS = int(os.getenv('DB_BUSY_TIMEOUT_MS', 30000))
+# Keys bound per IN (...) lookup; older SQLite builds allow at most 999 variables per statement
+KEYS_PER_QUERY = 500
+
+
+@functools.lru_cache(maxsize=None)
+def sanitize_column(name):
+    """ Same column naming as create_database_and_import.py, e.g. 'CVE ID' -> 'CVE_ID'. """
+    return re.sub(r'\W|^(?=\d)', '_', name)
+
+
+# Columns holding nested API structures, stored as JSON text
+JSON_COLUMNS = frozenset(sanitize_column(column) for column in CVE_FIELDS.columns_of_kind(JSON))
+
+
+def canonical_timestamp(value):
+    """ An ISO string or datetime in the API's text form, which every stored timestamp and watermark uses:
+    millisecond precision in UTC without an offset, e.g. '2024-05-01 03:00:00+02:00' -> '2024-05-01T01:00:00.000'.
+    """
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value.isoformat(timespec='milliseconds')
+
+
+def connect(path=DATABASE_PATH):
+    conn = sqlite3.connect(path)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    conn.execute(f'PRAGMA busy_timeout={BUSY_TIMEOUT_MS}')
+    conn.execute('PRAGMA foreign_keys=ON')
+    conn.execute(f"""
+    CREATE TABLE IF NOT EXISTS {STATE_TABLE} (
+        name TEXT PRIMARY KEY,
+        value TEXT,
+        updated_at TEXT
+    );
+    """)
+    return conn
+
+
+def tune_for_bulk_load(conn, cache_mib=BULK_CACHE_MIB, mmap_mib=BULK_MMAP_MIB):
+    """ Connection settings for large loads: a big page cache, in-memory temp storage and memory-mapped I/O. """
+    conn.execute(f'PRAGMA cache_size=-{cache_mib * 1024}')
+    conn.execute('PRAGMA temp_store=MEMORY')
+    conn.execute(f'PRAGMA mmap_size={mmap_mib * 1024 * 1024}')
+
+
+def table_exists(conn, table=CVE_TABLE):
+    row = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)).fetchone()
+    return row is not None
+
+
+def ensure_cve_table(conn, columns, table=CVE_TABLE, unique=True):
+    """ Create the CVE table, or add any columns it is missing, and make CVE_ID unique.
+
+    A bulk load passes `unique=False` and calls `create_key_index` once the rows are in,
+    so the index is built in one sorted pass instead of being maintained row by row.
+    """
+    columns = [sanitize_column(column) for column in columns]
+    existing = [row[1] for row in conn.execute(f'PRAGMA table_info("{table}")')]
+    if not existing:
+        column_sql = ', '.join(f'"{column}" TEXT' for column in columns)
+        conn.execute(f'CREATE TABLE "{table}" ({column_sql})')
+    else:
+        for column in columns:
+            if column not in existing:
+                conn.execute(f'ALTER TABLE "{table}" ADD COLUMN "{column}" TEXT')
+    if unique:
+        create_key_index(conn, table)
+    return columns
+
+
+def create_key_index(conn, table=CVE_TABLE):
+    try:
+        conn.execute(f'CREATE UNIQUE INDEX IF NOT EXISTS "ux_{table}_{KEY_COLUMN}" ON "{table}" ("{KEY_COLUMN}")')
+    except sqlite3.IntegrityError:
+        raise sqlite3.IntegrityError(
+            f"Table '{table}' already holds duplicate {KEY_COLUMN} values; "
+            f"reload it before switching the daily delta to upsert mode")
+
+
+def drop_duplicate_keys(conn, table=CVE_TABLE):
+    """ Keep one row per CVE_ID, the latest by Last_Modified_Date (then by load order); return rows removed. """
+    columns = [row[1] for row in conn.execute(f'PRAGMA table_info("{table}")')]
+    order = f'"{LAST_MODIFIED_COLUMN}" DESC, rowid DESC' if LAST_MODIFIED_COLUMN in columns else 'rowid DESC'
+    cursor = conn.execute(f"""
+    DELETE FROM "{table}" WHERE rowid IN (
+        SELECT rowid FROM (
+            SELECT rowid, ROW_NUMBER() OVER (PARTITION BY "{KEY_COLUMN}" ORDER BY {order}) AS position
+            FROM "{table}"
+        ) WHERE position > 1
+    )
+    """)
+    return cursor.rowcount
+
+
+def _db_rows(columns, rows):
+    """ Rows as bound: nested values (lists and dicts from the API) become JSON text.
+
+    Only the columns that carry nested structures are inspected; rows without any pass through as they are.
+    """
+    nested = [position for position, column in enumerate(columns) if column in JSON_COLUMNS]
+    if not nested:
+        return rows
+    return (_with_json(row, nested) for row in rows)
+
+
+def _with_json(row, nested):
+    row = list(row)
+    for position in nested:
+        if isinstance(row[position], (list, dict)):
+            row[position] = json.dumps(row[position])
+    return row
+
+
+def insert_rows(conn, columns, rows, table=CVE_TABLE):
+    """ Plain prepared insert for loading into a table that has no key index yet. """
+    columns = [sanitize_column(column) for column in columns]
+    column_sql = ', '.join(f'"{column}"' for column in columns)
+    placeholders = ', '.join('?' for _ in columns)
+    conn.executemany(f'INSERT INTO "{table}" ({column_sql}) VALUES ({placeholders})', _db_rows(columns, rows))
+
+
+def upsert_rows(conn, columns, rows, table=CVE_TABLE):
+    """ Insert or update rows keyed on CVE_ID within the caller's transaction.
+
+    An existing row is only replaced by a version with the same or a later
+    Last_Modified_Date, so replaying older data can never roll a CVE back. The dates
+    are compared as instants (julianday), not as text, so a row stored in another
+    text form still orders correctly.
+    """
+    columns = [sanitize_column(column) for column in columns]
+    column_sql = ', '.join(f'"{column}"' for column in columns)
+    placeholders = ', '.join('?' for _ in columns)
+    updates = ', '.join(f'"{column}" = excluded."{column}"' for column in columns if column != KEY_COLUMN)
+    sql = (f'INSERT INTO "{table}" ({column_sql}) VALUES ({placeholders}) '
+           f'ON CONFLICT("{KEY_COLUMN}") DO UPDATE SET {updates}')
+    if LAST_MODIFIED_COLUMN in columns:
+        stored = f'julianday("{table}"."{LAST_MODIFIED_COLUMN}")'
+        sql += f' WHERE julianday(excluded."{LAST_MODIFIED_COLUMN}") >= {stored} OR {stored} IS NULL'
+    conn.executemany(sql, _db_rows(columns, rows))
+
+
+def current_rows(conn, columns, rows, table=CVE_TABLE):
+    """ The subset of `rows` whose version is the one now stored, i.e. that won the upsert.
+
+    The stored versions are read with one IN (...) query per KEYS_PER_QUERY keys rather than a lookup per row.
+    """
+    columns = [sanitize_column(column) for column in columns]
+    key = columns.index(KEY_COLUMN)
+    position = columns.index(LAST_MODIFIED_COLUMN)
+    keys = list({row[key] for row in rows})
+    stored = {}
+    for start in range(0, len(keys), KEYS_PER_QUERY):
+        batch = keys[start:start + KEYS_PER_QUERY]
+        placeholders = ', '.join('?' for _ in batch)
+        stored.update(conn.execute(f'SELECT "{KEY_COLUMN}", "{LAST_MODIFIED_COLUMN}" FROM "{table}" '
+                                   f'WHERE "{KEY_COLUMN}" IN ({placeholders})', batch))
+    return [row for row in rows if stored.get(row[key]) == row[position]]
+
+
+def read_watermark(conn, name):
+    row = conn.execute(f'SELECT value FROM {STATE_TABLE} WHERE name = ?', (name,)).fetchone()
+    return row[0] if row else None
+
+
+def write_watermark(conn, name, value):
+    """ Advance a named timestamp watermark within the caller's transaction; it never moves backwards. """
+    conn.execute(f"""
+    INSERT INTO {STATE_TABLE} (name, value, updated_at) VALUES (?, ?, ?)
+    ON CONFLICT(name) DO UPDATE SET value = excluded.value, updated_at = excluded.updated_at
+    WHERE julianday(excluded.value) > julianday({STATE_TABLE}.value)
+       OR julianday({STATE_TABLE}.value) IS NULL
+    """, (name, canonical_timestamp(value), datetime.now(timezone.utc).isoformat()))
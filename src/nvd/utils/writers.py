@@ -0,0 +1,184 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Parquet output is optional; CSV keeps working without pyarrow
+    pa = None
+    pq = None
+
+from nvd.utils.schema import CVE_FIELDS, DATE, FLOAT, JSON, TIMESTAMP
+
+OUTPUT_FORMATS = ('csv', 'parquet')
+FILE_SUFFIXES = {'csv': '.csv', 'parquet': '.parquet'}
+
+# Placeholder older extracts used for absent fields; current extracts write real nulls
+MISSING = 'N/A'
+
+# Column types for the typed (Parquet) representation; everything else is a string
+FLOAT_COLUMNS = CVE_FIELDS.columns_of_kind(FLOAT)
+TIMESTAMP_COLUMNS = CVE_FIELDS.columns_of_kind(TIMESTAMP)
+DATE_COLUMNS = CVE_FIELDS.columns_of_kind(DATE)
+# Nested API structures, stored as JSON text rather than Python reprs
+JSON_COLUMNS = CVE_FIELDS.columns_of_kind(JSON)
+
+PARQUET_COMPRESSION = os.getenv('NVD_PARQUET_COMPRESSION', 'zstd')
+PARQUET_ROW_GROUP_SIZE = int(os.getenv('NVD_PARQUET_ROW_GROUP_SIZE', 100000))
+
+
+def arrow_type(column):
+    if column in FLOAT_COLUMNS:
+        return pa.float64()
+    if column in TIMESTAMP_COLUMNS:
+        return pa.timestamp('ms')
+    if column in DATE_COLUMNS:
+        return pa.date32()
+    return pa.string()
+
+
+def arrow_schema(columns):
+    """ Fixed Arrow schema for a list of extractor column names. """
+    return pa.schema([pa.field(column, arrow_type(column)) for column in columns])
+
+
+def json_text(value):
+    return value if value is None or isinstance(value, str) else json.dumps(value)
+
+
+def timestamp_text(values):
+    """ Timestamps (text or typed, naive ones being UTC) in the stored text form; NaN where they do not parse. """
+    timestamps = pd.to_datetime(values, errors='coerce', utc=True, format='ISO8601')
+    # numpy formats datetime64[ms] as '2024-05-01T01:00:00.000' far faster than strftime
+    text = np.datetime_as_string(timestamps.dt.tz_localize(None).to_numpy().astype('datetime64[ms]'))
+    return pd.Series(text, index=values.index).where(timestamps.notna())
+
+
+def date_text(values):
+    """ Dates (text or typed) in the stored text form, e.g. '2024-05-01'; NaN where they do not parse. """
+    dates = pd.to_datetime(values, errors='coerce', format='ISO8601')
+    text = np.datetime_as_string(dates.to_numpy().astype('datetime64[D]'))
+    return pd.Series(text, index=values.index).where(dates.notna())
+
+
+def typed_frame(frame):
+    """ Convert an extractor DataFrame (strings, nulls or legacy 'N/A', nested objects) to typed columns. """
+    frame = frame.copy()
+    for column in frame.columns:
+        values = frame[column]
+        if values.dtype == object:
+            values = values.where(values != MISSING, None)
+        if column in FLOAT_COLUMNS:
+            frame[column] = pd.to_numeric(values, errors='coerce')
+        elif column in TIMESTAMP_COLUMNS:
+            frame[column] = pd.to_datetime(values, errors='coerce')
+        elif column in DATE_COLUMNS:
+            dates = pd.to_datetime(values, errors='coerce')
+            frame[column] = dates.dt.date.where(dates.notna(), None)
+        elif column in JSON_COLUMNS:
+            frame[column] = values.map(json_text)
+        else:
+            frame[column] = values.astype(object).where(values.notna(), None)
+    return frame
+
+
+class CsvRecordWriter:
+    """ Append DataFrames to a CSV file, writing the header only if the file is new.
+
+    Rows appended to an existing file follow that file's header: columns it lacks are
+    dropped (and reported once) and columns it has that the frame lacks are left empty.
+    """
+
+    def __init__(self, path, append=True):
+        self.path = path
+        self._mode = 'a' if append else 'w'
+        self._header = not (append and os.path.exists(path))
+        self._columns = None if self._header else list(pd.read_csv(path, nrows=0).columns)
+        self._reported = False
+
+    def write(self, frame):
+        if self._columns is not None and list(frame.columns) != self._columns:
+            dropped = [column for column in frame.columns if column not in self._columns]
+            if dropped and not self._reported:
+                print(f"{self.path} predates {len(dropped)} columns ({', '.join(dropped[:3])}, ...), "
+                      f"which are not appended; start a new file to keep them")
+                self._reported = True
+            frame = frame.reindex(columns=self._columns)
+        nested = [column for column in frame.columns if column in JSON_COLUMNS]
+        if nested:
+            frame = frame.assign(**{column: frame[column].map(json_text) for column in nested})
+        frame.to_csv(self.path, mode=self._mode, header=self._header, index=False)
+        self._mode = 'a'
+        self._header = False
+
+    def close(self):
+        pass
+
+
+class ParquetRecordWriter:
+    """ Stream DataFrames into one compressed Parquet file with a fixed schema.
+
+    Frames are buffered until `row_group_size` rows are available and then
+    written as a single row group, so readers get large, well-compressed
+    column chunks regardless of how small the incoming batches are.
+    """
+
+    def __init__(self, path, row_group_size=PARQUET_ROW_GROUP_SIZE, compression=PARQUET_COMPRESSION):
+        if pq is None:
+            raise ImportError("Parquet output requires pyarrow; install it or use the CSV writer")
+        self.path = path
+        self.row_group_size = row_group_size
+        self.compression = compression
+        self.schema = None
+        self._writer = None
+        self._pending = []
+        self._pending_rows = 0
+
+    def write(self, frame):
+        if self.schema is None:
+            self.schema = arrow_schema(frame.columns)
+            self._writer = pq.ParquetWriter(self.path, self.schema, compression=self.compression)
+        self._pending.append(pa.Table.from_pandas(typed_frame(frame), schema=self.schema, preserve_index=False))
+        self._pending_rows += len(frame)
+        if self._pending_rows >= self.row_group_size:
+            self._flush()
+
+    def _flush(self):
+        if self._pending:
+            table = pa.concat_tables(self._pending)
+            self._writer.write_table(table, row_group_size=self.row_group_size)
+            self._pending = []
+            self._pending_rows = 0
+
+    def close(self):
+        if self._writer is not None:
+            self._flush()
+            self._writer.close()
+
+
+def open_writer(output_format, path, append=True):
+    if output_format == 'parquet':
+        return ParquetRecordWriter(path)
+    return CsvRecordWriter(path, append=append)
+
+
+def read_frame(path, columns=None):
+    """ Read a CSV or Parquet file written by the NVD extractors, optionally only some columns. """
+    if str(path).endswith(FILE_SUFFIXES['parquet']) or os.path.isdir(path):
+        return pd.read_parquet(path, columns=columns)
+    return pd.read_csv(path, dtype=str, keep_default_na=False, usecols=columns)
+
+
+def iter_frames(path, columns=None, chunk_size=50000, **csv_options):
+    """ Read a CSV or Parquet extract as a stream of DataFrames of at most `chunk_size` rows. """
+    if str(path).endswith(FILE_SUFFIXES['parquet']) or os.path.isdir(path):
+        if pa is None:
+            raise ImportError("Reading Parquet requires pyarrow")
+        import pyarrow.dataset as ds
+        for batch in ds.dataset(path, format='parquet').to_batches(columns=columns, batch_size=chunk_size):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(path, dtype=str, usecols=columns, chunksize=chunk_size, **csv_options)
@@ -0,0 +1,181 @@
+""" Refresh the Tenable plugins, the NVD CVEs and their correlation as one dependency graph.
+
+    tenable_fetch -> tenable_parse -> tenable_merge -> tenable_load --+
+    nvd_fetch ------------------------------------------> nvd_load ---+--> correlation
+    kev_fetch ------------------------------------------> kev_load ---+
+
+The Tenable, NVD and KEV branches run concurrently. Stages whose inputs are unchanged
+are skipped: tenable_parse when no feed file changed, the stages after it when it was
+skipped, nvd_load when the delta was empty, kev_load when the catalog copy is unchanged,
+and correlation when no load changed anything. nvd_fetch streams the CVEs modified since the watermark in the NVD database
+to a writer process that writes them to a delta file; nvd_load upserts that file, then
+advances the watermark and deletes the file, so a failed load is fetched again on the next run.
+
+Usage: python src/run_pipeline.py [--stage tenable_load] [--force] [--output-format parquet]
+"""
+import argparse
+import asyncio
+import os
+import sys
+from datetime import datetime, timezone
+from functools import partial
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent))  # Make src/ importable
+from nvd.extract import multiprocess_daily_delta as delta
+from nvd.extract.extract_kev import CATALOG_FILE as KEV_CATALOG_FILE, fetch_catalog
+from nvd.load.create_database_and_import import load as load_cves
+from nvd.load.load_kev import load as load_kev_catalog
+from nvd.utils import metrics, store
+from nvd.utils.correlation import format_refresh, refresh
+from nvd.utils.dag import FAILED, Dag, Stage, file_fingerprint, format_outcomes
+from nvd.utils.db_writer import DatabaseWriter
+from nvd.utils.writers import FILE_SUFFIXES, OUTPUT_FORMATS
+from tenable.extract.extract_tenable_data import OUTPUT_DIR as TENABLE_XML_DIR, fetch_feeds
+from tenable.load.load_master_data import create_tables, format_counts, load_records
+from tenable.pipeline import iter_feed_records
+from tenable.transform.transform.create_master_tenable_plugins_dataframe import merge_records, sorted_records
+from tenable.transform.transform.parse_xml_and_save_individual_csvs import MAX_WORKERS
+
+DATA_DIR = Path(__file__).resolve().parent.parent / 'data'
+# Fingerprints and outcomes of the previous run, used to skip unchanged stages
+STATE_FILE = Path(os.getenv('PIPELINE_STATE_FILE', DATA_DIR / 'pipeline_state.json'))
+DELTA_DIR = DATA_DIR / 'nvd_data/deltas'
+
+
+async def fetch_tenable(results):
+    report = await fetch_feeds(output_dir=TENABLE_XML_DIR)
+    if report['failed']:
+        print(f"Failed feeds, kept from the previous run: {', '.join(report['failed'])}")
+    print(f"Changed feeds: {', '.join(report['changed']) or 'none'}")
+    return report['changed']
+
+
+def parse_tenable(results, workers=MAX_WORKERS):
+    xml_files = sorted(str(path) for path in TENABLE_XML_DIR.glob('*.xml'))
+    with metrics.stage('tenable_parse') as stage:
+        rows = list(iter_feed_records(xml_files, workers))
+        stage.add(len(rows))
+    print(f"Parsed {len(rows)} items from {len(xml_files)} feeds")
+    return rows
+
+
+def merge_tenable(results):
+    with metrics.stage('tenable_merge') as stage:
+        records = sorted_records(merge_records(results['tenable_parse']))
+        stage.add(len(records))
+    print(f"Merged into {len(records)} plugins")
+    return records
+
+
+def load_tenable(results, database=store.TENABLE_DATABASE_PATH):
+    """ Load the merged plugins; returns how many were inserted or updated. """
+    records = results['tenable_merge']
+    Path(database).parent.mkdir(parents=True, exist_ok=True)
+    with metrics.stage('tenable_load') as stage, DatabaseWriter(database, setup=create_tables) as writer:
+        writer.call(load_records, records)
+        stage.add(len(records))
+    counts = writer.results[0]
+    print(f"Loaded {len(records)} plugins into {database} ({format_counts(counts)})")
+    return counts['inserted'] + counts['updated']
+
+
+async def fetch_nvd(results, database=store.DATABASE_PATH, output_format='csv'):
+    """ Write the CVEs modified since the database's watermark to a new delta file; None when there were none. """
+    if not delta.NVD_API_KEY:
+        raise RuntimeError("NVD_API_KEY is not set; add it to the .env file")
+    Path(database).parent.mkdir(parents=True, exist_ok=True)
+    conn = store.connect(database)
+    last_modified = store.read_watermark(conn, delta.WATERMARK_NAME)
+    conn.close()
+    DELTA_DIR.mkdir(parents=True, exist_ok=True)
+    output_file = DELTA_DIR / f"delta-{datetime.now(timezone.utc):%Y%m%dT%H%M%S}{FILE_SUFFIXES[output_format]}"
+    await delta.run_delta(last_modified, delta.save_data, output_file, output_format)
+    if not output_file.exists():
+        return None
+    latest = delta.latest_last_modified(output_file)
+    if last_modified and latest and delta.parse_timestamp(latest) <= delta.parse_timestamp(last_modified):
+        # The window starts at the watermark, so the CVEs modified at that instant always come back
+        output_file.unlink()
+        return None
+    return output_file
+
+
+def load_nvd(results, database=store.DATABASE_PATH):
+    """ Upsert the delta file and advance the watermark to its latest lastModified; returns the rows loaded.
+
+    The rows and the watermark go through the loader's one database writer, the watermark
+    only once every chunk is in. The loaded delta file, and any left by an earlier run whose
+    load failed (its CVEs were fetched again, since the watermark did not move), are then deleted.
+    """
+    delta_file = results['nvd_fetch']
+    result = load_cves(delta_file, database, tenable_database=None, watermark=delta.WATERMARK_NAME)
+    conn = store.connect(database)
+    print(f"Watermark now {store.read_watermark(conn, delta.WATERMARK_NAME)}")
+    conn.close()
+    for path in {delta_file, *DELTA_DIR.glob('delta-*')}:
+        path.unlink(missing_ok=True)
+    return result['rows']
+
+
+async def fetch_kev(results):
+    return await fetch_catalog()
+
+
+def load_kev(results, database=store.DATABASE_PATH):
+    """ Apply the catalog copy to the kev table; returns how many entries were written or removed. """
+    counts = load_kev_catalog(KEV_CATALOG_FILE, database, tenable_database=None)
+    return counts['inserted'] + counts['updated'] + counts['removed']
+
+
+def correlate(results, tenable_database=store.TENABLE_DATABASE_PATH, nvd_database=store.DATABASE_PATH):
+    result = refresh(tenable_database, nvd_database)
+    print(format_refresh(result))
+    return result
+
+
+def build_dag(database=store.DATABASE_PATH, tenable_database=store.TENABLE_DATABASE_PATH, output_format='csv',
+              workers=MAX_WORKERS, state_file=STATE_FILE):
+    return Dag([
+        Stage('tenable_fetch', fetch_tenable),
+        Stage('tenable_parse', partial(parse_tenable, workers=workers), after=['tenable_fetch'],
+              fingerprint=partial(file_fingerprint, TENABLE_XML_DIR, pattern='*.xml')),
+        Stage('tenable_merge', merge_tenable, after=['tenable_parse']),
+        Stage('tenable_load', partial(load_tenable, database=tenable_database), after=['tenable_merge']),
+        Stage('nvd_fetch', partial(fetch_nvd, database=database, output_format=output_format)),
+        Stage('nvd_load', partial(load_nvd, database=database), after=['nvd_fetch']),
+        Stage('kev_fetch', fetch_kev),
+        Stage('kev_load', partial(load_kev, database=database), after=['kev_fetch'],
+              fingerprint=partial(file_fingerprint, KEV_CATALOG_FILE)),
+        Stage('correlation', partial(correlate, tenable_database=tenable_database, nvd_database=database),
+              after=['tenable_load', 'nvd_load', 'kev_load']),
+    ], state_file)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--stage', action='append', default=None,
+                        help="Only run this stage and the stages it depends on (repeatable)")
+    parser.add_argument('--force', action='store_true', help="Run every stage even if its inputs are unchanged")
+    parser.add_argument('--output-format', choices=OUTPUT_FORMATS, default='csv',
+                        help="Format of the NVD delta files written by nvd_fetch")
+    parser.add_argument('--database', type=Path, default=store.DATABASE_PATH, help="NVD SQLite database")
+    parser.add_argument('--tenable-database', type=Path, default=store.TENABLE_DATABASE_PATH,
+                        help="Tenable SQLite database, which also holds the correlation table")
+    parser.add_argument('--workers', type=int, default=MAX_WORKERS, help="Number of feed parser processes")
+    args = parser.parse_args()
+
+    dag = build_dag(args.database, args.tenable_database, args.output_format, args.workers)
+    if args.stage:
+        dag = dag.select(args.stage)
+    outcomes = asyncio.run(dag.run(force=args.force))
+    for name, outcome in outcomes.items():
+        metrics.count('pipeline_stage_runs_total', stage=name, status=outcome.status)
+    print(format_outcomes(outcomes))
+    if any(outcome.status == FAILED for outcome in outcomes.values()):
+        exit(1)
+
+
+if __name__ == '__main__':
+    with metrics.run('pipeline'):
+        main()
@@ -1,5 +1,18 @@
-import requests
+import argparse
+import asyncio
+import hashlib
+import json
 import os
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import aiohttp
+
+sys.path.append(str(Path(__file__).resolve().parent.parent.parent))  # Make src/ importable
+from nvd.utils import metrics
+from nvd.utils.files import load_cache, save_cache, write_atomic
 
 # List of URLs with their corresponding file names
 urls = {
@@ -15,17 +28,139 @@ urls = {
     "updated_log_correlation_engine_plugins": "https://www.tenable.com/plugins/feeds?sort=updated&type=lce"
 }
 
-# Directory to save the XML files
-output_dir = "../tenable_data/xml_files"
-os.makedirs(output_dir, exist_ok=True)
-
-# Loop through each URL and save the XML data to a file
-for name, url in urls.items():
-    response = requests.get(url)
-    if response.status_code == 200:
-        file_path = os.path.join(output_dir, f"{name}.xml")
-        with open(file_path, "wb") as file:
-            file.write(response.content)
-        print(f"Saved XML data to {file_path}")
+# Directory to save the XML files, the validator cache and the change report
+TENABLE_DATA_DIR = Path(__file__).resolve().parent.parent.parent.parent / 'data/tenable_data'
+OUTPUT_DIR = TENABLE_DATA_DIR / 'xml_files'
+CACHE_FILE = TENABLE_DATA_DIR / 'feed_cache.json'
+CHANGES_FILE = TENABLE_DATA_DIR / 'changed_feeds.json'
+
+# Feeds share one host, so a small pool of kept-alive connections is enough
+MAX_CONCURRENCY = int(os.getenv('TENABLE_MAX_CONCURRENCY', 4))
+MAX_RETRIES = int(os.getenv('TENABLE_MAX_RETRIES', 3))
+RETRY_BACKOFF = float(os.getenv('TENABLE_RETRY_BACKOFF', 2))
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+
+# Endpoint label of the feeds in the run metrics
+ENDPOINT = 'tenable_feed'
+
+
+def group_by_url(feeds):
+    """ Map each distinct URL to the feed names that point at it, so it is downloaded once. """
+    names_by_url = {}
+    for name, url in feeds.items():
+        names_by_url.setdefault(url, []).append(name)
+    return names_by_url
+
+
+async def fetch_feed(session, semaphore, url, names, cache, output_dir):
+    """ Conditionally download one feed URL and return (changed, entry).
+
+    A 304, or a 200 whose body hashes the same as last time, is reported as unchanged
+    and leaves the files on disk untouched. Validators are only sent while every file
+    of the URL still exists, otherwise the feed is downloaded in full.
+    """
+    entry = cache.get(url, {})
+    paths = [os.path.join(output_dir, f"{name}.xml") for name in names]
+    headers = {}
+    if all(os.path.exists(path) for path in paths):
+        if entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+
+    for attempt in range(MAX_RETRIES + 1):
+        try:
+            async with semaphore:
+                start = time.perf_counter()
+                async with session.get(url, headers=headers) as response:
+                    metrics.observe('http_request_duration_seconds', time.perf_counter() - start,
+                                    endpoint=ENDPOINT, status=response.status)
+                    if response.status == 304:
+                        print(f"Not modified: {url}")
+                        return False, entry
+                    response.raise_for_status()
+                    content = await response.read()
+                    etag = response.headers.get('ETag')
+                    last_modified = response.headers.get('Last-Modified')
+            break
+        except (aiohttp.ClientResponseError, aiohttp.ClientConnectionError, aiohttp.ClientPayloadError,
+                asyncio.TimeoutError) as e:
+            status = getattr(e, 'status', None)
+            if attempt == MAX_RETRIES or (status is not None and status not in RETRYABLE_STATUSES):
+                raise
+            metrics.count('http_retries_total', endpoint=ENDPOINT, reason=status or type(e).__name__)
+            delay = RETRY_BACKOFF * 2 ** attempt
+            print(f"Feed {url} failed ({status or e}), retrying in {delay:.0f}s")
+            await asyncio.sleep(delay)
+
+    digest = hashlib.sha256(content).hexdigest()
+    changed = digest != entry.get('sha256') or not all(os.path.exists(path) for path in paths)
+    if changed:
+        for path in paths:
+            write_atomic(path, content)
+            print(f"Saved XML data to {path}")
     else:
-        print(f"Failed to fetch data from {url}")
\ No newline at end of file
+        print(f"Unchanged content: {url}")
+    return changed, {
+        'etag': etag,
+        'last_modified': last_modified,
+        'sha256': digest,
+        'fetched_at': datetime.now(timezone.utc).isoformat(),
+    }
+
+
+async def fetch_feeds(feeds=None, output_dir=OUTPUT_DIR, cache_path=CACHE_FILE, changes_path=CHANGES_FILE):
+    """ Download every distinct feed URL concurrently over one pooled session.
+
+    Returns a report {'changed': [...], 'unchanged': [...], 'failed': [...]} of feed
+    names, also written to `changes_path`, so later stages can skip unchanged feeds.
+    """
+    feeds = feeds or urls
+    os.makedirs(output_dir, exist_ok=True)
+    # ETag/Last-Modified validators and content hash of each feed URL from the previous run
+    cache = load_cache(cache_path)
+    names_by_url = group_by_url(feeds)
+
+    semaphore = asyncio.Semaphore(MAX_CONCURRENCY)
+    connector = aiohttp.TCPConnector(limit=MAX_CONCURRENCY)
+    with metrics.stage('tenable_fetch') as stage:
+        async with aiohttp.ClientSession(connector=connector) as session:
+            results = await asyncio.gather(*(
+                fetch_feed(session, semaphore, url, names, cache, output_dir) for url, names in names_by_url.items()
+            ), return_exceptions=True)
+        stage.add(len(names_by_url))
+
+    report = {'changed': [], 'unchanged': [], 'failed': []}
+    for (url, names), result in zip(names_by_url.items(), results):
+        if isinstance(result, BaseException):
+            print(f"Failed to fetch data from {url}: {result}")
+            report['failed'].extend(names)
+            continue
+        changed, entry = result
+        cache[url] = entry
+        report['changed' if changed else 'unchanged'].extend(names)
+
+    save_cache(cache, cache_path)
+    report['checked_at'] = datetime.now(timezone.utc).isoformat()
+    write_atomic(changes_path, json.dumps(report, indent=2))
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Download the Tenable plugin RSS feeds, skipping unchanged ones.")
+    parser.add_argument('--output-dir', type=Path, default=OUTPUT_DIR, help="Directory to save the XML files")
+    parser.add_argument('--force', action='store_true', help="Ignore the validator cache and download every feed")
+    args = parser.parse_args()
+
+    if args.force and CACHE_FILE.exists():
+        CACHE_FILE.unlink()
+    report = asyncio.run(fetch_feeds(output_dir=args.output_dir))
+    print(f"Changed feeds: {', '.join(report['changed']) or 'none'}")
+    if report['failed']:
+        print(f"Failed feeds: {', '.join(report['failed'])}")
+        exit(1)
+
+
+if __name__ == "__main__":
+    with metrics.run('tenable_fetch'):
+        main()
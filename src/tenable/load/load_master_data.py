@@ -1,52 +1,162 @@
-import pandas as pd
-import sqlite3
-from pathlib2 import Path
+import csv
+import hashlib
+import re
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent.parent))  # Make src/ importable
+from nvd.utils import metrics, store
+from nvd.utils.correlation import format_refresh, refresh, track_plugin_changes
+from nvd.utils.db_writer import DatabaseWriter
+from nvd.utils.search import create_search_index
+from tenable.schema import FIELDNAMES
 
 # Database path
-db_path = Path("../Tenable.db")
-db_path.parent.mkdir(parents=True, exist_ok=True)
+TENABLE_DATA_DIR = Path(__file__).resolve().parent.parent.parent.parent / 'data/tenable_data'
+db_path = store.TENABLE_DATABASE_PATH
 
 # CSV file path
-csv_file_path = Path("../tenable_data/master/master.csv")
-csv_file_path.parent.mkdir(parents=True, exist_ok=True)
-
-# Create and connect to SQLite database
-conn = sqlite3.connect(db_path)
-cursor = conn.cursor()
+csv_file_path = TENABLE_DATA_DIR / 'master/master.csv'
 
-# Define the table creation SQL
+# The plugin table: one TEXT column per parsed record field, keyed on PluginId
 table_name = "TenablePluginData"
+COLUMNS = FIELDNAMES
 create_table_sql = f"""
 CREATE TABLE IF NOT EXISTS {table_name} (
     PluginId TEXT PRIMARY KEY,
-    SourceFile TEXT,
-    Title TEXT,
-    Link TEXT,
-    PublicationDate TEXT,
-    Product TEXT,
-    Severity TEXT,
-    Synopsis TEXT,
-    Description TEXT,
-    Solution TEXT,
-    CVEID TEXT
+    {', '.join(f'{column} TEXT' for column in COLUMNS if column != 'PluginId')},
+    ContentHash TEXT
 );
 """
 
-# Create the table
-cursor.execute(create_table_sql)
+# SHA-256 of a plugin's normalized column values, used to skip rows that have not changed
+HASH_COLUMN = 'ContentHash'
+
+# Every CVE referenced by a plugin; the primary key serves "CVEs covered by plugin Y"
+# and the reverse index "plugins covering CVE X", both as index seeks
+PLUGIN_CVE_TABLE = "plugin_cve"
+create_plugin_cve_sql = [
+    f"""
+    CREATE TABLE IF NOT EXISTS {PLUGIN_CVE_TABLE} (
+        plugin_id TEXT NOT NULL,
+        cve_id TEXT NOT NULL,
+        PRIMARY KEY (plugin_id, cve_id)
+    ) WITHOUT ROWID;
+    """,
+    f"CREATE INDEX IF NOT EXISTS ix_{PLUGIN_CVE_TABLE}_cve ON {PLUGIN_CVE_TABLE} (cve_id, plugin_id)",
+]
+
+_cve_pattern = re.compile(r'cve-\d{4}-\d{4,7}', re.IGNORECASE)
+
+
+def create_tables(conn):
+    """ Create the plugin table, adding columns older databases lack, with its plugin_cve join table,
+    search index and change tracking for the correlation table. """
+    conn.execute(create_table_sql)
+    existing = [row[1] for row in conn.execute(f'PRAGMA table_info("{table_name}")')]
+    if HASH_COLUMN not in existing:
+        conn.execute(f'ALTER TABLE {table_name} ADD COLUMN {HASH_COLUMN} TEXT')
+    create_plugin_cve_table(conn)
+    create_search_index(conn, 'plugin')
+    track_plugin_changes(conn)
+
+
+def create_plugin_cve_table(conn, plugin_table=table_name, cve_column='CVEID'):
+    """ Create plugin_cve and, the first time, fill it from the CVE column of an already loaded plugin table. """
+    exists = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?",
+                          (PLUGIN_CVE_TABLE,)).fetchone()
+    for statement in create_plugin_cve_sql:
+        conn.execute(statement)
+    if not exists:
+        with conn:
+            rows = conn.execute(f"SELECT PluginId, {cve_column} FROM {plugin_table} WHERE {cve_column} <> ''")
+            replace_plugin_cves(conn, {plugin_id: plugin_cve_rows(plugin_id, cves) for plugin_id, cves in rows})
+
+
+def plugin_cve_rows(plugin_id, cves):
+    """ (plugin_id, CVE-YYYY-NNNN) pairs for every distinct CVE in a CVE column or any text.
+
+    CVE ids are upper-cased to match nvd_data.CVE_ID, although the parsers lower-case the feed text.
+    """
+    if not plugin_id or not cves:
+        return []
+    return [(plugin_id, cve.upper()) for cve in dict.fromkeys(match.lower() for match in _cve_pattern.findall(cves))]
+
+
+def replace_plugin_cves(conn, rows_by_plugin):
+    """ Replace the plugin_cve rows of each plugin (plugin_id -> pairs) within the caller's transaction. """
+    conn.executemany(f"DELETE FROM {PLUGIN_CVE_TABLE} WHERE plugin_id = ?",
+                     ((plugin_id,) for plugin_id in rows_by_plugin))
+    conn.executemany(f"INSERT OR IGNORE INTO {PLUGIN_CVE_TABLE} (plugin_id, cve_id) VALUES (?, ?)",
+                     (pair for pairs in rows_by_plugin.values() for pair in pairs))
+
+
+def normalized_values(record):
+    """ Column values in COLUMNS order, with empty strings stored as NULL. """
+    return [record.get(column) or None for column in COLUMNS]
+
+
+def content_hash(values):
+    return hashlib.sha256('\x1f'.join(value or '' for value in values).encode('utf-8')).hexdigest()
+
+
+def load_records(conn, records):
+    """ Write only new or changed plugin records (dicts keyed by COLUMNS) within the caller's transaction.
+
+    Each record's normalized values are hashed and compared with the stored ContentHash;
+    unchanged plugins are not touched at all. Returns {'inserted', 'updated', 'unchanged'} counts.
+    """
+    stored = dict(conn.execute(f'SELECT PluginId, {HASH_COLUMN} FROM {table_name}'))
+    counts = {'inserted': 0, 'updated': 0, 'unchanged': 0}
+    changed = []
+    for record in records:
+        values = normalized_values(record)
+        if not values[0]:
+            continue
+        digest = content_hash(values)
+        if values[0] not in stored:
+            counts['inserted'] += 1
+        elif stored[values[0]] != digest:
+            counts['updated'] += 1
+        else:
+            counts['unchanged'] += 1
+            continue
+        stored[values[0]] = digest
+        changed.append(values + [digest])
+
+    columns = COLUMNS + [HASH_COLUMN]
+    placeholders = ', '.join('?' for _ in columns)
+    updates = ', '.join(f'{column} = excluded.{column}' for column in columns if column != 'PluginId')
+    conn.executemany(
+        f"INSERT INTO {table_name} ({', '.join(columns)}) VALUES ({placeholders}) "
+        f"ON CONFLICT(PluginId) DO UPDATE SET {updates}", changed)
+    cve_position = COLUMNS.index('CVEID')
+    replace_plugin_cves(conn, {row[0]: plugin_cve_rows(row[0], row[cve_position]) for row in changed})
+    return counts
+
+
+def format_counts(counts):
+    return ', '.join(f"{count} {name}" for name, count in counts.items())
+
 
-# Check if the CSV file exists
-if not csv_file_path.exists():
-    raise FileNotFoundError(f"CSV file not found: {csv_file_path}")
+def main():
+    # Check if the CSV file exists
+    if not csv_file_path.exists():
+        raise FileNotFoundError(f"CSV file not found: {csv_file_path}")
 
-# Load data from CSV
-df = pd.read_csv(csv_file_path)
+    # Load data from CSV and insert it into the database through the shared writer
+    db_path.parent.mkdir(parents=True, exist_ok=True)
+    with metrics.stage('tenable_load') as stage, open(csv_file_path, 'r', encoding='utf-8') as file, \
+            DatabaseWriter(db_path, setup=create_tables) as writer:
+        records = list(csv.DictReader(file))
+        writer.call(load_records, records)
+        stage.add(len(records))
+    counts = writer.results[0]
 
-# Insert the data into the database
-df.to_sql(table_name, conn, if_exists='append', index=False)
+    print(f"Data from CSV loaded into the database: {format_counts(counts)}.")
+    print(format_refresh(refresh(db_path, store.DATABASE_PATH)))
 
-# Commit changes and close the connection
-conn.commit()
-conn.close()
 
-print("Data from CSV inserted into the database.")
\ No newline at end of file
+if __name__ == '__main__':
+    with metrics.run('tenable_load'):
+        main()
@@ -2,17 +2,18 @@ import xml.etree.ElementTree as ET
 import re
 import os
 from bs4 import BeautifulSoup
-from datetime import datetime
-import pandas as pd
-import sqlite3
+import sys
+from pathlib import Path
 
-# Directory paths
-input_dir = "../tenable_data/xml_files"
-db_path = "/Users/brandynlacourse/conmon/db/NVD.db"
+sys.path.append(str(Path(__file__).resolve().parent.parent.parent))  # Make src/ importable
+from nvd.utils.db_writer import DatabaseWriter
+from nvd.utils.store import TENABLE_DATABASE_PATH
+from tenable.load.load_master_data import (TENABLE_DATA_DIR, create_plugin_cve_table, plugin_cve_rows,
+                                           replace_plugin_cves)
 
-# Create and connect to SQLite database
-conn = sqlite3.connect(db_path)
-cursor = conn.cursor()
+# Directory paths; the plugins join the Tenable database, whose plugin_cve table the correlation refresh reads
+input_dir = TENABLE_DATA_DIR / 'xml_files'
+db_path = TENABLE_DATABASE_PATH
 
 
 def sanitize_table_name(name):
@@ -20,16 +21,13 @@ def sanitize_table_name(name):
     return re.sub(r'[^a-zA-Z0-9]', '', name).upper()
 
 
-def parse_xml_to_db(xml_file, cursor):
-    """ Parse XML file and insert data into the SQLite database. """
-    tree = ET.parse(xml_file)
-    root = tree.getroot()
+# Table name is now constant
+table_name = "MasterTenablePlugins"
 
-    # Table name is now constant
-    table_name = "MasterTenablePlugins"
 
-    # Create table if it doesn't exist
-    cursor.execute(f"""
+def create_tables(conn):
+    """ Create the plugin table and its plugin_cve join table if they don't exist. """
+    conn.execute(f"""
     CREATE TABLE IF NOT EXISTS {table_name} (
         "index" INTEGER,
         pluginId TEXT PRIMARY KEY,
@@ -45,9 +43,28 @@ def parse_xml_to_db(xml_file, cursor):
         cve TEXT
     );
     """)
+    create_plugin_cve_table(conn, plugin_table=table_name, cve_column='cve')
+
+
+def insert_plugins(conn, rows, cve_rows_by_plugin):
+    """ Write one feed's plugins and their plugin_cve rows; runs on the writer connection. """
+    conn.executemany(
+        f"INSERT OR REPLACE INTO {table_name} (\"index\", pluginId, sourceFile, title, link, publicationDate, "
+        f"product, severity, synopsis, description, solution, cve) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        rows)
+    replace_plugin_cves(conn, cve_rows_by_plugin)
+    return len(rows)
+
 
-    # Insert data into table
+def parse_xml_to_db(xml_file, writer):
+    """ Parse XML file and queue its data for the database writer. """
+    tree = ET.parse(xml_file)
+    root = tree.getroot()
+
+    # Collect the feed's rows and hand them to the writer as one batch
     index = 0
+    rows = []
+    cve_rows_by_plugin = {}
     for item in root.findall('.//item'):
         plugin_id_text = item.find('description').text.strip().lower() if item.find(
             'description') is not None else ''
@@ -55,7 +72,8 @@ def parse_xml_to_db(xml_file, cursor):
         plugin_id = plugin_id_match.group(1).lower() if plugin_id_match else None
 
         if plugin_id:
-            data = [
+            cve_rows = plugin_cve_rows(plugin_id, plugin_id_text)
+            rows.append((
                 index,
                 plugin_id,
                 os.path.basename(xml_file),
@@ -67,21 +85,23 @@ def parse_xml_to_db(xml_file, cursor):
                 '',  # Placeholder for synopsis
                 BeautifulSoup(item.findtext('description', ''), 'html.parser').get_text(strip=True).lower(),
                 '',  # Placeholder for solution
-                ''  # Placeholder for CVE
-            ]
-
-            cursor.execute(
-                f"INSERT INTO {table_name} (\"index\", pluginId, sourceFile, title, link, publicationDate, product, severity, synopsis, description, solution, cve) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
-                tuple(data))
+                ', '.join(cve for _, cve in cve_rows)
+            ))
+            cve_rows_by_plugin[plugin_id] = cve_rows
             index += 1
+    writer.call(insert_plugins, rows, cve_rows_by_plugin)
+
 
+def main():
+    # Parse XML files while the writer process inserts the previous ones
+    db_path.parent.mkdir(parents=True, exist_ok=True)
+    with DatabaseWriter(db_path, setup=create_tables) as writer:
+        for xml_filename in os.listdir(input_dir):
+            if xml_filename.endswith('.xml'):
+                xml_file_path = os.path.join(input_dir, xml_filename)
+                parse_xml_to_db(xml_file_path, writer)
+    print(f"Data inserted into the database: {sum(writer.results)} plugins.")
 
-# Parse XML files and insert data into database
-for xml_filename in os.listdir(input_dir):
-    if xml_filename.endswith('.xml'):
-        xml_file_path = os.path.join(input_dir, xml_filename)
-        parse_xml_to_db(xml_file_path, cursor)
 
-conn.commit()
-conn.close()
-print("Data inserted into the database.")
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,186 @@
+""" Fetch, parse, merge and load the Tenable plugin feeds in one pass.
+
+Parsed items go straight from the feed parsers into the PluginId merge and
+then into the database; nothing is written to or re-read from CSV in between.
+The per-feed CSVs and master.csv of the step-by-step scripts are available
+as optional debug output.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))  # Make src/ importable
+from tenable.transform.transform.parse_xml_and_save_individual_csvs import (MAX_WORKERS, input_dir, iter_feed,
+                                                                            output_dir as parsed_dir)
+from tenable.transform.transform.create_master_tenable_plugins_dataframe import (merge_records, sorted_records,
+                                                                                 write_master_csv)
+from nvd.utils import metrics, store
+from nvd.utils.batch_queue import BatchChannel
+from nvd.utils.correlation import format_refresh, refresh
+from nvd.utils.db_writer import DatabaseWriter
+from nvd.utils.processes import context
+from tenable.load.load_master_data import create_tables, db_path, format_counts, load_records
+from tenable.schema import FIELDNAMES
+
+# Parsed rows travel from the parser processes in batches; a full channel pauses the parsers
+BATCH_SIZE = int(os.getenv('TENABLE_PARSE_BATCH_SIZE', 500))
+MAX_QUEUED_BATCHES = int(os.getenv('TENABLE_PARSE_MAX_QUEUED_BATCHES', 16))
+
+# The channel of a parser worker process, set by its initializer
+_channel = None
+
+
+def _use_channel(channel):
+    """ Worker initializer: the channel every feed parsed in this worker is streamed into. """
+    global _channel
+    _channel = channel
+
+
+def stream_feed(index, xml_file, debug_csv_file=None):
+    """ Worker task: send one feed's rows into the channel in batches, then mark feed `index` done. """
+    try:
+        batch = []
+        for row in iter_feed(xml_file, debug_csv_file):
+            batch.append(row)
+            if len(batch) >= BATCH_SIZE:
+                _channel.put_batch(index, batch, FIELDNAMES)
+                batch = []
+        if batch:
+            _channel.put_batch(index, batch, FIELDNAMES)
+    finally:
+        _channel.put_control("FEED_DONE", index)
+
+
+def _report_lost_feed(channel, index, future):
+    """ Mark feed `index` done when its worker died, since the task then never sends its own FEED_DONE. """
+    if not future.cancelled() and isinstance(future.exception(), BrokenProcessPool):
+        channel.put_control("FEED_DONE", index)
+
+
+def iter_feed_records(xml_files, max_workers=MAX_WORKERS, debug_dir=None):
+    """ Yield parsed records feed by feed, parsing the feeds in parallel worker processes.
+
+    Workers stream their rows back in batches while they parse, so records reach the
+    caller (and the PluginId merge) long before a feed is finished. The records still come
+    out in feed order, as the merge's first-row-wins rule needs: batches of a later feed
+    wait until every earlier feed is done.
+    """
+    if debug_dir:
+        os.makedirs(debug_dir, exist_ok=True)
+    debug_files = [os.path.join(debug_dir, f'parsed_{Path(xml_file).stem}.csv') if debug_dir else None
+                   for xml_file in xml_files]
+    if max_workers <= 1 or len(xml_files) <= 1:
+        for xml_file, debug_file in zip(xml_files, debug_files):
+            yield from (dict(zip(FIELDNAMES, row)) for row in iter_feed(xml_file, debug_file))
+        return
+
+    channel = BatchChannel(MAX_QUEUED_BATCHES)
+    waiting = defaultdict(list)
+    done = set()
+    current = 0
+    with ProcessPoolExecutor(max_workers=min(max_workers, len(xml_files)), mp_context=context,
+                             initializer=_use_channel, initargs=(channel,)) as executor:
+        futures = [executor.submit(stream_feed, index, xml_file, debug_file)
+                   for index, (xml_file, debug_file) in enumerate(zip(xml_files, debug_files))]
+        for index, future in enumerate(futures):
+            future.add_done_callback(partial(_report_lost_feed, channel, index))
+        try:
+            while current < len(xml_files):
+                kind, index, payload = channel.get()
+                if kind == "BATCH":
+                    waiting[index].append(payload)
+                else:
+                    done.add(index)
+                while current < len(xml_files):
+                    for batch in waiting.pop(current, ()):
+                        yield from (dict(zip(batch.columns, row)) for row in batch.rows)
+                    if current not in done:
+                        break
+                    current += 1
+        finally:
+            if current < len(xml_files):
+                # Abandoned part way: cancel the feeds not started and drain the rest so no worker stays
+                # blocked on a full channel while the pool shuts down
+                done.update(index for index, future in enumerate(futures) if future.cancel())
+                while len(done) < len(xml_files):
+                    kind, index, _ = channel.get()
+                    if kind == "FEED_DONE":
+                        done.add(index)
+        for future in futures:
+            future.result()
+
+
+def run(xml_dir=input_dir, database=db_path, max_workers=MAX_WORKERS, debug_dir=None, master_csv=None,
+        nvd_database=store.DATABASE_PATH, feeds=None):
+    """ Parse the feeds in `xml_dir`, merge by PluginId, load the result and refresh the NVD correlation.
+
+    With `feeds` only the feeds of those names are parsed, e.g. the ones fetch_feeds reported
+    as changed; the load upserts, so plugins of the other feeds stay as they are. Returns the
+    load counts.
+    """
+    start = time.perf_counter()
+    xml_files = sorted(os.path.join(xml_dir, name) for name in os.listdir(xml_dir)
+                       if name.endswith('.xml') and (feeds is None or name[:-len('.xml')] in feeds))
+    with metrics.stage('tenable_parse_merge') as stage:
+        data_by_plugin_id = merge_records(iter_feed_records(xml_files, max_workers, debug_dir))
+        records = sorted_records(data_by_plugin_id)
+        stage.add(len(records))
+    parsed = time.perf_counter()
+    print(f"Parsed and merged {len(xml_files)} feeds into {len(records)} plugins in {parsed - start:.2f}s")
+
+    if master_csv:
+        write_master_csv(records, master_csv)
+        print(f"Combined CSV file created at {master_csv}")
+
+    Path(database).parent.mkdir(parents=True, exist_ok=True)
+    with metrics.stage('tenable_load') as stage, DatabaseWriter(database, setup=create_tables) as writer:
+        writer.call(load_records, records)
+        stage.add(len(records))
+    counts = writer.results[0]
+    print(f"Loaded {len(records)} plugins into {database} ({format_counts(counts)}) "
+          f"in {time.perf_counter() - parsed:.2f}s")
+    print(format_refresh(refresh(database, nvd_database)))
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--fetch', action='store_true',
+                        help="Download the feeds first and only parse the ones that changed")
+    parser.add_argument('--database', type=Path, default=db_path, help="SQLite database to load into")
+    parser.add_argument('--nvd-database', type=Path, default=store.DATABASE_PATH,
+                        help="NVD SQLite database joined into the plugin/CVE correlation table")
+    parser.add_argument('--workers', type=int, default=MAX_WORKERS, help="Number of parser processes")
+    parser.add_argument('--debug-csv', action='store_true',
+                        help=f"Also write the per-feed CSVs to {parsed_dir} and master/master.csv beside them")
+    args = parser.parse_args()
+
+    feeds = None
+    if args.fetch:
+        from tenable.extract.extract_tenable_data import fetch_feeds
+        report = asyncio.run(fetch_feeds(output_dir=input_dir))
+        if report['failed']:
+            print(f"Failed feeds: {', '.join(report['failed'])}")
+        if not report['changed']:
+            print("No feed changed since the last run; nothing to load.")
+            return
+        feeds = set(report['changed'])
+
+    debug_dir = parsed_dir if args.debug_csv else None
+    master_csv = Path(parsed_dir).parent / 'master/master.csv' if args.debug_csv else None
+    if master_csv:
+        master_csv.parent.mkdir(parents=True, exist_ok=True)
+    run(database=args.database, max_workers=args.workers, debug_dir=debug_dir, master_csv=master_csv,
+        nvd_database=args.nvd_database, feeds=feeds)
+
+
+if __name__ == '__main__':
+    with metrics.run('tenable_pipeline'):
+        main()
@@ -0,0 +1,8 @@
+""" Fields of a parsed Tenable plugin record.
+
+The feed parser produces records with these fields, the PluginId merge and master.csv
+keep them, and the TenablePluginData table has one column per field (plus its content
+hash). This list is the only place they are declared.
+"""
+FIELDNAMES = ['PluginId', 'SourceFile', 'Title', 'Link', 'PublicationDate', 'Product', 'Severity', 'Synopsis',
+              'Description', 'Solution', 'CVEID']
@@ -1,40 +1,66 @@
 import csv
 import os
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent.parent.parent))  # Make src/ importable
+from tenable.schema import FIELDNAMES
 
 # Directory paths
-input_dir = '../tenable_data/parsed_xml_files'
-output_dir = '../tenable_data/master'
-os.makedirs(output_dir, exist_ok=True)
-
-# Initialize a dictionary to store rows by PluginId
-data_by_plugin_id = {}
-
-# Loop through each CSV file in the input directory
-for csv_filename in os.listdir(input_dir):
-    if csv_filename.endswith('.csv'):
-        csv_file_path = os.path.join(input_dir, csv_filename)
-        with open(csv_file_path, 'r', encoding='utf-8') as file:
-            reader = csv.DictReader(file)
-            for row in reader:
-                plugin_id = row['PluginId']
-                if plugin_id not in data_by_plugin_id:
-                    data_by_plugin_id[plugin_id] = row
-                else:
-                    # Merge rows with the same PluginId
-                    for key, value in row.items():
-                        if value and not data_by_plugin_id[plugin_id][key]:
-                            data_by_plugin_id[plugin_id][key] = value
-
-# Sort the data by PluginId in descending order
-sorted_data = sorted(data_by_plugin_id.values(), key=lambda x: int(x['PluginId']), reverse=True)
-
-# Write the combined data to a new CSV file in the output directory
-output_file_path = os.path.join(output_dir, 'master.csv')
-with open(output_file_path, 'w', newline='', encoding='utf-8') as file:
-    fieldnames = ['PluginId', 'SourceFile', 'Title', 'Link', 'PublicationDate', 'Product', 'Severity', 'Synopsis', 'Description', 'Solution', 'CVEID']
-    writer = csv.DictWriter(file, fieldnames=fieldnames)
-    writer.writeheader()
-    for row in sorted_data:
-        writer.writerow(row)
-
-print(f'Combined CSV file created at {output_file_path}')
\ No newline at end of file
+TENABLE_DATA_DIR = Path(__file__).resolve().parent.parent.parent.parent.parent / 'data/tenable_data'
+input_dir = TENABLE_DATA_DIR / 'parsed_xml_files'
+output_dir = TENABLE_DATA_DIR / 'master'
+
+
+def merge_records(records, data_by_plugin_id=None):
+    """ Merge records into one row per PluginId: the first row seen wins, later rows only fill its blanks. """
+    if data_by_plugin_id is None:
+        data_by_plugin_id = {}
+    for row in records:
+        plugin_id = row['PluginId']
+        if not plugin_id:
+            continue
+        if plugin_id not in data_by_plugin_id:
+            data_by_plugin_id[plugin_id] = dict(row)
+        else:
+            # Merge rows with the same PluginId
+            merged = data_by_plugin_id[plugin_id]
+            for key, value in row.items():
+                if value and not merged[key]:
+                    merged[key] = value
+    return data_by_plugin_id
+
+
+def sorted_records(data_by_plugin_id):
+    """ Merged rows sorted by PluginId in descending order. """
+    return sorted(data_by_plugin_id.values(), key=lambda x: int(x['PluginId']), reverse=True)
+
+
+def write_master_csv(records, output_file_path):
+    with open(output_file_path, 'w', newline='', encoding='utf-8') as file:
+        writer = csv.DictWriter(file, fieldnames=FIELDNAMES)
+        writer.writeheader()
+        for row in records:
+            writer.writerow(row)
+
+
+def read_parsed_csvs(input_dir=input_dir):
+    """ Stream the rows of every per-feed CSV written by parse_xml_and_save_individual_csvs.py. """
+    for csv_filename in sorted(os.listdir(input_dir)):
+        if csv_filename.endswith('.csv'):
+            with open(os.path.join(input_dir, csv_filename), 'r', encoding='utf-8') as file:
+                yield from csv.DictReader(file)
+
+
+def main():
+    os.makedirs(output_dir, exist_ok=True)
+    data_by_plugin_id = merge_records(read_parsed_csvs())
+
+    # Write the combined data to a new CSV file in the output directory
+    output_file_path = os.path.join(output_dir, 'master.csv')
+    write_master_csv(sorted_records(data_by_plugin_id), output_file_path)
+    print(f'Combined CSV file created at {output_file_path}')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,14 +1,41 @@
+import argparse
 import csv
+import json
 import xml.etree.ElementTree as ET
 import re
 import os
-from bs4 import BeautifulSoup
-from datetime import datetime
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from html import unescape
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent.parent.parent))  # Make src/ importable
+from nvd.utils.processes import context
+from tenable.schema import FIELDNAMES
 
 # Directory paths
-input_dir = '../tenable_data/xml_files'
-output_dir = '../tenable_data/parsed_xml_files'
-os.makedirs(output_dir, exist_ok=True)
+TENABLE_DATA_DIR = Path(__file__).resolve().parent.parent.parent.parent.parent / 'data/tenable_data'
+input_dir = TENABLE_DATA_DIR / 'xml_files'
+output_dir = TENABLE_DATA_DIR / 'parsed_xml_files'
+CHANGES_FILE = TENABLE_DATA_DIR / 'changed_feeds.json'
+
+# Sections of the item description that become columns
+SECTIONS = ('synopsis', 'description', 'solution')
+
+# Elements that never have an end tag and so do not open a nesting level
+VOID_TAGS = {'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link', 'meta', 'source', 'track', 'wbr'}
+
+MONTHS = {month: f'{number:02d}' for number, month in enumerate(
+    ('jan', 'feb', 'mar', 'apr', 'may', 'jun', 'jul', 'aug', 'sep', 'oct', 'nov', 'dec'), start=1)}
+
+MAX_WORKERS = int(os.getenv('TENABLE_PARSE_WORKERS', os.cpu_count() or 1))
+
+# Tags (group 1: '/', group 2: name), comments/doctypes (no groups) and text between them (group 3)
+_html_token = re.compile(r'<(/?)([a-zA-Z][a-zA-Z0-9]*)[^>]*>|<[!?][^>]*>|([^<]+)')
+_cve_pattern = re.compile(r'cve-\d{4}-\d{4,7}')
+_plugin_id_pattern = re.compile(r'plugin id (\d+)')
+_product_pattern = re.compile(r'(.*) plugin id \d+')
 
 
 # Function to clean text by removing double quotes and colons
@@ -16,71 +43,182 @@ def clean_text(text):
     return text.replace('"', '').replace(':', '')
 
 
+def scan_description(description_html):
+    """ One pass over an item's description HTML collecting the first <p> and the <span> after each section <h3>.
+
+    Returns (paragraph, {section: text}). Text is gathered the way BeautifulSoup's
+    `get_text(strip=True)` does: every text node stripped and the non-empty ones
+    joined without a separator.
+    """
+    paragraph = None
+    sections = {}
+    depth = 0
+    capture = None      # (key, depth of the element being captured)
+    parts = []
+    heading = None      # (section, depth) of the last closed <h3>, waiting for its sibling <span>
+    for match in _html_token.finditer(description_html):
+        closing, tag, text = match.groups()
+        if text is not None:
+            if capture is not None:
+                text = text.strip()
+                if text:
+                    parts.append(unescape(text) if '&' in text else text)
+        elif tag is None or tag in VOID_TAGS or match.group(0).endswith('/>'):
+            continue
+        elif not closing:
+            depth += 1
+            if capture is not None:
+                continue
+            if tag == 'p' and paragraph is None or tag == 'h3':
+                capture, parts = (tag, depth), []
+            elif tag == 'span' and heading is not None and heading[1] == depth:
+                capture, parts = (heading[0], depth), []
+                heading = None
+        else:
+            if capture is not None and capture[1] == depth:
+                key, text = capture[0], ''.join(parts)
+                capture = None
+                if key == 'p':
+                    paragraph = text
+                elif key == 'h3':
+                    heading = (text, depth) if text in SECTIONS and text not in sections else None
+                else:
+                    sections[key] = text
+            depth -= 1
+            if heading is not None and depth < heading[1] - 1:
+                heading = None  # The heading's parent closed before a sibling <span> appeared
+    return paragraph, sections
+
+
+def parse_description(description_html):
+    """ Extract the plugin id line, product, severity, sections and every CVE from one description. """
+    paragraph, sections = scan_description(description_html)
+    plugin_id_text = clean_text(paragraph or '')
+    plugin_id_match = _plugin_id_pattern.search(plugin_id_text)
+    product_match = _product_pattern.match(plugin_id_text)
+    return {
+        'PluginId': plugin_id_match.group(1) if plugin_id_match else '',
+        'Product': product_match.group(1).strip() if product_match else '',
+        'Severity': plugin_id_text.split('severity')[0].split()[-1] if 'severity' in plugin_id_text else '',
+        'Synopsis': clean_text(sections.get('synopsis', '')),
+        'Description': clean_text(sections.get('description', '')),
+        'Solution': clean_text(sections.get('solution', '')),
+        # Every distinct CVE in the description, in order of appearance
+        'CVEID': ', '.join(dict.fromkeys(_cve_pattern.findall(description_html))),
+    }
+
+
+def format_pub_date(pub_date):
+    """ 'mon, 01 jan 2024 120000 +0000' -> '2024-01-01' (the date as written, like strptime + strftime). """
+    parts = pub_date.split()
+    if len(parts) >= 4 and parts[2] in MONTHS and parts[1].isdigit() and parts[3].isdigit():
+        return f"{parts[3]}-{MONTHS[parts[2]]}-{int(parts[1]):02d}"
+    return pub_date
+
+
+def parse_item(item, source_file):
+    title = clean_text(item.findtext('title', '').strip().lower())
+    link = clean_text(item.findtext('link', '').strip().lower())
+    pub_date = clean_text(item.findtext('pubDate', '').strip().lower())
+    description_html = clean_text(item.findtext('description', '').strip().lower())
+
+    record = parse_description(description_html)
+    record.update({'SourceFile': source_file, 'Title': title, 'Link': link, 'PublicationDate': format_pub_date(pub_date)})
+    return record
+
+
+def iter_items(xml_file, source_file=None):
+    """ Stream the parsed records of a feed, detaching each <item> from the tree once it has been handled.
+
+    Clearing an item alone would still leave its empty element attached to <channel>, so
+    memory would grow with the feed; removed items leave only the open elements behind.
+    """
+    # e.g. 'xml_files/newest_plugins.xml', as the feed's path relative to the tenable_data directory
+    source_file = source_file or os.path.join(os.path.basename(os.path.dirname(os.path.abspath(xml_file))),
+                                              os.path.basename(xml_file))
+    parents = []  # The open elements, innermost last
+    for event, elem in ET.iterparse(xml_file, events=('start', 'end')):
+        if event == 'start':
+            parents.append(elem)
+            continue
+        parents.pop()
+        if elem.tag == 'item':
+            yield parse_item(elem, source_file)
+            elem.clear()
+            if parents:
+                parents[-1].remove(elem)
+
+
 # Function to parse XML and write to CSV
 def parse_xml_to_csv(xml_file, csv_file):
-    # Load and parse the XML file
-    tree = ET.parse(xml_file)
-    root = tree.getroot()
-
-    # Open a CSV file for writing
-    with open(csv_file, 'w', newline='', encoding='utf-8') as file:
-        writer = csv.writer(file)
-        # Write the header row
-        writer.writerow(
-            ['PluginId', 'SourceFile', 'Title', 'Link', 'PublicationDate', 'Product', 'Severity', 'Synopsis',
-             'Description', 'Solution', 'CVEID'])
-
-        # Iterate through each item in the XML
-        for item in root.findall('.//item'):
-            title = clean_text(item.find('title').text.strip().lower() if item.find('title') is not None else '')
-            link = clean_text(item.find('link').text.strip().lower() if item.find('link') is not None else '')
-            pub_date = clean_text(item.find('pubDate').text.strip().lower() if item.find('pubDate') is not None else '')
-            description_html = clean_text(
-                item.find('description').text.strip().lower() if item.find('description') is not None else '')
-
-            # Parse HTML content within description using BeautifulSoup
-            soup = BeautifulSoup(description_html, 'html.parser')
-            plugin_id_text = clean_text(soup.find('p').get_text(strip=True).lower() if soup.find('p') else '')
-            severity = clean_text(
-                plugin_id_text.split('severity')[0].split()[-1] if 'severity' in plugin_id_text else '')
-            synopsis = clean_text(
-                soup.find('h3', string='synopsis').find_next_sibling('span').get_text(strip=True).lower() if soup.find(
-                    'h3', string='synopsis') else '')
-            description_text = clean_text(soup.find('h3', string='description').find_next_sibling('span').get_text(
-                strip=True).lower() if soup.find('h3', string='description') else '')
-            solution = clean_text(
-                soup.find('h3', string='solution').find_next_sibling('span').get_text(strip=True).lower() if soup.find(
-                    'h3', string='solution') else '')
-
-            # Extract CVE from the description
-            cve_match = re.search(r'cve-\d{4}-\d{4,7}', description_html)
-            cve = clean_text(cve_match.group(0).lower() if cve_match else '')
-
-            # Extract Plugin ID and Product from the plugin_id_text
-            plugin_id_match = re.search(r'plugin id (\d+)', plugin_id_text)
-            plugin_id = clean_text(plugin_id_match.group(1).lower() if plugin_id_match else '')
-            product_match = re.match(r'(.*) plugin id \d+', plugin_id_text)
-            product = clean_text(product_match.group(1).strip().lower() if product_match else '')
-
-            # Convert publication date to a standard date format
-            try:
-                pub_date_parsed = datetime.strptime(pub_date, '%a, %d %b %Y %H:%M:%S %z')
-                pub_date_formatted = pub_date_parsed.strftime('%Y-%m-%d')
-            except Exception as e:
-                pub_date_formatted = pub_date
-
-            # Write the extracted data to the CSV file
-            writer.writerow(
-                [plugin_id, os.path.relpath(xml_file, start=os.path.dirname(input_dir)), title, link,
-                 pub_date_formatted, product, severity, synopsis, description_text,
-                 solution, cve])
-
-
-# Loop through each XML file in the input directory
-for xml_filename in os.listdir(input_dir):
-    if xml_filename.endswith('.xml'):
-        xml_file_path = os.path.join(input_dir, xml_filename)
-        csv_filename = f'parsed_{os.path.splitext(xml_filename)[0]}.csv'
-        csv_file_path = os.path.join(output_dir, csv_filename)
-        parse_xml_to_csv(xml_file_path, csv_file_path)
-        print(f'Parsed {xml_file_path} to {csv_file_path}')
+    """ Parse one feed into its CSV; returns (csv_file, items, seconds). """
+    start = time.perf_counter()
+    count = 0
+    tmp_file = f"{csv_file}.tmp"
+    with open(tmp_file, 'w', newline='', encoding='utf-8') as file:
+        writer = csv.DictWriter(file, fieldnames=FIELDNAMES)
+        writer.writeheader()
+        for record in iter_items(xml_file):
+            writer.writerow(record)
+            count += 1
+    os.replace(tmp_file, csv_file)
+    return csv_file, count, time.perf_counter() - start
+
+
+def iter_feed(xml_file, debug_csv_file=None):
+    """ Stream one feed's rows (tuples in FIELDNAMES order), optionally also writing its CSV for debugging. """
+    file = open(debug_csv_file, 'w', newline='', encoding='utf-8') if debug_csv_file else None
+    try:
+        writer = csv.writer(file) if file else None
+        if writer:
+            writer.writerow(FIELDNAMES)
+        for record in iter_items(xml_file):
+            row = tuple(record[field] for field in FIELDNAMES)
+            if writer:
+                writer.writerow(row)
+            yield row
+    finally:
+        if file:
+            file.close()
+
+
+def changed_feed_files(changes_file=CHANGES_FILE):
+    """ XML file names of the feeds the fetcher reported as changed on its last run. """
+    with open(changes_file, 'r', encoding='utf-8') as file:
+        return {f"{name}.xml" for name in json.load(file)['changed']}
+
+
+def parse_feeds(xml_files, output_dir=output_dir, max_workers=MAX_WORKERS):
+    """ Parse feeds in parallel, one feed per worker process. """
+    os.makedirs(output_dir, exist_ok=True)
+    jobs = [(xml_file, os.path.join(output_dir, f'parsed_{Path(xml_file).stem}.csv')) for xml_file in xml_files]
+    if max_workers <= 1 or len(jobs) <= 1:
+        return [parse_xml_to_csv(*job) for job in jobs]
+    with ProcessPoolExecutor(max_workers=min(max_workers, len(jobs)), mp_context=context) as executor:
+        return list(executor.map(parse_xml_to_csv, *zip(*jobs)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Parse the Tenable plugin feeds into one CSV per feed.")
+    parser.add_argument('--workers', type=int, default=MAX_WORKERS, help="Number of worker processes")
+    parser.add_argument('--changed-only', action='store_true',
+                        help="Only parse the feeds reported as changed by the last fetch")
+    args = parser.parse_args()
+
+    # Loop through each XML file in the input directory
+    xml_filenames = sorted(name for name in os.listdir(input_dir) if name.endswith('.xml'))
+    if args.changed_only and os.path.exists(CHANGES_FILE):
+        changed = changed_feed_files()
+        xml_filenames = [name for name in xml_filenames if name in changed]
+
+    start = time.perf_counter()
+    results = parse_feeds([os.path.join(input_dir, name) for name in xml_filenames], max_workers=args.workers)
+    for csv_file, count, seconds in results:
+        print(f'Parsed {count} items to {csv_file} in {seconds:.2f}s')
+    total = sum(count for _, count, _ in results)
+    elapsed = time.perf_counter() - start
+    print(f'Parsed {len(results)} feeds, {total} items in {elapsed:.2f}s ({total / max(elapsed, 1e-9):,.0f} items/s)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,8 @@
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.append(str(ROOT / 'src'))  # Make src/ importable
+sys.path.append(str(ROOT / 'benchmarks'))  # And the synthetic data generators
+
+FIXTURES_DIR = Path(__file__).resolve().parent / 'fixtures'
@@ -0,0 +1,62 @@
+import threading
+
+import pytest
+
+from nvd.utils import batch_queue
+from nvd.utils.batch_queue import BatchChannel, RecordBatch
+from nvd.utils.processes import context
+
+
+def test_batches_and_control_messages_arrive_in_order():
+    channel = BatchChannel(4)
+    channel.put_batch(0, [('CVE-2024-0001', 'a'), ('CVE-2024-0002', 'b')], ('CVE ID', 'Description'))
+    channel.put_batch(1, [{'CVE ID': 'CVE-2024-0003', 'Description': 'c'}])
+    channel.put_control("PAGE_DONE", 0, (2, 3))
+    channel.close()
+
+    messages = list(channel)
+
+    assert [(kind, key) for kind, key, _ in messages] == [("BATCH", 0), ("BATCH", 1), ("PAGE_DONE", 0)]
+    assert messages[0][2].records() == [{'CVE ID': 'CVE-2024-0001', 'Description': 'a'},
+                                        {'CVE ID': 'CVE-2024-0002', 'Description': 'b'}]
+    assert messages[1][2].columns == ('CVE ID', 'Description')
+    assert messages[2][2] == (2, 3)
+    assert channel.stats()['bytes_in_flight'] == 0
+
+
+def test_record_batch_from_single_column_records():
+    batch = RecordBatch.from_records([{'CVE ID': 'CVE-2024-0001'}, {'CVE ID': 'CVE-2024-0002'}])
+
+    assert batch.rows == [('CVE-2024-0001',), ('CVE-2024-0002',)]
+    assert len(RecordBatch.from_records([])) == 0
+
+
+def test_put_blocks_while_the_channel_is_full():
+    channel = BatchChannel(1, compression_level=0)
+    channel.put_batch(0, [('CVE-2024-0001',)], ('CVE ID',))
+    second_put = threading.Thread(target=channel.put_batch, args=(1, [('CVE-2024-0002',)], ('CVE ID',)))
+    second_put.start()
+
+    second_put.join(0.5)
+    assert second_put.is_alive()
+
+    assert channel.get()[1] == 0
+    second_put.join(5)
+    assert not second_put.is_alive()
+    assert channel.get()[1] == 1
+
+
+def test_put_fails_once_the_attached_consumer_has_exited(monkeypatch):
+    monkeypatch.setattr(batch_queue, 'LIVENESS_INTERVAL', 0.05)
+    consumer = context.Process(target=int)
+    consumer.start()
+    consumer.join()
+    channel = BatchChannel(1)
+    channel.attach(consumer)
+    channel.put_batch(0, [('CVE-2024-0001',)], ('CVE ID',))
+    queued = channel.stats()['bytes_in_flight']
+
+    with pytest.raises(RuntimeError, match='consumer exited'):
+        channel.put_batch(1, [('CVE-2024-0002',)], ('CVE ID',))
+    assert channel.stats()['bytes_in_flight'] == queued
+    channel.close()  # Nobody is left to tell, which is not an error
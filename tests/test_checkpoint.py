@@ -0,0 +1,56 @@
+import pytest
+
+from nvd.utils.checkpoint import CheckpointManifest
+
+
+@pytest.fixture
+def manifest_file(tmp_path):
+    return tmp_path / 'nvd_data.manifest.json'
+
+
+def written_manifest(manifest_file, total_results, records_by_page, results_per_page=10):
+    manifest = CheckpointManifest.load(manifest_file, results_per_page)
+    manifest.extend(total_results)
+    for start_index, record_count in records_by_page.items():
+        manifest.mark_written(start_index, record_count, f'page_{start_index:08d}.csv')
+    return manifest
+
+
+def test_resume_only_fetches_the_pages_not_yet_written(manifest_file):
+    written_manifest(manifest_file, 35, {0: 10, 20: 10})
+
+    manifest = CheckpointManifest.load(manifest_file, 10)
+
+    assert manifest.total_results == 35
+    assert manifest.missing_pages() == [10, 30]
+    assert not manifest.is_complete()
+    manifest.mark_written(10, 10, 'page_00000010.csv')
+    manifest.mark_written(30, 5, 'page_00000030.csv')
+    assert CheckpointManifest.load(manifest_file, 10).is_complete()
+
+
+def test_resume_with_another_page_size_is_refused(manifest_file):
+    written_manifest(manifest_file, 35, {0: 10})
+
+    with pytest.raises(ValueError, match='resultsPerPage'):
+        CheckpointManifest.load(manifest_file, 20)
+
+
+def test_extend_refetches_a_short_last_page_and_adds_new_pages(manifest_file):
+    manifest = written_manifest(manifest_file, 25, {0: 10, 10: 10, 20: 5})
+    assert manifest.is_complete()
+
+    manifest.extend(42)
+
+    assert manifest.total_results == 42
+    assert manifest.missing_pages() == [20, 30, 40]
+
+
+def test_extend_keeps_a_full_last_page_and_ignores_a_smaller_total(manifest_file):
+    manifest = written_manifest(manifest_file, 20, {0: 10, 10: 10})
+
+    manifest.extend(15)
+    assert manifest.total_results == 20
+    manifest.extend(30)
+
+    assert manifest.missing_pages() == [20]
@@ -0,0 +1,136 @@
+import sqlite3
+
+import pytest
+
+from nvd.utils import store
+from nvd.utils.correlation import CORRELATION_TABLE, format_refresh, refresh, track_cve_changes
+from tenable.load.load_master_data import create_tables, load_records
+
+CVE_COLUMNS = ['CVE ID', 'Published Date', 'Last Modified Date']
+
+
+def plugin(plugin_id, title, cves):
+    return {'PluginId': plugin_id, 'SourceFile': 'xml_files/newest_plugins.xml', 'Title': title,
+            'Link': f'https://www.tenable.com/plugins/nessus/{plugin_id}', 'PublicationDate': '2024-05-01',
+            'Product': 'nessus', 'Severity': 'high', 'Synopsis': '', 'Description': '', 'Solution': '',
+            'CVEID': cves}
+
+
+@pytest.fixture
+def databases(tmp_path):
+    nvd_database, tenable_database = tmp_path / 'nvd.db', tmp_path / 'tenable.db'
+    conn = store.connect(nvd_database)
+    with conn:
+        store.ensure_cve_table(conn, CVE_COLUMNS)
+        track_cve_changes(conn)
+        store.upsert_rows(conn, CVE_COLUMNS, [
+            ('CVE-2024-0001', '2024-04-01T00:00:00.000', '2024-05-01T00:00:00.000'),
+            ('CVE-2024-0002', '2024-04-02T00:00:00.000', '2024-05-01T00:00:00.000'),
+            ('CVE-2024-0003', '2024-04-03T00:00:00.000', '2024-05-01T00:00:00.000'),
+        ])
+    conn.close()
+    conn = sqlite3.connect(tenable_database)
+    with conn:
+        create_tables(conn)
+        load_records(conn, [plugin('100', 'first plugin', 'cve-2024-0001, cve-2024-0002'),
+                            plugin('200', 'second plugin', 'cve-2024-0003')])
+    conn.close()
+    return nvd_database, tenable_database
+
+
+def correlation(tenable_database):
+    conn = sqlite3.connect(tenable_database)
+    try:
+        return {(plugin_id, cve_id): (title, last_modified) for plugin_id, cve_id, title, last_modified in conn.execute(
+            f'SELECT plugin_id, cve_id, plugin_title, cve_last_modified FROM {CORRELATION_TABLE}')}
+    finally:
+        conn.close()
+
+
+def pending_changes(database, table):
+    conn = sqlite3.connect(database)
+    try:
+        return conn.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+    finally:
+        conn.close()
+
+
+def test_first_refresh_rebuilds_every_pair(databases):
+    nvd_database, tenable_database = databases
+
+    result = refresh(tenable_database, nvd_database)
+
+    assert result['full'] and result['rows'] == 3
+    assert correlation(tenable_database) == {
+        ('100', 'CVE-2024-0001'): ('first plugin', '2024-05-01T00:00:00.000'),
+        ('100', 'CVE-2024-0002'): ('first plugin', '2024-05-01T00:00:00.000'),
+        ('200', 'CVE-2024-0003'): ('second plugin', '2024-05-01T00:00:00.000'),
+    }
+    assert pending_changes(nvd_database, 'cve_change') == 0
+    assert pending_changes(tenable_database, 'plugin_change') == 0
+
+
+def test_refresh_after_a_cve_changes_rejoins_only_its_pairs(databases):
+    nvd_database, tenable_database = databases
+    refresh(tenable_database, nvd_database)
+    conn = store.connect(nvd_database)
+    with conn:
+        store.upsert_rows(conn, CVE_COLUMNS, [('CVE-2024-0002', '2024-04-02T00:00:00.000', '2024-05-09T00:00:00.000')])
+    conn.close()
+
+    result = refresh(tenable_database, nvd_database)
+
+    assert not result['full']
+    assert (result['plugins'], result['cves'], result['rows']) == (0, 1, 1)
+    rows = correlation(tenable_database)
+    assert rows[('100', 'CVE-2024-0002')] == ('first plugin', '2024-05-09T00:00:00.000')
+    assert rows[('100', 'CVE-2024-0001')] == ('first plugin', '2024-05-01T00:00:00.000')
+    assert pending_changes(nvd_database, 'cve_change') == 0
+
+
+def test_refresh_after_a_plugin_changes_rejoins_its_new_cves(databases):
+    nvd_database, tenable_database = databases
+    refresh(tenable_database, nvd_database)
+    conn = sqlite3.connect(tenable_database)
+    with conn:
+        load_records(conn, [plugin('200', 'second plugin, revised', 'cve-2024-0001')])
+    conn.close()
+
+    result = refresh(tenable_database, nvd_database)
+
+    assert not result['full']
+    assert (result['plugins'], result['cves'], result['rows']) == (1, 0, 1)
+    assert correlation(tenable_database) == {
+        ('100', 'CVE-2024-0001'): ('first plugin', '2024-05-01T00:00:00.000'),
+        ('100', 'CVE-2024-0002'): ('first plugin', '2024-05-01T00:00:00.000'),
+        ('200', 'CVE-2024-0001'): ('second plugin, revised', '2024-05-01T00:00:00.000'),
+    }
+
+
+def test_refresh_without_changes_writes_nothing(databases):
+    nvd_database, tenable_database = databases
+    refresh(tenable_database, nvd_database)
+
+    result = refresh(tenable_database, nvd_database)
+
+    assert (result['full'], result['plugins'], result['cves'], result['rows']) == (False, 0, 0, 0)
+
+
+def test_full_refresh_rebuilds_rows_the_incremental_one_missed(databases):
+    nvd_database, tenable_database = databases
+    refresh(tenable_database, nvd_database)
+    conn = sqlite3.connect(tenable_database)
+    with conn:
+        conn.execute(f"DELETE FROM {CORRELATION_TABLE} WHERE plugin_id = '100'")
+    conn.close()
+
+    assert refresh(tenable_database, nvd_database)['rows'] == 0
+    result = refresh(tenable_database, nvd_database, full=True)
+
+    assert result['full'] and result['rows'] == 3
+    assert len(correlation(tenable_database)) == 3
+
+
+def test_refresh_before_any_plugin_is_loaded(tmp_path):
+    assert refresh(tmp_path / 'tenable.db', tmp_path / 'nvd.db') is None
+    assert format_refresh(None) == "No Tenable plugins loaded yet; correlation not refreshed"
@@ -0,0 +1,77 @@
+import pytest
+
+from nvd.match.cpe_matcher import build_index, split_cpe, version_key
+
+
+def configuration(*cpe_matches, operator='OR'):
+    return [{'nodes': [{'operator': operator, 'cpeMatch': list(cpe_matches)}]}]
+
+
+def cpe_match(criteria, vulnerable=True, **bounds):
+    return dict(criteria=criteria, vulnerable=vulnerable, **bounds)
+
+
+def matched_cves(index, *cpes):
+    return sorted(cve_id for _, cve_id in index.match_hosts({'host': cpes}))
+
+
+@pytest.mark.parametrize('lower, higher', [
+    ('1.2', '1.10'),
+    ('1.0rc1', '1.0'),
+    ('1.0', '1.0a'),
+    ('1.0a', '1.0.1'),
+    ('1.0a1', '1.0'),
+    ('1.0.0-beta', '1.0.0-rc1'),
+    ('2.9.9', '10.0'),
+])
+def test_version_key_orders_versions(lower, higher):
+    assert version_key(lower) < version_key(higher)
+
+
+def test_split_cpe_keeps_escaped_colons_and_pads_missing_fields():
+    fields = split_cpe('cpe:2.3:a:Vendor:prod\\:uct:1.0')
+
+    assert fields[3:6] == ('vendor', 'prod\\:uct', '1.0')
+    assert len(fields) == 13 and fields[-1] == '*'
+
+
+def test_version_range_bounds():
+    index = build_index([
+        ('CVE-2024-0001', configuration(cpe_match('cpe:2.3:a:acme:widget:*:*:*:*:*:*:*:*',
+                                                  versionStartIncluding='1.0', versionEndExcluding='2.0'))),
+        ('CVE-2024-0002', configuration(cpe_match('cpe:2.3:a:acme:widget:*:*:*:*:*:*:*:*',
+                                                  versionStartExcluding='1.0', versionEndIncluding='1.5'))),
+    ])
+
+    assert matched_cves(index, 'cpe:2.3:a:acme:widget:1.0:*:*:*:*:*:*:*') == ['CVE-2024-0001']
+    assert matched_cves(index, 'cpe:2.3:a:acme:widget:1.5:*:*:*:*:*:*:*') == ['CVE-2024-0001', 'CVE-2024-0002']
+    assert matched_cves(index, 'cpe:2.3:a:acme:widget:2.0rc1:*:*:*:*:*:*:*') == ['CVE-2024-0001']
+    assert matched_cves(index, 'cpe:2.3:a:acme:widget:2.0:*:*:*:*:*:*:*') == []
+    assert matched_cves(index, 'cpe:2.3:a:acme:widget:*:*:*:*:*:*:*:*') == []
+
+
+def test_wildcards_in_criteria_fields():
+    index = build_index([
+        ('CVE-2024-0001', configuration(cpe_match('cpe:2.3:a:acme:widget:1.?:*:*:*:*:*:*:*'))),
+        ('CVE-2024-0002', configuration(cpe_match('cpe:2.3:a:acme:*:*:*:*:*:*:*:*:*'))),
+        ('CVE-2024-0003', configuration(cpe_match('cpe:2.3:a:acme:gadget:3.0:*:*:*:*:*:*:*'))),
+        ('CVE-2024-0004', configuration(cpe_match('cpe:2.3:a:acme:widget:1.\\?:*:*:*:*:*:*:*'))),
+    ])
+
+    assert matched_cves(index, 'cpe:2.3:a:acme:widget:1.5:*:*:*:*:*:*:*') == ['CVE-2024-0001', 'CVE-2024-0002']
+    assert matched_cves(index, 'cpe:2.3:a:acme:widget:1.10:*:*:*:*:*:*:*') == ['CVE-2024-0002']
+    assert matched_cves(index, 'cpe:2.3:a:acme:gadget:3.0:*:*:*:*:*:*:*') == ['CVE-2024-0002', 'CVE-2024-0003']
+    assert matched_cves(index, 'cpe:2.3:a:other:widget:1.5:*:*:*:*:*:*:*') == []
+    assert matched_cves(index, 'cpe:2.3:a:acme:widget:1.\\?:*:*:*:*:*:*:*') == ['CVE-2024-0002', 'CVE-2024-0004']
+
+
+def test_and_configuration_needs_the_platform_too():
+    index = build_index([('CVE-2024-0001', [{'operator': 'AND', 'nodes': [
+        {'cpeMatch': [cpe_match('cpe:2.3:a:acme:widget:1.0:*:*:*:*:*:*:*')]},
+        {'cpeMatch': [cpe_match('cpe:2.3:o:microsoft:windows:*:*:*:*:*:*:*:*', vulnerable=False)]},
+    ]}])])
+
+    assert matched_cves(index, 'cpe:2.3:a:acme:widget:1.0:*:*:*:*:*:*:*') == []
+    assert matched_cves(index, 'cpe:2.3:o:microsoft:windows:10:*:*:*:*:*:*:*') == []
+    assert matched_cves(index, 'cpe:2.3:a:acme:widget:1.0:*:*:*:*:*:*:*',
+                        'cpe:2.3:o:microsoft:windows:10:*:*:*:*:*:*:*') == ['CVE-2024-0001']
@@ -0,0 +1,41 @@
+from nvd.utils.cvss import CvssVersion, flatten_page, preferred_metric
+
+V31 = CvssVersion('cvssMetricV31', [('Score', 'baseScore'), ('Temporal', 'temporalScore')],
+                  [('Exploitability', 'exploitabilityScore'), ('Source', 'source')])
+V2 = CvssVersion('cvssMetricV2', [('V2 Score', 'baseScore')], [('V2 Severity', 'baseSeverity')])
+
+
+def metric(kind, score, source):
+    return {'type': kind, 'source': source, 'exploitabilityScore': 3.9, 'cvssData': {'baseScore': score}}
+
+
+def test_preferred_metric_picks_the_primary_metric():
+    secondary, primary = metric('Secondary', 9.8, 'cna'), metric('Primary', 7.5, 'nvd')
+
+    assert preferred_metric([secondary, primary]) is primary
+    assert preferred_metric([secondary]) is secondary
+    assert preferred_metric([]) is None
+
+
+def test_flatten_page_reads_one_column_per_field_in_cve_order():
+    cves = [
+        {'metrics': {'cvssMetricV31': [metric('Secondary', 9.8, 'cna'), metric('Primary', 7.5, 'nvd')]}},
+        {},
+        {'metrics': {'cvssMetricV31': [metric('Secondary', 5.3, 'cna')]}},
+    ]
+
+    columns = flatten_page(cves, [V31, V2])
+
+    assert columns['Score'] == [7.5, None, 5.3]
+    assert columns['Source'] == ['nvd', None, 'cna']
+    assert columns['Exploitability'] == [3.9, None, 3.9]
+    assert columns['Temporal'] == columns['V2 Score'] == columns['V2 Severity'] == [None, None, None]
+
+
+def test_flatten_page_gives_every_absent_column_its_own_list():
+    columns = flatten_page([{}, {}], [V31, V2])
+
+    columns['Temporal'][0] = 1.0
+
+    assert columns['V2 Score'] == [None, None]
+    assert len({id(values) for values in columns.values()}) == len(columns)
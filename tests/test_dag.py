@@ -0,0 +1,85 @@
+import asyncio
+
+import pytest
+
+from nvd.utils.dag import BLOCKED, FAILED, OK, SKIPPED, Dag, Stage
+
+
+class Inputs:
+    """ The fingerprinted input of the graph and a record of which stages ran. """
+
+    def __init__(self):
+        self.version = 1
+        self.ran = []
+        self.fail = set()
+
+    def stage(self, name, result=True):
+        async def run(results):
+            self.ran.append(name)
+            if name in self.fail:
+                raise RuntimeError(f"{name} failed")
+            return result
+        return run
+
+
+@pytest.fixture
+def inputs():
+    return Inputs()
+
+
+def graph(inputs, state_file, load_result=True):
+    return Dag([
+        Stage('fetch', inputs.stage('fetch'), fingerprint=lambda: f'version {inputs.version}'),
+        Stage('load', inputs.stage('load', load_result), after=['fetch']),
+        Stage('report', inputs.stage('report'), after=['load']),
+    ], state_file)
+
+
+def run(dag, **kwargs):
+    outcomes = asyncio.run(dag.run(**kwargs))
+    return {name: outcome.status for name, outcome in outcomes.items()}
+
+
+def test_unchanged_fingerprint_skips_the_stage_and_everything_it_feeds(inputs, tmp_path):
+    state_file = tmp_path / 'state.json'
+    assert run(graph(inputs, state_file)) == {'fetch': OK, 'load': OK, 'report': OK}
+
+    inputs.ran.clear()
+    assert run(graph(inputs, state_file)) == {'fetch': SKIPPED, 'load': SKIPPED, 'report': SKIPPED}
+    assert inputs.ran == []
+
+    inputs.version = 2
+    assert run(graph(inputs, state_file)) == {'fetch': OK, 'load': OK, 'report': OK}
+    assert run(graph(inputs, state_file), force=True) == {'fetch': OK, 'load': OK, 'report': OK}
+
+
+def test_a_stage_that_changed_nothing_skips_its_dependents(inputs, tmp_path):
+    assert run(graph(inputs, tmp_path / 'state.json', load_result=0)) == {
+        'fetch': OK, 'load': OK, 'report': SKIPPED}
+
+
+def test_a_failure_blocks_its_dependents_and_forgets_the_upstream_fingerprint(inputs, tmp_path):
+    state_file = tmp_path / 'state.json'
+    inputs.fail.add('load')
+    assert run(graph(inputs, state_file)) == {'fetch': OK, 'load': FAILED, 'report': BLOCKED}
+
+    inputs.fail.clear()
+    inputs.ran.clear()
+    assert run(graph(inputs, state_file)) == {'fetch': OK, 'load': OK, 'report': OK}
+    assert inputs.ran == ['fetch', 'load', 'report']
+
+
+def test_select_keeps_the_stages_upstream_of_the_selection(inputs, tmp_path):
+    dag = graph(inputs, tmp_path / 'state.json')
+
+    assert dag.select(['load']).order == ['fetch', 'load']
+    with pytest.raises(ValueError, match='Unknown stage'):
+        dag.select(['missing'])
+
+
+def test_unknown_dependencies_and_cycles_are_rejected(inputs, tmp_path):
+    with pytest.raises(ValueError, match='unknown stages'):
+        Dag([Stage('load', inputs.stage('load'), after=['fetch'])], tmp_path / 'state.json')
+    with pytest.raises(ValueError, match='cycle'):
+        Dag([Stage('a', inputs.stage('a'), after=['b']), Stage('b', inputs.stage('b'), after=['a'])],
+            tmp_path / 'state.json')
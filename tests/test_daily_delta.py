@@ -0,0 +1,73 @@
+from datetime import datetime, timedelta, timezone
+
+import pandas as pd
+
+from nvd.extract.multiprocess_daily_delta import MAX_WINDOW_DAYS, save_data, split_windows
+from nvd.utils.batch_queue import BatchChannel
+
+COLUMNS = ('CVE ID', 'Description', 'Last Modified Date')
+
+
+def delta_channel(*batches, complete=True):
+    channel = BatchChannel(len(batches) + 2)
+    for batch in batches:
+        channel.put_batch(0, batch, COLUMNS)
+    if complete:
+        channel.put_control("RUN_COMPLETE")
+    channel.close()
+    return channel
+
+
+def test_save_data_keeps_the_latest_version_of_each_cve(tmp_path):
+    output_file = tmp_path / 'delta.csv'
+    channel = delta_channel(
+        [('CVE-2024-0001', 'newer', '2024-05-02T00:00:00.000'), ('CVE-2024-0002', 'only', '2024-05-01T00:00:00.000')],
+        [('CVE-2024-0001', 'older', '2024-05-01T00:00:00.000')],
+    )
+
+    save_data(channel, output_file, 'csv')
+
+    frame = pd.read_csv(output_file)
+    assert dict(zip(frame['CVE ID'], frame['Description'])) == {'CVE-2024-0001': 'newer', 'CVE-2024-0002': 'only'}
+
+
+def test_save_data_merges_records_without_a_last_modified_date(tmp_path):
+    output_file = tmp_path / 'delta.csv'
+    channel = delta_channel(
+        [('CVE-2024-0001', 'undated', None), ('CVE-2024-0002', 'dated', '2024-05-01T00:00:00.000')],
+        [('CVE-2024-0001', 'dated', '2024-05-01T00:00:00.000'), ('CVE-2024-0002', 'undated', None)],
+    )
+
+    save_data(channel, output_file, 'csv')
+
+    frame = pd.read_csv(output_file)
+    assert dict(zip(frame['CVE ID'], frame['Description'])) == {'CVE-2024-0001': 'dated', 'CVE-2024-0002': 'dated'}
+
+
+def test_save_data_writes_nothing_for_an_incomplete_run(tmp_path):
+    output_file = tmp_path / 'delta.csv'
+
+    save_data(delta_channel([('CVE-2024-0001', 'x', '2024-05-01T00:00:00.000')], complete=False), output_file, 'csv')
+
+    assert not output_file.exists()
+
+
+def test_split_windows_covers_the_range_in_windows_the_api_accepts():
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    end = start + timedelta(days=2 * MAX_WINDOW_DAYS + 5, hours=3)
+
+    windows = split_windows(start, end)
+
+    assert [window_end - window_start for window_start, window_end in windows] == [
+        timedelta(days=MAX_WINDOW_DAYS), timedelta(days=MAX_WINDOW_DAYS), timedelta(days=5, hours=3)]
+    assert windows[0][0] == start and windows[-1][1] == end
+    assert all(previous[1] == window[0] for previous, window in zip(windows, windows[1:]))
+
+
+def test_split_windows_of_a_short_or_empty_range():
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+    assert split_windows(start, start + timedelta(hours=6)) == [(start, start + timedelta(hours=6))]
+    assert split_windows(start, start) == []
+    assert split_windows(start, start + timedelta(days=3), max_days=1)[-1] == (start + timedelta(days=2),
+                                                                              start + timedelta(days=3))
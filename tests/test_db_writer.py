@@ -0,0 +1,86 @@
+import sqlite3
+import time
+
+import pytest
+
+from nvd.utils.db_writer import DatabaseWriter
+
+
+def create_table(conn):
+    conn.execute("CREATE TABLE items (id INTEGER PRIMARY KEY, name TEXT)")
+
+
+def count_items(conn):
+    return conn.execute("SELECT COUNT(*) FROM items").fetchone()[0]
+
+
+def read_items(path):
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute("SELECT id, name FROM items ORDER BY id").fetchall()
+    finally:
+        conn.close()
+
+
+def test_requests_are_batched_into_few_transactions(tmp_path):
+    path = tmp_path / 'writer.db'
+    with DatabaseWriter(path, setup=create_table, batch_rows=10, flush_interval=60, thread=True) as writer:
+        for start in range(0, 25, 5):
+            writer.executemany("INSERT INTO items VALUES (?, ?)", [(i, f'item {i}') for i in range(start, start + 5)])
+        writer.execute("UPDATE items SET name = ? WHERE id = ?", ('renamed', 0))
+        writer.call(count_items)
+
+    assert writer.results == [25]
+    assert writer.stats['requests'] == 7
+    assert writer.stats['rows'] == 27
+    assert writer.stats['transactions'] == 3
+    assert read_items(path)[0] == (0, 'renamed')
+    assert len(read_items(path)) == 25
+
+
+def test_an_idle_writer_commits_after_the_flush_interval(tmp_path):
+    path = tmp_path / 'writer.db'
+    with sqlite3.connect(path) as conn:
+        create_table(conn)
+    writer = DatabaseWriter(path, flush_interval=0.05, thread=True).start()
+    writer.executemany("INSERT INTO items VALUES (?, ?)", [(1, 'one')])
+    try:
+        for _ in range(100):
+            if read_items(path):
+                break
+            time.sleep(0.05)
+        assert read_items(path) == [(1, 'one')]
+    finally:
+        writer.close()
+
+
+def test_a_failed_request_rolls_back_its_batch_and_fails_close(tmp_path):
+    path = tmp_path / 'writer.db'
+    writer = DatabaseWriter(path, setup=create_table, batch_rows=2, flush_interval=60, thread=True).start()
+    writer.executemany("INSERT INTO items VALUES (?, ?)", [(1, 'one'), (2, 'two')])
+    writer.executemany("INSERT INTO items VALUES (?, ?)", [(3, 'three')])
+    writer.executemany("INSERT INTO items VALUES (?, ?)", [(3, 'duplicate')])
+    writer.executemany("INSERT INTO items VALUES (?, ?)", [(4, 'discarded')])
+
+    with pytest.raises(RuntimeError, match='IntegrityError'):
+        writer.close()
+    assert read_items(path) == [(1, 'one'), (2, 'two')]
+
+
+def test_a_failed_setup_fails_close(tmp_path):
+    writer = DatabaseWriter(tmp_path / 'writer.db', setup=count_items, thread=True).start()
+    writer.executemany("INSERT INTO items VALUES (?, ?)", [(1, 'one')])
+
+    with pytest.raises(RuntimeError, match='no such table'):
+        writer.close()
+
+
+def test_writer_process_applies_requests_from_a_client(tmp_path):
+    path = tmp_path / 'writer.db'
+    with DatabaseWriter(path) as writer:
+        client = writer.client()
+        client.execute("CREATE TABLE items (id INTEGER PRIMARY KEY, name TEXT)")
+        client.executemany("INSERT INTO items VALUES (?, ?)", [(1, 'one'), (2, 'two')])
+        client.executemany("INSERT INTO items VALUES (?, ?)", [])
+
+    assert read_items(path) == [(1, 'one'), (2, 'two')]
@@ -0,0 +1,109 @@
+import asyncio
+import json
+import random
+
+import pytest
+
+from nvd.utils.json_stream import JsonArrayStream
+from synthetic import synthetic_page
+
+# Elements whose text holds the characters the scanner splits on, plus multi-byte UTF-8
+AWKWARD = [
+    {'cve': {'id': 'CVE-2024-0001', 'descriptions': [{'lang': 'en', 'value': 'a "quoted" ] , { } value\\'}]}},
+    {'cve': {'id': 'CVE-2024-0002', 'descriptions': [{'lang': 'es', 'value': 'vulnerabilidad en el módulo — ✓'}]}},
+    {'cve': {'id': 'CVE-2024-0003', 'metrics': {}, 'references': []}},
+]
+
+
+def page_bytes(elements, trailer=True):
+    page = {'resultsPerPage': len(elements), 'startIndex': 0, 'totalResults': 42, 'vulnerabilities': elements}
+    if trailer:
+        page['timestamp'] = '2024-05-01T00:00:00.000'
+    return json.dumps(page, ensure_ascii=False, indent=1).encode('utf-8')
+
+
+def split(data, size):
+    return [data[start:start + size] for start in range(0, len(data), size)]
+
+
+@pytest.mark.parametrize('size', [1, 2, 3, 7, 64, 1000, 10 ** 6])
+def test_every_chunk_size_decodes_the_same_page(size):
+    data = page_bytes(AWKWARD)
+    stream = JsonArrayStream('vulnerabilities')
+
+    items = list(stream.iter_chunks(split(data, size)))
+
+    assert items == AWKWARD
+    assert stream.envelope == {'resultsPerPage': 3, 'startIndex': 0, 'totalResults': 42,
+                               'timestamp': '2024-05-01T00:00:00.000'}
+
+
+def test_random_splits_of_a_synthetic_page():
+    data = synthetic_page(25)
+    expected = json.loads(data)
+    rng = random.Random(7)
+    for _ in range(20):
+        cuts = sorted(rng.sample(range(1, len(data)), 30))
+        chunks = [data[start:end] for start, end in zip([0, *cuts], [*cuts, len(data)])]
+        stream = JsonArrayStream('vulnerabilities')
+
+        assert list(stream.iter_chunks(chunks)) == expected['vulnerabilities']
+        assert stream.envelope['totalResults'] == expected['totalResults']
+
+
+def test_elements_are_handed_back_as_soon_as_they_complete():
+    data = page_bytes(AWKWARD, trailer=False).decode('utf-8')
+    first_end = data.index('CVE-2024-0002')
+    stream = JsonArrayStream('vulnerabilities')
+
+    assert stream.feed(data[:first_end]) == AWKWARD[:1]
+    assert stream.feed(data[first_end:]) == AWKWARD[1:]
+
+
+def test_response_cut_off_inside_the_array_raises():
+    data = page_bytes(AWKWARD)
+    stream = JsonArrayStream('vulnerabilities')
+
+    with pytest.raises(ValueError):
+        list(stream.iter_chunks([data[:len(data) // 2]]))
+
+
+def test_page_without_the_array_keeps_its_envelope():
+    stream = JsonArrayStream('vulnerabilities')
+
+    assert list(stream.iter_chunks([b'{"message": "Request forbidden", ', b'"status": 403}'])) == []
+    assert stream.envelope == {'message': 'Request forbidden', 'status': 403}
+
+
+class ChunkedBody:
+    """ The part of an aiohttp response that iter_response reads: `content.iter_chunked`. """
+
+    def __init__(self, data):
+        self.content = self
+        self._data = data
+
+    async def iter_chunked(self, size):
+        for chunk in split(self._data, size):
+            yield chunk
+
+
+class Sink:
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, chunk):
+        self.chunks.append(chunk)
+
+
+def test_response_body_is_decoded_and_copied_to_the_sink():
+    data = page_bytes(AWKWARD)
+    stream = JsonArrayStream('vulnerabilities')
+    sink = Sink()
+
+    async def collect():
+        return [item async for item in stream.iter_response(ChunkedBody(data), chunk_size=5, sink=sink)]
+
+    assert asyncio.run(collect()) == AWKWARD
+    assert b''.join(sink.chunks) == data
+    assert stream.envelope['totalResults'] == 42
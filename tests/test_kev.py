@@ -0,0 +1,65 @@
+import copy
+import json
+import sqlite3
+
+import pytest
+
+from conftest import FIXTURES_DIR
+from nvd.utils.kev import KEV_TABLE, apply_catalog, catalog_rows, create_kev_table
+
+
+@pytest.fixture
+def catalog():
+    with open(FIXTURES_DIR / 'kev_catalog.json', 'r', encoding='utf-8') as file:
+        return json.load(file)
+
+
+@pytest.fixture
+def conn():
+    conn = sqlite3.connect(':memory:')
+    create_kev_table(conn)
+    yield conn
+    conn.close()
+
+
+def stored(conn):
+    return {cve_id: (due_date, cwes) for cve_id, due_date, cwes in
+            conn.execute(f'SELECT cve_id, due_date, cwes FROM {KEV_TABLE}')}
+
+
+def test_first_load_inserts_every_entry(conn, catalog):
+    counts = apply_catalog(conn, catalog_rows(catalog))
+
+    assert counts == {'inserted': 4, 'updated': 0, 'removed': 0, 'unchanged': 0}
+    rows = stored(conn)
+    assert rows['CVE-2021-44228'] == ('2021-12-24', '["CWE-20", "CWE-400", "CWE-502"]')
+    assert rows['CVE-2017-0144'] == ('2022-08-10', None)
+
+
+def test_unchanged_catalog_writes_nothing(conn, catalog):
+    apply_catalog(conn, catalog_rows(catalog))
+    # Key order is not content: a reordered entry hashes the same
+    reordered = copy.deepcopy(catalog)
+    reordered['vulnerabilities'][0] = dict(reversed(list(reordered['vulnerabilities'][0].items())))
+
+    counts = apply_catalog(conn, catalog_rows(reordered))
+
+    assert counts == {'inserted': 0, 'updated': 0, 'removed': 0, 'unchanged': 4}
+
+
+def test_changed_catalog_inserts_updates_and_removes(conn, catalog):
+    apply_catalog(conn, catalog_rows(catalog))
+    changed = copy.deepcopy(catalog)
+    entries = changed['vulnerabilities']
+    entries[2]['dueDate'] = '2024-04-26'
+    withdrawn = entries.pop(1)
+    added = dict(entries[0], cveID='CVE-2021-45046', notes='https://nvd.nist.gov/vuln/detail/CVE-2021-45046')
+    entries.append(added)
+
+    counts = apply_catalog(conn, catalog_rows(changed))
+
+    assert counts == {'inserted': 1, 'updated': 1, 'removed': 1, 'unchanged': 2}
+    rows = stored(conn)
+    assert withdrawn['cveID'] not in rows
+    assert rows['CVE-2024-3400'][0] == '2024-04-26'
+    assert set(rows) == {'CVE-2021-44228', 'CVE-2024-3400', 'CVE-2017-0144', 'CVE-2021-45046'}
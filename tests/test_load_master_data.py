@@ -0,0 +1,49 @@
+import sqlite3
+
+import pytest
+
+from tenable.load.load_master_data import PLUGIN_CVE_TABLE, create_tables, load_records, table_name
+
+
+def plugin(plugin_id, title, cves=''):
+    return {'PluginId': plugin_id, 'SourceFile': 'xml_files/newest_plugins.xml', 'Title': title,
+            'Link': f'https://www.tenable.com/plugins/nessus/{plugin_id}', 'PublicationDate': '2024-05-01',
+            'Product': 'nessus', 'Severity': 'high', 'Synopsis': '', 'Description': '', 'Solution': '',
+            'CVEID': cves}
+
+
+@pytest.fixture
+def conn(tmp_path):
+    conn = sqlite3.connect(tmp_path / 'tenable.db')
+    create_tables(conn)
+    yield conn
+    conn.close()
+
+
+def test_only_new_and_changed_plugins_are_written(conn):
+    assert load_records(conn, [plugin('100', 'first'), plugin('200', 'second')]) == {
+        'inserted': 2, 'updated': 0, 'unchanged': 0}
+    conn.execute(f"UPDATE {table_name} SET Synopsis = 'untouched'")
+
+    counts = load_records(conn, [plugin('100', 'first'), plugin('200', 'renamed'), plugin('300', 'third'),
+                                 plugin('', 'no id')])
+
+    assert counts == {'inserted': 1, 'updated': 1, 'unchanged': 1}
+    assert conn.execute(f"SELECT PluginId, Title, Synopsis FROM {table_name} ORDER BY PluginId").fetchall() == [
+        ('100', 'first', 'untouched'), ('200', 'renamed', None), ('300', 'third', None)]
+
+
+def test_empty_and_missing_values_hash_the_same(conn):
+    load_records(conn, [plugin('100', 'first')])
+    record = plugin('100', 'first')
+    del record['Solution']
+
+    assert load_records(conn, [record]) == {'inserted': 0, 'updated': 0, 'unchanged': 1}
+
+
+def test_a_changed_plugin_replaces_its_cve_rows(conn):
+    load_records(conn, [plugin('100', 'first', 'cve-2024-0001, cve-2024-0002, CVE-2024-0001')])
+    load_records(conn, [plugin('100', 'first', 'cve-2024-0003')])
+
+    assert conn.execute(f"SELECT plugin_id, cve_id FROM {PLUGIN_CVE_TABLE}").fetchall() == [
+        ('100', 'CVE-2024-0003')]
@@ -0,0 +1,96 @@
+import json
+import sqlite3
+
+import pytest
+
+from nvd.utils import store
+from nvd.utils.normalize import batch_child_rows, check_child_keys, create_child_tables, insert_children
+
+METRICS = {'cvssMetricV31': [{'source': 'nvd@nist.gov', 'type': 'Primary', 'exploitabilityScore': 3.9,
+                              'impactScore': 5.9,
+                              'cvssData': {'version': '3.1', 'vectorString': 'CVSS:3.1/AV:N', 'baseScore': 9.8,
+                                           'baseSeverity': 'CRITICAL'}}]}
+WEAKNESSES = [{'source': 'nvd@nist.gov', 'type': 'Primary', 'description': [{'lang': 'en', 'value': 'CWE-79'}]}]
+REFERENCES = [{'url': 'https://Example.com/advisory?id=1', 'source': 'cna', 'tags': ['Patch', 'Vendor Advisory']}]
+CVE_TAGS = [{'sourceIdentifier': 'cna', 'tags': ['disputed']}]
+
+
+def test_batch_child_rows_of_nested_api_columns():
+    columns = ('CVE ID', 'Metrics', 'Weaknesses', 'References', 'CVE Tags')
+    rows = [
+        ('CVE-2024-0001', json.dumps(METRICS), json.dumps(WEAKNESSES), REFERENCES, repr(CVE_TAGS)),
+        ('N/A', json.dumps(METRICS), None, None, None),
+    ]
+
+    rows_by_table = batch_child_rows(columns, rows)
+
+    assert rows_by_table == {
+        'cve_metric': [('CVE-2024-0001', '3.1', 'nvd@nist.gov', 'Primary', 'CVSS:3.1/AV:N', 9.8, 'CRITICAL', 3.9, 5.9)],
+        'cve_weakness': [('CVE-2024-0001', 'CWE-79', 'nvd@nist.gov', 'Primary')],
+        'cve_reference': [('CVE-2024-0001', 'https://Example.com/advisory?id=1', 'example.com', 'cna',
+                           'Patch,Vendor Advisory')],
+        'cve_tag': [('CVE-2024-0001', 'disputed', 'cna')],
+    }
+
+
+def test_batch_child_rows_of_flattened_extract_columns():
+    columns = ('CVE_ID', 'CVSSv3_Version', 'CVSSv3_Base_Score', 'CVSSv3_Base_Severity', 'CVSSv2_Version',
+               'CVSSv2_Base_Score', 'References')
+    rows = [('CVE-2024-0001', '3.1', '7.5', 'HIGH', 'N/A', None, 'https://a.example/x, N/A, http://b.example')]
+
+    rows_by_table = batch_child_rows(columns, rows)
+
+    assert rows_by_table['cve_metric'] == [('CVE-2024-0001', '3.1', None, None, None, 7.5, 'HIGH', None, None)]
+    assert [row[2] for row in rows_by_table['cve_reference']] == ['a.example', 'b.example']
+
+
+def test_batch_child_rows_without_a_key_column_adds_nothing():
+    assert batch_child_rows(('Description',), [('text',)]) == {
+        'cve_metric': [], 'cve_weakness': [], 'cve_reference': [], 'cve_tag': []}
+
+
+@pytest.fixture
+def conn(tmp_path):
+    conn = store.connect(tmp_path / 'nvd.db')
+    store.ensure_cve_table(conn, ['CVE ID', 'Description'])
+    store.insert_rows(conn, ['CVE ID', 'Description'], [('CVE-2024-0001', 'stored')])
+    create_child_tables(conn)
+    yield conn
+    conn.close()
+
+
+def test_child_rows_must_reference_a_stored_cve(conn):
+    insert_children(conn, {'cve_tag': [('CVE-2024-0001', 'disputed', 'cna')]})
+
+    with pytest.raises(sqlite3.IntegrityError):
+        insert_children(conn, {'cve_tag': [('CVE-2024-9999', 'disputed', 'cna')]})
+
+
+def test_deleting_a_cve_deletes_its_child_rows(conn):
+    insert_children(conn, {'cve_tag': [('CVE-2024-0001', 'disputed', 'cna')]})
+
+    conn.execute(f'DELETE FROM "{store.CVE_TABLE}"')
+
+    assert conn.execute('SELECT COUNT(*) FROM cve_tag').fetchone()[0] == 0
+
+
+def test_check_child_keys_finds_rows_written_without_enforcement(conn):
+    check_child_keys(conn)
+    conn.commit()  # The pragma has no effect inside a transaction
+    conn.execute('PRAGMA foreign_keys=OFF')
+    insert_children(conn, {'cve_weakness': [('CVE-2024-9999', 'CWE-79', None, None)]})
+
+    with pytest.raises(sqlite3.IntegrityError, match='cve_weakness'):
+        check_child_keys(conn)
+
+
+def test_a_legacy_child_table_is_rebuilt_with_its_foreign_key(conn):
+    conn.execute('DROP TABLE cve_tag')
+    conn.execute('CREATE TABLE cve_tag (cve_id TEXT NOT NULL, tag TEXT NOT NULL, source TEXT)')
+    conn.executemany('INSERT INTO cve_tag VALUES (?, ?, ?)',
+                     [('CVE-2024-0001', 'disputed', 'cna'), ('CVE-2024-9999', 'orphan', 'cna')])
+
+    create_child_tables(conn)
+
+    assert conn.execute('PRAGMA foreign_key_list(cve_tag)').fetchone() is not None
+    assert conn.execute('SELECT cve_id, tag FROM cve_tag').fetchall() == [('CVE-2024-0001', 'disputed')]
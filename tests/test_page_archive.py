@@ -0,0 +1,99 @@
+import asyncio
+import json
+import random
+from datetime import datetime, timezone
+
+import pytest
+
+from nvd.extract.cve_api import ENDPOINT, PageFetcher
+from nvd.extract.multiprocess_daily_delta import archived_windows
+from nvd.utils.batch_queue import BatchChannel
+from nvd.utils.page_archive import INDEX_FILE, MissingPage, PageArchive
+from nvd.utils.schema import INITIAL_LOAD_SCHEMA
+from synthetic import api_page, cve_id, synthetic_cve
+
+PARAMS = {'startIndex': 0, 'resultsPerPage': 2000}
+
+
+def archive_page(archive, body, params=PARAMS, envelope=None):
+    page = archive.writer(ENDPOINT, params)
+    try:
+        for start in range(0, len(body), 100):
+            page.write(body[start:start + 100])
+        page.commit(envelope or {})
+    finally:
+        page.close()
+
+
+def cve_page(count, start_index=0):
+    rng = random.Random(start_index)
+    return json.dumps(api_page('vulnerabilities', [synthetic_cve(start_index + index, rng) for index in range(count)],
+                               start_index, count, 'NVD_CVE')).encode('utf-8')
+
+
+@pytest.mark.parametrize('compression', ['gzip', 'zstd'])
+def test_archived_page_reads_back_unchanged(tmp_path, compression):
+    if compression == 'zstd':
+        pytest.importorskip('zstandard')
+    body = cve_page(3)
+    archive_page(PageArchive(tmp_path, compression), body, envelope={'totalResults': 3})
+
+    archive = PageArchive(tmp_path, compression)
+    assert b''.join(archive.read(ENDPOINT, {'resultsPerPage': '2000', 'startIndex': '0'})) == body
+    [entry] = archive.pages(ENDPOINT)
+    assert entry['envelope'] == {'totalResults': 3}
+    assert entry['raw_bytes'] == len(body)
+
+
+def test_an_uncommitted_page_is_discarded(tmp_path):
+    archive = PageArchive(tmp_path, 'gzip')
+    page = archive.writer(ENDPOINT, PARAMS)
+    page.write(b'{"vulnerabilities": [')
+    page.close()
+
+    assert not list((tmp_path / ENDPOINT).iterdir())
+    with pytest.raises(MissingPage):
+        list(archive.read(ENDPOINT, PARAMS))
+
+
+def test_a_refetched_page_replaces_the_earlier_copy(tmp_path):
+    archive = PageArchive(tmp_path, 'gzip')
+    archive_page(archive, b'{"first": true}')
+    archive_page(archive, b'{"second": true}')
+
+    assert b''.join(PageArchive(tmp_path, 'gzip').read(ENDPOINT, PARAMS)) == b'{"second": true}'
+    assert len(list((tmp_path / ENDPOINT).iterdir())) == 1
+    assert len((tmp_path / INDEX_FILE).read_text().splitlines()) == 2
+
+
+def test_replay_sends_the_archived_records_without_the_network(tmp_path):
+    archive = PageArchive(tmp_path, 'gzip')
+    archive_page(archive, cve_page(3), params={'startIndex': 0, 'resultsPerPage': 3})
+    channel = BatchChannel(8)
+
+    async def replay():
+        async with PageFetcher(channel, INITIAL_LOAD_SCHEMA, archive=archive, replay=True, track_pages=True,
+                               results_per_page=3) as fetcher:
+            return await fetcher.fetch_page({}, 0)
+
+    assert asyncio.run(replay()) == 3
+    channel.close()
+    messages = list(channel)
+    assert [kind for kind, _, _ in messages] == ["BATCH", "PAGE_DONE"]
+    records = messages[0][2].records()
+    assert [record['CVE ID'] for record in records] == [cve_id(index) for index in range(3)]
+    assert messages[1][2] == (3, 3)
+
+
+def test_archived_windows_after_the_watermark(tmp_path):
+    archive = PageArchive(tmp_path, 'gzip')
+    for start, end in [('2024-01-01', '2024-03-01'), ('2024-03-01', '2024-05-01')]:
+        for start_index in (0, 2000):
+            archive_page(archive, b'{}', params={'startIndex': start_index, 'resultsPerPage': 2000,
+                                                 'lastModStartDate': f'{start}T00:00:00.000',
+                                                 'lastModEndDate': f'{end}T00:00:00.000'})
+
+    windows = archived_windows(archive, '2024-04-01T00:00:00.000')
+
+    assert windows == [(datetime(2024, 3, 1, tzinfo=timezone.utc), datetime(2024, 5, 1, tzinfo=timezone.utc))]
+    assert len(archived_windows(archive)) == 2
@@ -0,0 +1,48 @@
+import asyncio
+import time
+
+from nvd.utils.rate_limiter import RateLimiter
+
+WINDOW = 0.2
+
+
+async def acquire_times(limiter, count):
+    """ The monotonic time at which each of `count` concurrent requests got its token. """
+    times = []
+
+    async def request():
+        await limiter.acquire()
+        times.append(time.monotonic())
+
+    await asyncio.gather(*(request() for _ in range(count)))
+    return sorted(times)
+
+
+def test_burst_up_to_the_quota_is_not_delayed():
+    start = time.monotonic()
+    times = asyncio.run(acquire_times(RateLimiter(5, WINDOW), 5))
+
+    assert times[-1] - start < WINDOW / 2
+
+
+def test_no_rolling_window_sees_more_than_the_quota():
+    times = asyncio.run(acquire_times(RateLimiter(3, WINDOW), 9))
+
+    for position, issued in enumerate(times):
+        in_window = [other for other in times[position:] if other - issued < WINDOW]
+        assert len(in_window) <= 3
+    # Three full buckets: the last three requests wait for two windows to roll over
+    assert times[-1] - times[0] >= 2 * WINDOW * 0.95
+
+
+def test_context_manager_takes_a_token():
+    async def run():
+        limiter = RateLimiter(1, WINDOW)
+        async with limiter:
+            pass
+        start = time.monotonic()
+        async with limiter:
+            pass
+        return time.monotonic() - start
+
+    assert asyncio.run(run()) >= WINDOW * 0.9
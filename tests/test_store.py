@@ -0,0 +1,107 @@
+import sqlite3
+
+import pytest
+
+from nvd.utils import store
+
+COLUMNS = ['CVE ID', 'Description', 'Last Modified Date']
+
+
+@pytest.fixture
+def conn(tmp_path):
+    conn = store.connect(tmp_path / 'nvd.db')
+    store.ensure_cve_table(conn, COLUMNS)
+    yield conn
+    conn.close()
+
+
+def stored(conn):
+    return dict(conn.execute(f'SELECT "CVE_ID", "Description" FROM "{store.CVE_TABLE}"'))
+
+
+def test_later_version_replaces_the_stored_row(conn):
+    store.upsert_rows(conn, COLUMNS, [('CVE-2024-0001', 'first', '2024-05-01T00:00:00.000')])
+    store.upsert_rows(conn, COLUMNS, [('CVE-2024-0001', 'second', '2024-05-02T00:00:00.000')])
+
+    assert stored(conn) == {'CVE-2024-0001': 'second'}
+
+
+def test_older_version_never_rolls_a_cve_back(conn):
+    store.upsert_rows(conn, COLUMNS, [('CVE-2024-0001', 'newer', '2024-05-02T00:00:00.000')])
+    store.upsert_rows(conn, COLUMNS, [('CVE-2024-0001', 'older', '2024-05-01T00:00:00.000')])
+
+    assert stored(conn) == {'CVE-2024-0001': 'newer'}
+
+
+def test_same_version_replayed_is_written_again(conn):
+    store.upsert_rows(conn, COLUMNS, [('CVE-2024-0001', 'first', '2024-05-01T00:00:00.000')])
+    store.upsert_rows(conn, COLUMNS, [('CVE-2024-0001', 'replayed', '2024-05-01T00:00:00.000')])
+
+    assert stored(conn) == {'CVE-2024-0001': 'replayed'}
+
+
+def test_dates_compare_as_instants_not_text(conn):
+    # As text '2024-05-01 12:00:00+00:00' sorts before '2024-05-01T09:00:00.000' (' ' < 'T') although it is
+    # three hours later, and '2024-05-01T23:00:00Z' sorts after '2024-05-01T23:00:00.000' although it is
+    # the same instant
+    store.upsert_rows(conn, COLUMNS, [('CVE-2024-0001', 'noon', '2024-05-01 12:00:00+00:00')])
+    store.upsert_rows(conn, COLUMNS, [('CVE-2024-0001', 'morning', '2024-05-01T09:00:00.000')])
+    store.upsert_rows(conn, COLUMNS, [('CVE-2024-0002', 'z', '2024-05-01T23:00:00Z')])
+    store.upsert_rows(conn, COLUMNS, [('CVE-2024-0002', 'ms', '2024-05-01T23:00:00.000')])
+
+    assert stored(conn) == {'CVE-2024-0001': 'noon', 'CVE-2024-0002': 'ms'}
+
+
+def test_last_writer_wins_within_one_batch_and_current_rows_reports_the_winners(conn):
+    store.upsert_rows(conn, COLUMNS, [('CVE-2024-0001', 'stored', '2024-05-03T00:00:00.000')])
+    rows = [
+        ('CVE-2024-0001', 'stale', '2024-05-02T00:00:00.000'),
+        ('CVE-2024-0002', 'v1', '2024-05-01T00:00:00.000'),
+        ('CVE-2024-0002', 'v2', '2024-05-04T00:00:00.000'),
+        ('CVE-2024-0003', 'new', '2024-05-01T00:00:00.000'),
+    ]
+
+    store.upsert_rows(conn, COLUMNS, rows)
+
+    assert stored(conn) == {'CVE-2024-0001': 'stored', 'CVE-2024-0002': 'v2', 'CVE-2024-0003': 'new'}
+    assert store.current_rows(conn, COLUMNS, rows) == rows[2:]
+
+
+def test_rows_without_a_date_always_replace_an_undated_row(conn):
+    store.upsert_rows(conn, COLUMNS, [('CVE-2024-0001', 'undated', None)])
+    store.upsert_rows(conn, COLUMNS, [('CVE-2024-0001', 'dated', '2024-05-01T00:00:00.000')])
+
+    assert stored(conn) == {'CVE-2024-0001': 'dated'}
+
+
+def test_watermark_only_moves_forward(conn):
+    store.write_watermark(conn, 'nvd_delta', '2024-05-02T00:00:00.000Z')
+    store.write_watermark(conn, 'nvd_delta', '2024-05-01T00:00:00.000')
+
+    assert store.read_watermark(conn, 'nvd_delta') == '2024-05-02T00:00:00.000'
+
+
+@pytest.mark.parametrize('value, expected', [
+    ('2024-05-01T03:00:00+02:00', '2024-05-01T01:00:00.000'),
+    ('2024-05-01T01:00:00.123456Z', '2024-05-01T01:00:00.123'),
+    ('2024-05-01T01:00:00.000', '2024-05-01T01:00:00.000'),
+    (None, None),
+])
+def test_canonical_timestamp(value, expected):
+    assert store.canonical_timestamp(value) == expected
+
+
+def test_duplicate_keys_are_dropped_before_the_key_index_is_built(tmp_path):
+    conn = store.connect(tmp_path / 'nvd.db')
+    store.ensure_cve_table(conn, COLUMNS, unique=False)
+    store.insert_rows(conn, COLUMNS, [('CVE-2024-0001', 'newer', '2024-05-02T00:00:00.000'),
+                                      ('CVE-2024-0001', 'older', '2024-05-01T00:00:00.000'),
+                                      ('CVE-2024-0002', 'only', '2024-05-01T00:00:00.000')])
+
+    with pytest.raises(sqlite3.IntegrityError, match='duplicate'):
+        store.create_key_index(conn)
+    assert store.drop_duplicate_keys(conn) == 1
+    store.create_key_index(conn)
+
+    assert stored(conn) == {'CVE-2024-0001': 'newer', 'CVE-2024-0002': 'only'}
+    conn.close()
@@ -0,0 +1,35 @@
+import random
+import sqlite3
+
+from nvd.utils import store
+from synthetic import feed_xml, synthetic_plugin_item
+from tenable.load.load_master_data import table_name
+from tenable.pipeline import run
+
+
+def write_feed(path, indexes, title):
+    rng = random.Random(0)
+    path.write_bytes(feed_xml(synthetic_plugin_item(index, rng, title=title) for index in indexes))
+
+
+def plugin_titles(database):
+    conn = sqlite3.connect(database)
+    try:
+        return dict(conn.execute(f"SELECT PluginId, Title FROM {table_name}"))
+    finally:
+        conn.close()
+
+
+def test_run_only_parses_the_given_feeds(tmp_path):
+    xml_dir, database, nvd_database = tmp_path / 'xml_files', tmp_path / 'tenable.db', tmp_path / 'nvd.db'
+    xml_dir.mkdir()
+    store.connect(nvd_database).close()
+    write_feed(xml_dir / 'newest_plugins.xml', [0, 1], 'original')
+    write_feed(xml_dir / 'updated_plugins.xml', [2], 'original')
+    run(xml_dir, database, max_workers=1, nvd_database=nvd_database)
+
+    write_feed(xml_dir / 'newest_plugins.xml', [0, 1], 'changed')
+    write_feed(xml_dir / 'updated_plugins.xml', [2], 'not reparsed')
+    run(xml_dir, database, max_workers=1, nvd_database=nvd_database, feeds={'newest_plugins'})
+
+    assert plugin_titles(database) == {'200000': 'changed', '199999': 'changed', '199998': 'original'}